@@ -0,0 +1,260 @@
+# almacen_posiciones.py - POSICIONES ACTIVAS EN ARRAYS (STRUCT-OF-ARRAYS NUMPY, IDS ENTEROS)
+import threading
+from collections.abc import Mapping
+from datetime import datetime
+import numpy as np
+
+# Niveles DCA por posición (dca_1, dca_2 de las señales)
+MAX_NIVELES_DCA = 2
+
+# Una fila por posición activa; las filas activas ocupan siempre [0:n)
+DTYPE_POSICION = np.dtype([
+    ('id', 'i8'),
+    ('simbolo', 'i4'),          # índice en AlmacenPosiciones.simbolos
+    ('direccion', 'i1'),        # +1 COMPRA, -1 VENTA
+    ('precio_entrada', 'f8'),
+    ('precio_actual', 'f8'),
+    ('precio_promedio', 'f8'),
+    ('tp1', 'f8'),
+    ('tp2', 'f8'),
+    ('sl', 'f8'),
+    ('dca', 'f8', (MAX_NIVELES_DCA,)),
+    ('dca_activado', '?', (MAX_NIVELES_DCA,)),
+    ('leverage', 'f8'),
+    ('timestamp_apertura', 'f8')  # epoch
+])
+
+
+class AlmacenPosiciones:
+    """Posiciones activas en un array estructurado con IDs enteros únicos y crecientes
+
+    Cerrar una posición mueve la última fila al hueco (O(1)), así todas las
+    operaciones vectorizadas trabajan sobre el bloque contiguo [0:n).
+    """
+
+    def __init__(self, capacidad=64):
+        self._filas = np.zeros(capacidad, dtype=DTYPE_POSICION)
+        self._n = 0
+        self._fila_de_id = {}
+        self._siguiente_id = 1
+        self.simbolos = []
+        self._codigo_simbolo = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._n
+
+    def __contains__(self, posicion_id):
+        return posicion_id in self._fila_de_id
+
+    @property
+    def activas(self):
+        """Vista (sin copia) de las filas activas"""
+        return self._filas[:self._n]
+
+    def codigo(self, simbolo):
+        if simbolo not in self._codigo_simbolo:
+            self._codigo_simbolo[simbolo] = len(self.simbolos)
+            self.simbolos.append(simbolo)
+        return self._codigo_simbolo[simbolo]
+
+    def _reservar(self, cantidad):
+        if self._n + cantidad > len(self._filas):
+            nuevas = np.zeros(max(2 * len(self._filas), self._n + cantidad), dtype=DTYPE_POSICION)
+            nuevas[:self._n] = self._filas[:self._n]
+            self._filas = nuevas
+
+    def abrir_lote(self, simbolos, direcciones, precios_entrada, tp1, tp2, sl, dca, leverage=1, timestamps=None, ids=None):
+        """Abrir N posiciones de una vez; devuelve sus IDs (array int64)
+
+        `direcciones` admite "COMPRA"/"VENTA" o +1/-1; `dca` es (N, K) con K <= 2
+        (NaN = nivel inexistente). `ids` solo se indica al reconstruir
+        posiciones ya registradas (reaplicar el diario).
+        """
+        precios_entrada = np.atleast_1d(np.asarray(precios_entrada, dtype=np.float64))
+        cantidad = len(precios_entrada)
+        direcciones = np.broadcast_to(np.asarray(direcciones), (cantidad,))
+        if direcciones.dtype.kind in 'US':
+            direcciones = np.where(direcciones == "COMPRA", 1, -1)
+        dca = np.atleast_2d(np.asarray(dca, dtype=np.float64)).reshape(cantidad, -1)
+
+        with self._lock:
+            self._reservar(cantidad)
+            codigos = [self.codigo(simbolo) for simbolo in np.broadcast_to(np.asarray(simbolos), (cantidad,)).tolist()]
+            if ids is None:
+                ids = np.arange(self._siguiente_id, self._siguiente_id + cantidad, dtype=np.int64)
+            else:
+                ids = np.asarray(ids, dtype=np.int64)
+                if any(posicion_id in self._fila_de_id for posicion_id in ids.tolist()):
+                    raise ValueError("ID de posición ya activo")
+            self._siguiente_id = max([self._siguiente_id] + [posicion_id + 1 for posicion_id in ids.tolist()])
+
+            filas = self._filas[self._n:self._n + cantidad]
+            filas['id'] = ids
+            filas['simbolo'] = codigos
+            filas['direccion'] = direcciones
+            filas['precio_entrada'] = precios_entrada
+            filas['precio_actual'] = precios_entrada
+            filas['precio_promedio'] = precios_entrada
+            filas['tp1'] = tp1
+            filas['tp2'] = tp2
+            filas['sl'] = sl
+            filas['dca'] = np.nan
+            filas['dca'][:, :dca.shape[1]] = dca
+            filas['dca_activado'] = False
+            filas['leverage'] = leverage
+            filas['timestamp_apertura'] = np.nan if timestamps is None else timestamps
+
+            self._fila_de_id.update(zip(ids.tolist(), range(self._n, self._n + cantidad)))
+            self._n += cantidad
+        return ids
+
+    def abrir(self, simbolo, direccion, precio_entrada, tp1, tp2, sl, dca_niveles=(), leverage=1, timestamp=None, posicion_id=None):
+        dca = list(dca_niveles) + [np.nan] * (MAX_NIVELES_DCA - len(dca_niveles))
+        return int(self.abrir_lote([simbolo], [direccion], [precio_entrada], tp1, tp2, sl, [dca], leverage,
+                                   None if timestamp is None else [timestamp],
+                                   None if posicion_id is None else [posicion_id])[0])
+
+    def tiene_simbolo(self, simbolo):
+        """True si hay alguna posición activa del símbolo"""
+        codigo = self._codigo_simbolo.get(simbolo)
+        if codigo is None:
+            return False
+        with self._lock:
+            return bool((self.activas['simbolo'] == codigo).any())
+
+    def fila(self, posicion_id):
+        return self._filas[self._fila_de_id[posicion_id]]
+
+    def obtener(self, posicion_id):
+        """Dict de una posición activa o None, leído bajo el lock (seguro frente a un cierre concurrente)"""
+        with self._lock:
+            indice = self._fila_de_id.get(posicion_id)
+            if indice is None:
+                return None
+            fila = self._filas[indice].copy()
+        return self.a_dict(fila)
+
+    def activar_dca(self, posicion_id, activados):
+        """Marcar niveles DCA activados y recalcular el precio promedio (misma regla que el gestor)
+
+        Devuelve los niveles (1, 2) que se activan ahora y no lo estaban.
+        """
+        activados = np.asarray(activados, dtype=bool)[:MAX_NIVELES_DCA]
+        with self._lock:
+            indice = self._fila_de_id[posicion_id]
+            dca = self._filas['dca'][indice]
+            marcados = self._filas['dca_activado'][indice]
+            nuevos = activados & ~np.isnan(dca[:len(activados)]) & ~marcados[:len(activados)]
+            marcados[:len(activados)] |= nuevos
+            self._filas['precio_promedio'][indice] = (self._filas['precio_entrada'][indice] + dca[marcados].sum()) / (1 + marcados.sum())
+        return (np.flatnonzero(nuevos) + 1).tolist()
+
+    def cerrar(self, posicion_id):
+        """Quitar una posición; devuelve su fila (copia)"""
+        with self._lock:
+            indice = self._fila_de_id.pop(posicion_id)
+            cerrada = self._filas[indice].copy()
+            ultima = self._n - 1
+            if indice != ultima:
+                self._filas[indice] = self._filas[ultima]
+                self._fila_de_id[int(self._filas[indice]['id'])] = indice
+            self._n -= 1
+        return cerrada
+
+    def exportar(self):
+        """Copia de las filas activas, símbolos y siguiente ID (para instantáneas)"""
+        with self._lock:
+            return self.activas.copy(), list(self.simbolos), self._siguiente_id
+
+    def importar(self, filas, simbolos, siguiente_id):
+        """Sustituir todo el contenido por uno exportado con `exportar`"""
+        filas = np.asarray(filas, dtype=DTYPE_POSICION)
+        with self._lock:
+            self._filas = np.zeros(max(64, 2 * len(filas)), dtype=DTYPE_POSICION)
+            self._filas[:len(filas)] = filas
+            self._n = len(filas)
+            self._fila_de_id = {posicion_id: fila for fila, posicion_id in enumerate(filas['id'].tolist())}
+            self._siguiente_id = int(siguiente_id)
+            self.simbolos = list(simbolos)
+            self._codigo_simbolo = {simbolo: codigo for codigo, simbolo in enumerate(self.simbolos)}
+
+    def reservar_ids(self, hasta_id):
+        """Asegurar que los IDs nuevos sean mayores que `hasta_id` (IDs ya usados en el diario)"""
+        with self._lock:
+            self._siguiente_id = max(self._siguiente_id, int(hasta_id) + 1)
+
+    def vector_precios(self, precios):
+        """dict simbolo -> precio a vector alineado con `simbolos` (NaN = sin precio)"""
+        return np.array([precios.get(simbolo, np.nan) for simbolo in self.simbolos], dtype=np.float64)
+
+    def marcar_a_mercado(self, precios):
+        """Actualizar precio_actual y calcular el profit (%) de todas las posiciones en una llamada
+
+        `precios` es un dict simbolo -> precio o un vector alineado con
+        `simbolos`. Un vector creado antes de registrar símbolos nuevos es
+        más corto: esos símbolos quedan sin precio. Devuelve (ids, profit);
+        profit es NaN sin precio.
+        """
+        with self._lock:
+            if isinstance(precios, Mapping):
+                precios = self.vector_precios(precios)
+            precios = np.asarray(precios, dtype=np.float64)
+            if len(precios) < len(self.simbolos):
+                precios = np.concatenate([precios, np.full(len(self.simbolos) - len(precios), np.nan)])
+            filas = self.activas
+            precio = precios[filas['simbolo']]
+            con_precio = ~np.isnan(precio)
+            filas['precio_actual'] = np.where(con_precio, precio, filas['precio_actual'])
+            promedio = filas['precio_promedio']
+            profit = filas['direccion'] * (precio - promedio) / promedio * 100 * filas['leverage']
+            return filas['id'].copy(), profit
+
+    def a_dict(self, fila):
+        """Fila -> dict con el formato histórico de GestorOperaciones"""
+        return {
+            'id': int(fila['id']),
+            'par': self.simbolos[fila['simbolo']],
+            'direccion': "COMPRA" if fila['direccion'] > 0 else "VENTA",
+            'precio_entrada': float(fila['precio_entrada']),
+            'precio_actual': float(fila['precio_actual']),
+            'tp1': float(fila['tp1']),
+            'tp2': float(fila['tp2']),
+            'sl': float(fila['sl']),
+            'dca_niveles': [
+                {'nivel': k + 1, 'precio': float(precio), 'activado': bool(activado)}
+                for k, (precio, activado) in enumerate(zip(fila['dca'], fila['dca_activado']))
+                if not np.isnan(precio)
+            ],
+            'estado': 'ACTIVA',
+            'timestamp_apertura': None if np.isnan(fila['timestamp_apertura']) else datetime.fromtimestamp(fila['timestamp_apertura']),
+            'timestamp_cierre': None,
+            'resultado': None,
+            'profit': 0.0,
+            'niveles_dca_activados': int(fila['dca_activado'].sum()),
+            'precio_promedio': float(fila['precio_promedio']),
+            'leverage': float(fila['leverage'])
+        }
+
+
+class VistaOperaciones(Mapping):
+    """Acceso de solo lectura id -> dict de operación sobre un AlmacenPosiciones
+
+    Cada acceso construye una instantánea; los cambios se hacen a través del
+    almacén (GestorOperaciones).
+    """
+
+    def __init__(self, almacen):
+        self._almacen = almacen
+
+    def __getitem__(self, posicion_id):
+        operacion = self._almacen.obtener(posicion_id)
+        if operacion is None:
+            raise KeyError(posicion_id)
+        return operacion
+
+    def __iter__(self):
+        return iter(self._almacen.activas['id'].tolist())
+
+    def __len__(self):
+        return len(self._almacen)
@@ -0,0 +1,108 @@
+# almacen_velas.py - ALMACÉN LOCAL COLUMNAR DE VELAS OHLCV (NUMPY MEMMAP)
+import os
+import threading
+import numpy as np
+from velas_ohlcv import VelasOHLCV
+
+DIRECTORIO_VELAS = os.environ.get('DIRECTORIO_VELAS', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datos_velas'))
+
+# Una columna = un archivo binario plano (append-only) por símbolo e intervalo
+COLUMNAS = {
+    'timestamp': np.int64,
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.float64
+}
+
+
+class AlmacenVelas:
+    def __init__(self, directorio=None):
+        self.directorio = directorio or DIRECTORIO_VELAS
+        self._lock = threading.Lock()
+
+    def _ruta(self, simbolo, intervalo, columna):
+        return os.path.join(self.directorio, f"{simbolo}_{intervalo}", f"{columna}.bin")
+
+    def _columna(self, simbolo, intervalo, columna):
+        """Mapear una columna en memoria (solo lectura)"""
+        ruta = self._ruta(simbolo, intervalo, columna)
+        dtype = np.dtype(COLUMNAS[columna])
+        if not os.path.exists(ruta) or os.path.getsize(ruta) < dtype.itemsize:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(ruta, dtype=dtype, mode='r', shape=(os.path.getsize(ruta) // dtype.itemsize,))
+
+    def _longitud(self, simbolo, intervalo):
+        """Número de velas completas (todas las columnas escritas)"""
+        longitudes = []
+        for columna, dtype in COLUMNAS.items():
+            ruta = self._ruta(simbolo, intervalo, columna)
+            tamaño = os.path.getsize(ruta) if os.path.exists(ruta) else 0
+            longitudes.append(tamaño // np.dtype(dtype).itemsize)
+        return min(longitudes)
+
+    def ultimo_timestamp(self, simbolo, intervalo):
+        """Timestamp de la última vela almacenada o None"""
+        with self._lock:
+            n = self._longitud(simbolo, intervalo)
+            if n == 0:
+                return None
+            return int(self._columna(simbolo, intervalo, 'timestamp')[n - 1])
+
+    def primer_timestamp(self, simbolo, intervalo):
+        """Timestamp de la primera vela almacenada o None"""
+        with self._lock:
+            if self._longitud(simbolo, intervalo) == 0:
+                return None
+            return int(self._columna(simbolo, intervalo, 'timestamp')[0])
+
+    def leer(self, simbolo, intervalo, desde=None):
+        """Leer velas (copia de la cola mapeada) con timestamp >= desde"""
+        with self._lock:
+            n = self._longitud(simbolo, intervalo)
+            timestamps = self._columna(simbolo, intervalo, 'timestamp')[:n]
+            inicio = int(np.searchsorted(timestamps, desde, side='left')) if desde is not None else 0
+            return VelasOHLCV(*(
+                np.array(self._columna(simbolo, intervalo, columna)[inicio:n])
+                for columna in COLUMNAS
+            ))
+
+    def mapear(self, simbolo, intervalo):
+        """Velas sobre los archivos mapeados, sin copia (solo lectura)
+
+        Varios procesos que mapean el mismo símbolo comparten las páginas en
+        memoria en lugar de recibir cada uno una copia serializada.
+        """
+        with self._lock:
+            n = self._longitud(simbolo, intervalo)
+            return VelasOHLCV(*(self._columna(simbolo, intervalo, columna)[:n] for columna in COLUMNAS))
+
+    def agregar(self, simbolo, intervalo, velas):
+        """Añadir velas nuevas (VelasOHLCV); las ya almacenadas reemplazan la cola"""
+        if len(velas) == 0:
+            return 0
+
+        # Ordenar y quitar timestamps duplicados de la respuesta
+        timestamps, indices = np.unique(velas.timestamp, return_index=True)
+        nuevas = {columna: velas[columna][indices] for columna in COLUMNAS}
+
+        with self._lock:
+            os.makedirs(os.path.join(self.directorio, f"{simbolo}_{intervalo}"), exist_ok=True)
+            n = self._longitud(simbolo, intervalo)
+            guardados = self._columna(simbolo, intervalo, 'timestamp')[:n]
+            corte = int(np.searchsorted(guardados, timestamps[0], side='left'))
+            del guardados
+
+            for columna, dtype in COLUMNAS.items():
+                ruta = self._ruta(simbolo, intervalo, columna)
+                with open(ruta, 'ab') as f:
+                    # Recortar la cola solapada (última vela aún abierta) antes de añadir
+                    f.truncate(corte * np.dtype(dtype).itemsize)
+                    f.write(np.ascontiguousarray(nuevas[columna], dtype=dtype).tobytes())
+
+        return len(timestamps)
+
+
+# Instancia global compartida
+almacen_velas = AlmacenVelas()
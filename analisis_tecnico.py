@@ -1,54 +1,88 @@
 # analisis_tecnico.py - CON DETECCIÓN REAL DE S/R
+import time
+import threading
 import numpy as np
 import random
 from datetime import datetime, timedelta
 from indicadores_reales import IndicadoresReales
+from indicadores_vectorizados import mascara_pivots
+from indice_niveles_sr import IndiceNivelesSR
+
+SEGUNDOS_4H = 4 * 3600
 
 class AnalisisTechnicoSR:
     def __init__(self):
-        self.niveles_sr_historicos = {}
+        self.niveles_sr_historicos = {}  # par -> IndiceNivelesSR
+        self._locks_sr = {}  # un lock por par: una descarga lenta no bloquea al resto
+        self._lock_sr = threading.Lock()
+        # Umbrales RSI de la estrategia S/R Etapa 1
+        self.rsi_sobreventa = 32   # COMPRA confianza ALTA
+        self.rsi_compra = 35       # COMPRA confianza MEDIA
+        self.rsi_venta = 65        # VENTA confianza MEDIA
+        self.rsi_sobrecompra = 68  # VENTA confianza ALTA
         self.indicadores = IndicadoresReales()
         
     def detectar_niveles_sr(self, par, datos_precios):
         """Detectar niveles de Support/Resistance REALES"""
         return self.detectar_niveles_sr_reales(par)
         
-    def detectar_niveles_sr_reales(self, par):
-        """Detectar niveles S/R REALES basados en datos históricos"""
+    def _obtener_indice_sr(self, par):
+        """Índice S/R del par; solo se recalcula cuando puede haber cerrado una vela 4h"""
+        indice = self.niveles_sr_historicos.get(par)
+        ahora = time.time()
+        if indice is not None and ahora < indice.proxima_revision:
+            return indice
+        
+        # 4h derivado localmente de la serie base 1h (sin descarga adicional)
+        datos = self.indicadores.obtener_datos_timeframe(par, "3mo", "4h")
+        if datos is None or len(datos) < 100:
+            return indice
+        
+        velas = datos.validas()
+        if indice is None:
+            indice = IndiceNivelesSR(window=5)
+            self.niveles_sr_historicos[par] = indice
+        
+        indice.actualizar(velas)
+        # La vela 4h en curso cierra en timestamp + 4h; hasta entonces no hay pivots nuevos
+        indice.proxima_revision = max(int(velas.timestamp[-1]) + SEGUNDOS_4H, ahora + 60)
+        return indice
+    
+    def niveles_relevantes(self, par, precio_actual=None):
+        """Los 2 supports/resistances más cercanos al precio (None si no hay índice)"""
+        with self._lock_sr:
+            lock_par = self._locks_sr.setdefault(par, threading.Lock())
+        with lock_par:
+            indice = self._obtener_indice_sr(par)
+        
+        if indice is None or not len(indice):
+            return None
+        
+        if precio_actual is None:
+            precio_actual = indice.ultimo_cierre or self._get_precio_actual(par)
+        
+        return self.niveles_desde_indice(par, indice, precio_actual)
+    
+    def niveles_desde_indice(self, par, indice, precio_actual):
+        """Niveles relevantes de un IndiceNivelesSR (niveles base si un lado queda vacío)"""
+        # Búsqueda binaria en el índice ordenado
+        supports_relevantes = indice.supports_relevantes(precio_actual)
+        resistances_relevantes = indice.resistances_relevantes(precio_actual)
+        
+        return {
+            'support': supports_relevantes if supports_relevantes else self._niveles_sr_base(par)['support'],
+            'resistance': resistances_relevantes if resistances_relevantes else self._niveles_sr_base(par)['resistance']
+        }
+    
+    def detectar_niveles_sr_reales(self, par, precio_actual=None):
+        """Detectar niveles S/R REALES basados en datos históricos (índice incremental)"""
         try:
-            datos = self.indicadores.obtener_datos_historicos(par, "3mo", "4h")
+            niveles = self.niveles_relevantes(par, precio_actual)
             
-            if not datos or len(datos['close']) < 100:
+            if niveles is None:
                 print(f"⚠️ Datos insuficientes para S/R real de {par}, usando niveles base")
                 return self._niveles_sr_base(par)
             
-            highs = [h for h in datos['high'] if h is not None]
-            lows = [l for l in datos['low'] if l is not None]
-            closes = [c for c in datos['close'] if c is not None]
-            
-            if len(highs) < 50 or len(lows) < 50:
-                return self._niveles_sr_base(par)
-            
-            # Detectar resistance (niveles donde el precio rechazó)
-            resistances = self._detectar_pivots(highs, window=5, is_high=True)
-            
-            # Detectar support (niveles donde el precio rebotó)
-            supports = self._detectar_pivots(lows, window=5, is_high=False)
-            
-            # Filtrar niveles relevantes (últimos 2 meses)
-            precio_actual = closes[-1] if closes else self._get_precio_actual(par)
-            resistances_relevantes = [r for r in resistances if r > precio_actual * 0.98]
-            supports_relevantes = [s for s in supports if s < precio_actual * 1.02]
-            
-            # Ordenar y tomar los 2 más cercanos
-            resistances_relevantes.sort()
-            supports_relevantes.sort(reverse=True)
-            
-            niveles = {
-                'support': supports_relevantes[:2] if supports_relevantes else self._niveles_sr_base(par)['support'],
-                'resistance': resistances_relevantes[:2] if resistances_relevantes else self._niveles_sr_base(par)['resistance']
-            }
-            
             print(f"🏔️ {par} - S/R REALES: Support {[round(s, 4) for s in niveles['support']]}, Resistance {[round(r, 4) for r in niveles['resistance']]}")
             
             return niveles
@@ -58,36 +92,53 @@ class AnalisisTechnicoSR:
             return self._niveles_sr_base(par)
     
     def _detectar_pivots(self, prices, window=5, is_high=True):
-        """Detectar puntos pivote en los precios"""
-        pivots = []
-        
-        for i in range(window, len(prices) - window):
-            if prices[i] is None:
-                continue
-                
-            if is_high:
-                # Pivot high: el punto más alto en la ventana
-                window_prices = [p for p in prices[i-window:i+window+1] if p is not None]
-                if window_prices and prices[i] == max(window_prices):
-                    pivots.append(prices[i])
-            else:
-                # Pivot low: el punto más bajo en la ventana
-                window_prices = [p for p in prices[i-window:i+window+1] if p is not None]
-                if window_prices and prices[i] == min(window_prices):
-                    pivots.append(prices[i])
-        
-        # Eliminar duplicados cercanos (cluster de precios)
+        """Detectar puntos pivote en los precios (vectorizado con ventanas deslizantes)"""
+        prices = np.asarray(prices, dtype=np.float64)
+        pivots = prices[mascara_pivots(prices, window, es_maximo=is_high)]
+        return self._agrupar_pivots(pivots)
+    
+    def _agrupar_pivots(self, pivots):
+        """Eliminar duplicados cercanos (cluster de precios)"""
         pivots_unicos = []
-        if pivots:
-            avg_price = np.mean([p for p in pivots if p is not None])
+        if len(pivots):
+            avg_price = np.mean(pivots)
             tolerance = avg_price * 0.002  # 0.2% de tolerancia
             
-            for pivot in sorted(pivots):
+            for pivot in np.sort(pivots).tolist():
                 if not pivots_unicos or abs(pivot - pivots_unicos[-1]) > tolerance:
                     pivots_unicos.append(pivot)
         
         return pivots_unicos
     
+    def detectar_pivots_batch(self, pares, window=5, periodo="3mo", timeframe="4h"):
+        """Detectar pivots de varios pares en una sola pasada (matriz pares x velas)"""
+        series = {}
+        for par in pares:
+            datos = self.indicadores.obtener_datos_timeframe(par, periodo, timeframe)
+            if datos is not None and len(datos):
+                series[par] = datos.validas()
+        if not series:
+            return {}
+        
+        pares_validos = list(series)
+        longitudes = np.array([len(series[par]) for par in pares_validos])
+        highs = np.full((len(pares_validos), longitudes.max()), np.nan)
+        lows = np.full_like(highs, np.nan)
+        for fila, par in enumerate(pares_validos):
+            highs[fila, :longitudes[fila]] = series[par].high
+            lows[fila, :longitudes[fila]] = series[par].low
+        
+        mascara_highs = mascara_pivots(highs, window, es_maximo=True, longitudes=longitudes)
+        mascara_lows = mascara_pivots(lows, window, es_maximo=False, longitudes=longitudes)
+        
+        return {
+            par: {
+                'resistance': self._agrupar_pivots(highs[fila][mascara_highs[fila]]),
+                'support': self._agrupar_pivots(lows[fila][mascara_lows[fila]])
+            }
+            for fila, par in enumerate(pares_validos)
+        }
+    
     def _get_precio_actual(self, par):
         """Obtener precio actual como fallback"""
         from yahoo_api import YahooFinanceAPI
@@ -108,33 +159,44 @@ class AnalisisTechnicoSR:
         }
         return niveles_base.get(par, {'support': [1.0000, 1.0050], 'resistance': [1.0100, 1.0150]})
     
+    def umbral_proximidad_pct(self, par):
+        """Distancia máxima (fracción del precio) para considerar un nivel cercano"""
+        if par in ['XAUUSD', 'XAGUSD', 'XPTUSD']:  # Metales
+            return 0.005  # 0.5%
+        elif par in ['OILUSD']:  # Energía
+            return 0.008  # 0.8%
+        else:  # Forex
+            return 0.002  # 0.2%
+    
+    def rsi_en_banda_operable(self, rsi):
+        """Fuera de esta banda analizar_estructura_mercado nunca emite señal"""
+        return rsi < self.rsi_compra or rsi > self.rsi_venta
+    
     def analizar_estructura_mercado(self, par, precio_actual, tendencia, rsi):
         """Análisis completo de estructura de mercado S/R"""
-        # Obtener niveles S/R REALES
-        niveles_sr = self.detectar_niveles_sr_reales(par)
-        
+        # Obtener niveles S/R REALES (relevantes respecto al precio actual)
+        niveles_sr = self.detectar_niveles_sr_reales(par, precio_actual)
+        return self.evaluar_estructura(par, precio_actual, tendencia, rsi, niveles_sr)
+    
+    def evaluar_estructura(self, par, precio_actual, tendencia, rsi, niveles_sr):
+        """Reglas S/R Etapa 1 sobre niveles ya calculados (sin acceso a datos)"""
         # Determinar proximidad a niveles clave
         distancia_support = min([abs(precio_actual - s) for s in niveles_sr['support']])
         distancia_resistance = min([abs(precio_actual - r) for r in niveles_sr['resistance']])
         
         # Determinar umbral según tipo de activo
-        if par in ['XAUUSD', 'XAGUSD', 'XPTUSD']:  # Metales
-            umbral_proximidad = precio_actual * 0.005  # 0.5%
-        elif par in ['OILUSD']:  # Energía
-            umbral_proximidad = precio_actual * 0.008  # 0.8%
-        else:  # Forex
-            umbral_proximidad = precio_actual * 0.002  # 0.2%
+        umbral_proximidad = precio_actual * self.umbral_proximidad_pct(par)
         
         # 🎯 ESTRATEGIA S/R ETAPA 1 - APLICABLE A TODOS LOS ACTIVOS
         condiciones_compra_alta = (
             distancia_support < umbral_proximidad and  # Cerca de support
-            rsi < 32 and                              # RSI oversold
+            rsi < self.rsi_sobreventa and             # RSI oversold
             tendencia == "ALCISTA"                    # Tendencia alcista
         )
         
         condiciones_venta_alta = (
             distancia_resistance < umbral_proximidad and  # Cerca de resistance
-            rsi > 68 and                                  # RSI overbought  
+            rsi > self.rsi_sobrecompra and                # RSI overbought  
             tendencia == "BAJISTA"                        # Tendencia bajista
         )
         
@@ -143,7 +205,7 @@ class AnalisisTechnicoSR:
             señal = "COMPRA"
             confianza = "ALTA"
             motivo = f"🎯 REBOTE S/R: {par} en Support + RSI Oversold + Tendencia Alcista"
-        elif distancia_support < umbral_proximidad and rsi < 35:
+        elif distancia_support < umbral_proximidad and rsi < self.rsi_compra:
             señal = "COMPRA" 
             confianza = "MEDIA"
             motivo = f"📊 {par} cerca de Support + RSI Bajista"
@@ -157,7 +219,7 @@ class AnalisisTechnicoSR:
             señal = "VENTA"
             confianza = "ALTA" 
             motivo = f"🎯 RECHAZO S/R: {par} en Resistance + RSI Overbought + Tendencia Bajista"
-        elif distancia_resistance < umbral_proximidad and rsi > 65:
+        elif distancia_resistance < umbral_proximidad and rsi > self.rsi_venta:
             señal = "VENTA"
             confianza = "MEDIA"
             motivo = f"📊 {par} cerca de Resistance + RSI Alcista"
@@ -13,6 +13,9 @@ print("=" * 70)
 app = Flask(__name__)
 start_time = datetime.now()
 bot_activo = False
+monitor = None
+# Serializa /iniciar-bot: dos peticiones seguidas no pueden crear dos monitores
+lock_bot = threading.Lock()
 
 @app.route('/')
 def home():
@@ -24,7 +27,7 @@ def home():
         "current_time": datetime.now().isoformat(),
         "endpoints": [
             "/", "/health", "/status", "/test", 
-            "/iniciar-bot", "/detener-bot"
+            "/iniciar-bot", "/detener-bot", "/reanudar-bot", "/metricas"
         ]
     })
 
@@ -54,49 +57,88 @@ def test():
 
 @app.route('/iniciar-bot')
 def iniciar_bot():
-    global bot_activo
-    try:
-        from monitor_mercado import MonitorMercado
-        monitor = MonitorMercado()
-        
-        def ejecutar_bot():
-            global bot_activo
-            try:
-                print("🤖 INICIANDO BOT DE TRADING...")
-                monitor.iniciar_monitoreo()
-            except Exception as e:
-                print(f"❌ Error en bot: {e}")
-                bot_activo = False
-        
-        # Iniciar en hilo separado
-        hilo = threading.Thread(target=ejecutar_bot, daemon=True)
-        hilo.start()
-        
-        bot_activo = True
-        time.sleep(3)
-        
-        return jsonify({
-            "status": "success",
-            "message": "Bot iniciado correctamente",
-            "bot_activo": True
-        })
-        
-    except Exception as e:
-        return jsonify({
-            "status": "error", 
-            "message": f"Error: {str(e)}"
-        })
+    global bot_activo, monitor
+    with lock_bot:
+        if monitor is not None and monitor.monitoreando:
+            # No sustituir un monitor en marcha (seguiría corriendo sin referencia)
+            return jsonify({
+                "status": "success",
+                "message": "El bot ya estaba en marcha",
+                "bot_activo": True
+            })
+        try:
+            from monitor_mercado import MonitorMercado
+            nuevo_monitor = MonitorMercado()
+            
+            def ejecutar_bot():
+                global bot_activo
+                try:
+                    print("🤖 INICIANDO BOT DE TRADING...")
+                    nuevo_monitor.iniciar_monitoreo()
+                except Exception as e:
+                    print(f"❌ Error en bot: {e}")
+                    bot_activo = False
+            
+            # Iniciar en hilo separado
+            monitor = nuevo_monitor
+            hilo = threading.Thread(target=ejecutar_bot, daemon=True)
+            hilo.start()
+            
+            bot_activo = True
+            time.sleep(3)
+            
+            return jsonify({
+                "status": "success",
+                "message": "Bot iniciado correctamente",
+                "bot_activo": True
+            })
+            
+        except Exception as e:
+            return jsonify({
+                "status": "error", 
+                "message": f"Error: {str(e)}"
+            })
 
 @app.route('/detener-bot')
 def detener_bot():
     global bot_activo
     bot_activo = False
+    if monitor is not None:
+        monitor.detener_monitoreo()
     return jsonify({
         "status": "success",
         "message": "Bot detenido",
         "bot_activo": False
     })
 
+@app.route('/reanudar-bot')
+def reanudar_bot():
+    """Levantar el bloqueo por límite de riesgo (drawdown o pérdidas consecutivas)
+    
+    El bloqueo se mantiene tras reinicios hasta que un operador lo levanta aquí.
+    """
+    if monitor is None:
+        return jsonify({"status": "error", "message": "Bot no iniciado"})
+    try:
+        motivo = monitor.reanudar_operativa()
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Error: {str(e)}"})
+    return jsonify({
+        "status": "success",
+        "message": f"Operativa reanudada (bloqueo: {motivo})" if motivo else "La operativa no estaba bloqueada",
+        "riesgo": monitor.obtener_estadisticas_riesgo()
+    })
+
+@app.route('/metricas')
+def metricas():
+    if monitor is None:
+        return jsonify({"status": "error", "message": "Bot no iniciado"})
+    return jsonify({
+        "status": "success",
+        "monitor": monitor.obtener_metricas(),
+        "riesgo": monitor.obtener_estadisticas_riesgo()
+    })
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 10000))
     print(f"🌐 INICIANDO SERVIDOR EN PUERTO: {port}")
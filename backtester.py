@@ -0,0 +1,357 @@
+# backtester.py - BACKTESTING HISTÓRICO CON LA LÓGICA REAL DE LA ESTRATEGIA S/R
+import time
+import numpy as np
+from datetime import datetime
+from velas_ohlcv import VelasOHLCV, COLUMNAS_OHLCV
+from resampleo_velas import resamplear_ohlcv, SEGUNDOS_INTERVALO
+from indicadores_vectorizados import rsi_wilder
+from indice_niveles_sr import IndiceNivelesSR
+from motor_salidas import resolver_salidas
+
+# Mismo mínimo de velas 4h que AnalisisTechnicoSR._obtener_indice_sr
+MIN_VELAS_SR = 100
+# Cada vela se recorre como open -> extremo adverso -> extremo favorable -> close
+PASOS_POR_VELA = 4
+
+
+def cargar_velas_archivo(ruta):
+    """Leer velas de un .npz o un CSV con cabecera timestamp,open,high,low,close,volume"""
+    if ruta.endswith('.npz'):
+        with np.load(ruta) as datos:
+            return VelasOHLCV(*(datos[c] if c in datos.files else None for c in COLUMNAS_OHLCV))
+    datos = np.atleast_1d(np.genfromtxt(ruta, delimiter=',', names=True))
+    return VelasOHLCV(*(datos[c] if c in datos.dtype.names else None for c in COLUMNAS_OHLCV))
+
+
+def tendencia_serie(cierres, periodo=20):
+    """IndicadoresReales.determinar_tendencia en cada vela (medias con sumas acumuladas)"""
+    cierres = np.asarray(cierres, dtype=np.float64)
+    acumulado = np.concatenate([[0.0], np.cumsum(cierres)])
+    longitudes = np.arange(1, len(cierres) + 1)
+    n_rapida, n_lenta = periodo // 2, periodo
+    ma_rapida = (acumulado[longitudes] - acumulado[np.maximum(longitudes - n_rapida, 0)]) / n_rapida
+    ma_lenta = (acumulado[longitudes] - acumulado[np.maximum(longitudes - n_lenta, 0)]) / n_lenta
+    con_datos = longitudes >= n_lenta
+    return np.select(
+        [con_datos & (ma_rapida > ma_lenta * 1.002), con_datos & (ma_rapida < ma_lenta * 0.998)],
+        ["ALCISTA", "BAJISTA"], "LATERAL"
+    )
+
+
+def expandir_camino(velas, inicio, fin, direccion):
+    """Camino intra-vela pesimista: el extremo adverso se toca antes que el favorable"""
+    if direccion == "COMPRA":
+        adverso, favorable = velas.low[inicio:fin], velas.high[inicio:fin]
+    else:
+        adverso, favorable = velas.high[inicio:fin], velas.low[inicio:fin]
+    return np.column_stack([velas.open[inicio:fin], adverso, favorable, velas.close[inicio:fin]]).ravel()
+
+
+def precio_ejecucion(camino, salida):
+    """Precio de cierre de la primera fila de resolver_salidas(..., cierre_en_nivel=True)
+
+    TP/SL se ejecutan en su nivel, salvo un hueco en la apertura de una vela
+    que salta el SL: el stop se ejecuta entonces a la apertura.
+    """
+    paso = int(salida['paso'][0])
+    if salida['resultado'][0] == 'SL' and not salida['timeout'][0] and paso % PASOS_POR_VELA == 0:
+        return float(camino[paso])
+    return float(salida['precio_cierre'][0])
+
+
+def estadisticas_operaciones(profits, fraccion_por_operacion=0.1):
+    """Winrate, rentabilidad (suma de profits %, como profit_total), profit factor y drawdown"""
+    profits = np.asarray(profits, dtype=np.float64)
+    if len(profits) == 0:
+        return {'operaciones': 0, 'winrate': 0.0, 'rentabilidad': 0.0, 'profit_medio': 0.0,
+                'profit_factor': 0.0, 'max_drawdown': 0.0}
+
+    ganancias = profits[profits > 0].sum()
+    perdidas = -profits[profits <= 0].sum()
+    curva = np.cumprod(np.maximum(1 + profits / 100 * fraccion_por_operacion, 0.0))
+    picos = np.maximum.accumulate(np.r_[1.0, curva])[1:]
+
+    return {
+        'operaciones': len(profits),
+        'winrate': round(float((profits > 0).mean()) * 100, 1),
+        'rentabilidad': round(float(profits.sum()), 2),
+        'profit_medio': round(float(profits.mean()), 2),
+        'profit_factor': round(float(ganancias / perdidas), 2) if perdidas > 0 else float('inf'),
+        'max_drawdown': round(float(np.max(1 - curva / picos)) * 100, 2)
+    }
+
+
+class Backtester:
+    """Reproduce velas históricas con AnalisisTechnicoSR, EstrategiaDCA y GestorOperaciones
+
+    RSI y tendencia se precalculan sobre toda la serie; solo las velas con
+    RSI fuera de la banda neutra llegan a las reglas S/R. El índice S/R se
+    alimenta con las velas 4h a medida que cierran, así cada decisión solo
+    ve niveles ya confirmados en ese momento.
+    """
+
+    def __init__(self, parametros=None, capital_inicial=None, fraccion_por_operacion=0.1,
+                 max_barras=120, intervalo='1h', analisis_sr=None):
+        from config import PARAMETROS_POR_PAR, RISK_MANAGEMENT
+        self.parametros = parametros or PARAMETROS_POR_PAR
+        self.capital_inicial = capital_inicial or RISK_MANAGEMENT['capital_inicial']
+        self.fraccion_por_operacion = fraccion_por_operacion
+        self.max_barras = max_barras  # cierre forzado tras N velas (5 días en 1h)
+        self.intervalo = intervalo
+        # IMPORTACIONES DIFERIDAS
+        self.analisis_sr = analisis_sr
+        self.estrategia = None
+        self.gestor = None
+
+    def _get_analisis_sr(self):
+        if self.analisis_sr is None:
+            from analisis_tecnico import AnalisisTechnicoSR
+            self.analisis_sr = AnalisisTechnicoSR()
+        return self.analisis_sr
+
+    def _get_estrategia(self):
+        if self.estrategia is None:
+            from estrategia_dca import EstrategiaDCA
+            self.estrategia = EstrategiaDCA()
+            self.estrategia.analisis_sr = self._get_analisis_sr()
+        return self.estrategia
+
+    def descargar_historico(self, pares, periodo="2y"):
+        """Rellenar el almacén local con el histórico de Yahoo (1h: máximo ~730 días)"""
+        from indicadores_reales import IndicadoresReales
+        datos = IndicadoresReales().obtener_historicos_batch(pares, periodo, self.intervalo)
+        return {par: len(velas) if velas is not None else 0 for par, velas in datos.items()}
+
+    def cargar_velas(self, par, ruta=None, desde=None, hasta=None):
+        """Velas válidas del par desde un archivo o del almacén local"""
+        if ruta is not None:
+            velas = cargar_velas_archivo(ruta)
+        else:
+            from almacen_velas import almacen_velas
+            velas = almacen_velas.leer(par, self.intervalo, desde)
+
+        velas = velas.validas()
+        if desde is not None:
+            velas = velas.desde(desde)
+        if hasta is not None:
+            velas = velas.recortar(fin=int(np.searchsorted(velas.timestamp, hasta, side='left')))
+        return velas
+
+    def calcular_series(self, par, velas, rsi_compra=None, rsi_venta=None):
+        """RSI, tendencia y niveles S/R de cada vela candidata, sin aplicar las reglas
+
+        Los niveles solo se guardan para velas con RSI fuera de la banda
+        [rsi_compra, rsi_venta] (por defecto la del análisis); con una banda
+        contenida en la de cualquier umbral a probar, la misma serie sirve
+        para todos los umbrales.
+        """
+        analisis = self._get_analisis_sr()
+        rsi_compra = analisis.rsi_compra if rsi_compra is None else rsi_compra
+        rsi_venta = analisis.rsi_venta if rsi_venta is None else rsi_venta
+        segundos = SEGUNDOS_INTERVALO[self.intervalo]
+
+        timestamps = velas.timestamp
+        cierres = velas.close
+        rsi = np.round(rsi_wilder(cierres), 2)
+        tendencias = tendencia_serie(cierres)
+        # Misma regla que rsi_en_banda_operable (NaN = sin RSI, nunca candidata)
+        indices = np.flatnonzero((rsi < rsi_compra) | (rsi > rsi_venta))
+
+        velas_4h = resamplear_ohlcv(velas, '4h', self.intervalo)
+        cierres_4h = (velas_4h.timestamp + SEGUNDOS_INTERVALO['4h']).tolist()
+        ts_4h, highs_4h, lows_4h = velas_4h.timestamp.tolist(), velas_4h.high.tolist(), velas_4h.low.tolist()
+        indice = IndiceNivelesSR(window=5)
+        j = 0
+
+        candidatas, niveles = [], []
+        for i in indices.tolist():
+            if i >= len(velas) - 1:
+                break
+
+            # Alimentar el índice con las velas 4h cerradas hasta el cierre de esta vela
+            cierre_vela = int(timestamps[i]) + segundos
+            while j < len(ts_4h) and cierres_4h[j] <= cierre_vela:
+                indice.agregar_vela(ts_4h[j], highs_4h[j], lows_4h[j])
+                j += 1
+            if j < MIN_VELAS_SR or not len(indice):
+                continue
+
+            candidatas.append(i)
+            niveles.append(analisis.niveles_desde_indice(par, indice, float(cierres[i])))
+
+        return {'rsi': rsi, 'tendencias': tendencias, 'candidatas': candidatas, 'niveles': niveles}
+
+    def detectar_señales(self, par, velas, series=None, rango=None):
+        """Velas donde la estrategia emitiría señal, sin estado de posición
+
+        No dependen de dca_niveles/tp_niveles/sl/leverage, así que se calculan
+        una vez por par y se reutilizan al variar esos parámetros. `rango`
+        (inicio, fin) limita las velas de entrada por índice.
+        """
+        analisis = self._get_analisis_sr()
+        if series is None:
+            series = self.calcular_series(par, velas)
+        inicio, fin = rango or (0, len(velas))
+
+        señales = []
+        for i, niveles in zip(series['candidatas'], series['niveles']):
+            if i < inicio:
+                continue
+            if i >= fin - 1:
+                break
+
+            precio, rsi_vela, tendencia = float(velas.close[i]), float(series['rsi'][i]), str(series['tendencias'][i])
+            if not analisis.rsi_en_banda_operable(rsi_vela):
+                continue
+            analisis_sr = analisis.evaluar_estructura(par, precio, tendencia, rsi_vela, niveles)
+            if not analisis_sr['señal']:
+                continue
+            if analisis_sr['señal'] == "COMPRA" and not analisis.es_zona_compra_optima(analisis_sr):
+                continue
+            if analisis_sr['señal'] == "VENTA" and not analisis.es_zona_venta_optima(analisis_sr):
+                continue
+
+            señales.append({'indice': i, 'precio': precio, 'rsi': rsi_vela,
+                            'tendencia': tendencia, 'analisis_sr': analisis_sr})
+
+        return señales
+
+    def simular_par(self, par, velas, gestor, params=None, señales=None, rango=None):
+        """Recorrer las señales de un par (una posición abierta como máximo)
+
+        Con `rango` (inicio, fin) las salidas tampoco usan velas desde `fin`.
+        """
+        estrategia = self._get_estrategia()
+        if params is None:
+            params = self.parametros.get(par, self.parametros['EURUSD'])
+        if señales is None:
+            señales = self.detectar_señales(par, velas, rango=rango)
+        limite = rango[1] if rango else len(velas)
+        segundos = SEGUNDOS_INTERVALO[self.intervalo]
+        timestamps = velas.timestamp
+
+        operaciones = []
+        libre_desde = rango[0] if rango else 0
+        for señal_sr in señales:
+            i = señal_sr['indice']
+            if i < libre_desde:
+                continue
+            if i >= limite - 1:
+                break
+
+            cierre_vela = int(timestamps[i]) + segundos
+            precio, rsi_vela, tendencia = señal_sr['precio'], señal_sr['rsi'], señal_sr['tendencia']
+            analisis_sr = señal_sr['analisis_sr']
+
+            apertura = datetime.fromtimestamp(cierre_vela)
+            señal = estrategia.construir_señal(par, precio, rsi_vela, tendencia, 'BACKTEST', analisis_sr, params, apertura)
+            operacion_id = gestor.abrir_operacion(señal, apertura)
+            entrada = gestor.operaciones_activas[operacion_id]
+
+            # Salida sobre el camino real posterior a la entrada
+            fin = min(limite, i + 1 + self.max_barras)
+            camino = expandir_camino(velas, i + 1, fin, señal['direccion'])
+            salida = resolver_salidas(
+                camino, señal['direccion'], entrada['precio_entrada'],
+                entrada['tp1'], entrada['tp2'], entrada['sl'],
+                [nivel['precio'] for nivel in entrada['dca_niveles']], entrada['leverage'],
+                cierre_en_nivel=True
+            )
+            barra = i + 1 + int(salida['paso'][0]) // PASOS_POR_VELA
+            timestamp_cierre = int(timestamps[barra]) + segundos
+
+            cierre = gestor.cerrar_operacion(
+                operacion_id, str(salida['resultado'][0]), precio_ejecucion(camino, salida),
+                salida['dca_activados'][0].tolist(), datetime.fromtimestamp(timestamp_cierre)
+            )
+            operacion = cierre['operacion']
+            operaciones.append({
+                'par': par,
+                'direccion': señal['direccion'],
+                'confianza': señal['confianza'],
+                'timestamp_apertura': cierre_vela,
+                'timestamp_cierre': timestamp_cierre,
+                'barras': barra - i,
+                'precio_entrada': operacion['precio_entrada'],
+                'precio_promedio': operacion['precio_promedio'],
+                'precio_cierre': operacion['precio_cierre'],
+                'niveles_dca_activados': operacion['niveles_dca_activados'],
+                'resultado': cierre['resultado'],
+                'timeout': bool(salida['timeout'][0]),
+                'profit': cierre['profit']
+            })
+            # Nueva entrada posible desde el cierre de la vela de salida
+            libre_desde = barra
+
+        return operaciones
+
+    def curva_equity(self, operaciones):
+        """Capital compuesto al cierre de cada operación (fracción fija del capital por operación)"""
+        operaciones = sorted(operaciones, key=lambda op: op['timestamp_cierre'])
+        profits = np.array([op['profit'] for op in operaciones], dtype=np.float64)
+        factores = np.maximum(1 + profits / 100 * self.fraccion_por_operacion, 0.0)
+        return {
+            'timestamp': np.array([op['timestamp_cierre'] for op in operaciones], dtype=np.int64),
+            'capital': np.round(self.capital_inicial * np.cumprod(factores), 2)
+        }
+
+    def ejecutar(self, pares=None, rutas=None, desde=None, hasta=None):
+        """Backtest de varios pares: operaciones, curva de equity y estadísticas por par"""
+        from gestor_operaciones import GestorOperaciones
+        if pares is None:
+            from config import TOP_PARES
+            pares = TOP_PARES
+
+        inicio = time.monotonic()
+        self.gestor = GestorOperaciones()
+        operaciones = []
+        estadisticas_par = {}
+
+        for par in pares:
+            velas = self.cargar_velas(par, (rutas or {}).get(par), desde, hasta)
+            if len(velas) < 2:
+                print(f"⚠️ Sin velas históricas para {par}, se omite")
+                continue
+
+            operaciones_par = self.simular_par(par, velas, self.gestor)
+            operaciones.extend(operaciones_par)
+
+            params = self.parametros.get(par, self.parametros['EURUSD'])
+            estadisticas = estadisticas_operaciones([op['profit'] for op in operaciones_par], self.fraccion_por_operacion)
+            estadisticas.update({
+                'velas': len(velas),
+                'resultados': {r: sum(op['resultado'] == r for op in operaciones_par) for r in ('TP1', 'TP2', 'SL')},
+                'winrate_esperado': params['winrate'],
+                'rentabilidad_esperada': params['rentabilidad']
+            })
+            estadisticas_par[par] = estadisticas
+
+        operaciones.sort(key=lambda op: op['timestamp_cierre'])
+        equity = self.curva_equity(operaciones)
+        resumen = estadisticas_operaciones([op['profit'] for op in operaciones], self.fraccion_por_operacion)
+        resumen['capital_inicial'] = self.capital_inicial
+        resumen['capital_final'] = float(equity['capital'][-1]) if len(equity['capital']) else self.capital_inicial
+        duracion = round(time.monotonic() - inicio, 3)
+
+        print(f"📈 Backtest: {len(estadisticas_par)} pares, {resumen['operaciones']} operaciones, "
+              f"winrate {resumen['winrate']}%, capital {resumen['capital_inicial']} -> {resumen['capital_final']} en {duracion}s")
+
+        return {
+            'operaciones': operaciones,
+            'equity': equity,
+            'estadisticas_par': estadisticas_par,
+            'resumen': resumen,
+            'duracion': duracion
+        }
+
+
+# Prueba rápida
+if __name__ == "__main__":
+    print("🚀 BACKTEST S/R ETAPA 1 - ALMACÉN LOCAL DE VELAS")
+    backtester = Backtester()
+    resultado = backtester.ejecutar()
+
+    for par, stats in resultado['estadisticas_par'].items():
+        print(f"   {par}: {stats['operaciones']} ops, winrate {stats['winrate']}% (esperado {stats['winrate_esperado']}%), "
+              f"rentabilidad {stats['rentabilidad']}% (esperada {stats['rentabilidad_esperada']}%), "
+              f"PF {stats['profit_factor']}, DD {stats['max_drawdown']}%")
@@ -0,0 +1,334 @@
+# barrido_parametros.py - BARRIDO MULTIPROCESO DE PARÁMETROS DCA/TP/SL/LEVERAGE (REANUDABLE)
+import os
+import json
+import shutil
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from almacen_velas import AlmacenVelas
+from backtester import Backtester, estadisticas_operaciones
+
+CAMPOS_PARAMETROS = ('dca_niveles', 'tp_niveles', 'sl', 'leverage')
+
+# Configuración con la que se crearon las velas y resultados de un directorio
+NOMBRE_MANIFIESTO = 'manifiesto.json'
+
+# Rejilla por defecto alrededor de los valores de config.PARAMETROS_POR_PAR
+ESPACIO_PARAMETROS = {
+    'dca_niveles': [[0.004, 0.008], [0.006, 0.012], [0.008, 0.016], [0.010, 0.020], [0.015, 0.030]],
+    'tp_niveles': [[0.012, 0.020], [0.015, 0.025], [0.020, 0.035], [0.030, 0.050], [0.040, 0.070]],
+    'sl': [0.010, 0.012, 0.015, 0.020, 0.025, 0.035],
+    'leverage': [8, 10, 15, 20]
+}
+
+# Tabla ordenada de resultados (una fila por par y combinación)
+DTYPE_BARRIDO = np.dtype([
+    ('par', 'U16'),
+    ('dca_1', 'f8'),
+    ('dca_2', 'f8'),
+    ('tp1', 'f8'),
+    ('tp2', 'f8'),
+    ('sl', 'f8'),
+    ('leverage', 'f8'),
+    ('operaciones', 'i8'),
+    ('winrate', 'f8'),
+    ('rentabilidad', 'f8'),
+    ('profit_medio', 'f8'),
+    ('profit_factor', 'f8'),
+    ('max_drawdown', 'f8')
+])
+
+
+def generar_combinaciones(espacio=None, n_muestras=None, semilla=None):
+    """Rejilla completa o `n_muestras` combinaciones al azar (sin repetición) del espacio
+
+    Con una semilla fija la muestra es siempre la misma, así una ejecución
+    reanudada evalúa exactamente las combinaciones que faltaban.
+    """
+    espacio = dict(ESPACIO_PARAMETROS, **(espacio or {}))
+    opciones = [espacio[campo] for campo in CAMPOS_PARAMETROS]
+    total = int(np.prod([len(valores) for valores in opciones]))
+
+    if n_muestras is None or n_muestras >= total:
+        indices = range(total)
+    else:
+        indices = np.sort(np.random.default_rng(semilla).choice(total, n_muestras, replace=False)).tolist()
+
+    combinaciones = []
+    for indice in indices:
+        # Índice -> una opción por campo (numeración mixta, el último campo varía más rápido)
+        combinacion = {}
+        for campo, valores in zip(reversed(CAMPOS_PARAMETROS), reversed(opciones)):
+            indice, resto = divmod(indice, len(valores))
+            combinacion[campo] = valores[resto]
+        # Un DCA más allá del SL nunca se ejecuta
+        if max(combinacion['dca_niveles']) >= combinacion['sl']:
+            continue
+        combinaciones.append({campo: combinacion[campo] for campo in CAMPOS_PARAMETROS})
+    return combinaciones
+
+
+def espacio_de_par(espacio, par):
+    """Espacio del par en un dict par -> espacio, o el espacio común"""
+    if not espacio:
+        return None
+    if par in espacio:
+        return espacio[par]
+    return {campo: valores for campo, valores in espacio.items() if campo in CAMPOS_PARAMETROS} or None
+
+
+def clave_combinacion(par, combinacion):
+    return json.dumps([par, {campo: combinacion[campo] for campo in CAMPOS_PARAMETROS}])
+
+
+def manifiesto_velas(pares, intervalo='1h', rutas=None, desde=None, hasta=None):
+    """Ventana, intervalo y origen de las velas de cada par (formato de manifiesto.json)"""
+    rutas = rutas or {}
+    return {
+        'intervalo': intervalo,
+        'desde': None if desde is None else float(desde),
+        'hasta': None if hasta is None else float(hasta),
+        'rutas': {par: None if rutas.get(par) is None else os.path.abspath(rutas[par]) for par in pares}
+    }
+
+
+def diferencias_manifiesto(guardado, manifiesto):
+    """Campos que no coinciden; en 'rutas' solo cuentan los pares presentes en ambos"""
+    diferencias = [campo for campo in manifiesto if campo != 'rutas' and guardado.get(campo) != manifiesto[campo]]
+    rutas = guardado.get('rutas', {})
+    diferencias += [f"ruta {par}" for par, ruta in manifiesto['rutas'].items() if par in rutas and rutas[par] != ruta]
+    return diferencias
+
+
+def comprobar_manifiesto(directorio, manifiesto, borrar=(), reconstruir=False):
+    """Reutilizar los datos de `directorio` solo si se crearon con la misma configuración
+
+    Si el manifiesto guardado difiere (o hay datos en `borrar` sin
+    manifiesto) se lanza ValueError; con `reconstruir` se borran las rutas
+    de `borrar` para empezar de cero. Los pares nuevos no son diferencia:
+    se añaden al manifiesto guardado.
+    """
+    ruta = os.path.join(directorio, NOMBRE_MANIFIESTO)
+    guardado = None
+    if os.path.exists(ruta):
+        with open(ruta, encoding='utf-8') as f:
+            guardado = json.load(f)
+
+    if guardado is not None:
+        diferencias = diferencias_manifiesto(guardado, manifiesto)
+    else:
+        diferencias = ['sin manifiesto'] if any(os.path.exists(r) for r in borrar) else []
+
+    if diferencias:
+        if not reconstruir:
+            raise ValueError(f"{directorio} contiene datos de otra configuración ({', '.join(diferencias)}); "
+                             f"usar otro directorio o reconstruir=True")
+        print(f"♻️ Configuración distinta en {directorio} ({', '.join(diferencias)}), se reconstruye")
+        for r in borrar:
+            if os.path.isdir(r):
+                shutil.rmtree(r)
+            elif os.path.exists(r):
+                os.remove(r)
+    elif guardado is not None:
+        manifiesto = dict(manifiesto, rutas=dict(guardado.get('rutas', {}), **manifiesto['rutas']))
+
+    os.makedirs(directorio, exist_ok=True)
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, indent=2)
+    return manifiesto
+
+
+def preparar_almacen(almacen, pares, intervalo='1h', rutas=None, desde=None, hasta=None):
+    """Copiar las velas válidas de cada par a un almacén propio (solo la primera vez)"""
+    backtester = Backtester(intervalo=intervalo)
+    preparados = []
+    for par in pares:
+        if almacen.ultimo_timestamp(par, intervalo) is None:
+            velas = backtester.cargar_velas(par, (rutas or {}).get(par), desde, hasta)
+            if len(velas) < 2:
+                print(f"⚠️ Sin velas históricas para {par}, se omite")
+                continue
+            almacen.agregar(par, intervalo, velas)
+        preparados.append(par)
+    return preparados
+
+
+# Estado por proceso trabajador: velas mapeadas y señales detectadas una sola vez
+_ESTADO_PROCESO = {}
+
+
+def _preparar_par(directorio, par, intervalo):
+    clave = (directorio, par, intervalo)
+    if clave not in _ESTADO_PROCESO:
+        backtester = _ESTADO_PROCESO.setdefault(('backtester', intervalo), Backtester(intervalo=intervalo))
+        velas = AlmacenVelas(directorio).mapear(par, intervalo)
+        _ESTADO_PROCESO[clave] = (velas, backtester.detectar_señales(par, velas))
+    return _ESTADO_PROCESO[('backtester', intervalo)], _ESTADO_PROCESO[clave]
+
+
+def evaluar_lote(directorio, par, combinaciones, intervalo='1h', fraccion_por_operacion=0.1, max_barras=120):
+    """Evaluar un lote de combinaciones de un par (se ejecuta en el proceso trabajador)"""
+    from config import PARAMETROS_POR_PAR
+    from gestor_operaciones import GestorOperaciones
+
+    backtester, (velas, señales) = _preparar_par(directorio, par, intervalo)
+    backtester.fraccion_por_operacion = fraccion_por_operacion
+    backtester.max_barras = max_barras
+    base = PARAMETROS_POR_PAR.get(par, PARAMETROS_POR_PAR['EURUSD'])
+
+    resultados = []
+    for combinacion in combinaciones:
+        operaciones = backtester.simular_par(par, velas, GestorOperaciones(), dict(base, **combinacion), señales)
+        estadisticas = estadisticas_operaciones([op['profit'] for op in operaciones], fraccion_por_operacion)
+        resultados.append(dict({'clave': clave_combinacion(par, combinacion), 'par': par}, **combinacion, **estadisticas))
+    return resultados
+
+
+class BarridoParametros:
+    """Evalúa combinaciones de parámetros por par con un pool de procesos
+
+    Las velas se copian una vez a un almacén propio del barrido y cada
+    proceso las mapea en memoria. Cada lote terminado se añade a
+    `resultados.jsonl`; al relanzar sobre el mismo directorio solo se
+    evalúan las combinaciones que faltan.
+    """
+
+    def __init__(self, directorio, intervalo='1h', max_workers=None, tamaño_lote=32,
+                 fraccion_por_operacion=0.1, max_barras=120):
+        self.directorio = directorio
+        self.intervalo = intervalo
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.tamaño_lote = tamaño_lote
+        self.fraccion_por_operacion = fraccion_por_operacion
+        self.max_barras = max_barras
+        self.directorio_velas = os.path.join(directorio, 'velas')
+        self.almacen = AlmacenVelas(self.directorio_velas)
+        self.ruta_resultados = os.path.join(directorio, 'resultados.jsonl')
+        self.ruta_ranking = os.path.join(directorio, 'ranking.csv')
+
+    def preparar_velas(self, pares, rutas=None, desde=None, hasta=None, reconstruir=False):
+        """Copiar las velas al almacén del barrido si el directorio es de esta configuración
+
+        Velas y resultados guardados solo valen para la misma ventana,
+        intervalo, rutas, fraccion_por_operacion y max_barras (ver
+        comprobar_manifiesto); las claves de resultados no incluyen estos campos.
+        """
+        manifiesto = dict(manifiesto_velas(pares, self.intervalo, rutas, desde, hasta),
+                          fraccion_por_operacion=self.fraccion_por_operacion, max_barras=self.max_barras)
+        comprobar_manifiesto(self.directorio, manifiesto,
+                             (self.directorio_velas, self.ruta_resultados, self.ruta_ranking), reconstruir)
+        return preparar_almacen(self.almacen, pares, self.intervalo, rutas, desde, hasta)
+
+    def resultados_guardados(self):
+        """Resultados ya evaluados por clave (ignora una última línea cortada por una interrupción)"""
+        guardados = {}
+        if not os.path.exists(self.ruta_resultados):
+            return guardados
+        with open(self.ruta_resultados, encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    resultado = json.loads(linea)
+                except ValueError:
+                    continue
+                guardados[resultado['clave']] = resultado
+        return guardados
+
+    def _linea_cortada(self):
+        """True si una interrupción dejó la última línea de resultados sin terminar"""
+        if not os.path.exists(self.ruta_resultados) or os.path.getsize(self.ruta_resultados) == 0:
+            return False
+        with open(self.ruta_resultados, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b'\n'
+
+    def ejecutar(self, pares=None, espacio=None, n_muestras=None, semilla=None, rutas=None,
+                 desde=None, hasta=None, criterio='rentabilidad', min_operaciones=10, reconstruir=False):
+        """Evaluar las combinaciones pendientes y escribir el ranking
+
+        `espacio` puede ser un único espacio para todos los pares o un dict
+        par -> espacio; los campos ausentes usan ESPACIO_PARAMETROS. Con
+        `reconstruir` se descarta lo guardado si es de otra configuración.
+        """
+        if pares is None:
+            from config import TOP_PARES
+            pares = TOP_PARES
+        os.makedirs(self.directorio, exist_ok=True)
+        pares = self.preparar_velas(pares, rutas, desde, hasta, reconstruir)
+
+        guardados = self.resultados_guardados()
+        lotes = []
+        for k, par in enumerate(pares):
+            combinaciones = generar_combinaciones(espacio_de_par(espacio, par), n_muestras, None if semilla is None else semilla + k)
+            pendientes = [c for c in combinaciones if clave_combinacion(par, c) not in guardados]
+            lotes.extend((par, pendientes[i:i + self.tamaño_lote]) for i in range(0, len(pendientes), self.tamaño_lote))
+
+        total = sum(len(lote) for _, lote in lotes)
+        print(f"🧪 Barrido: {len(pares)} pares, {total} combinaciones pendientes, {len(guardados)} ya evaluadas")
+
+        if lotes:
+            executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            evaluadas = 0
+            try:
+                futuros = [
+                    executor.submit(evaluar_lote, self.directorio_velas, par, lote, self.intervalo,
+                                    self.fraccion_por_operacion, self.max_barras)
+                    for par, lote in lotes
+                ]
+                with open(self.ruta_resultados, 'a', encoding='utf-8') as f:
+                    if self._linea_cortada():
+                        f.write('\n')
+                    for futuro in as_completed(futuros):
+                        resultados = futuro.result()
+                        for resultado in resultados:
+                            f.write(json.dumps(resultado) + '\n')
+                            guardados[resultado['clave']] = resultado
+                        # Cada lote queda en disco antes de seguir: es el punto de reanudación
+                        f.flush()
+                        os.fsync(f.fileno())
+                        evaluadas += len(resultados)
+            except KeyboardInterrupt:
+                print(f"⏸️ Barrido interrumpido: {evaluadas}/{total} guardadas, relanzar para continuar")
+                raise
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        tabla = self.ranking([r for r in guardados.values() if r['par'] in pares], criterio, min_operaciones)
+        self.escribir_ranking(tabla)
+        print(f"🏁 Barrido completado: {len(tabla)} combinaciones en ranking ({self.ruta_ranking})")
+        return tabla
+
+    def ranking(self, resultados, criterio='rentabilidad', min_operaciones=10):
+        """Tabla ordenada por par y `criterio` descendente (solo con suficientes operaciones)"""
+        tabla = np.zeros(len(resultados), dtype=DTYPE_BARRIDO)
+        for fila, resultado in enumerate(resultados):
+            tabla[fila] = (
+                resultado['par'], resultado['dca_niveles'][0], resultado['dca_niveles'][1],
+                resultado['tp_niveles'][0], resultado['tp_niveles'][1], resultado['sl'], resultado['leverage'],
+                resultado['operaciones'], resultado['winrate'], resultado['rentabilidad'],
+                resultado['profit_medio'], resultado['profit_factor'], resultado['max_drawdown']
+            )
+        tabla = tabla[tabla['operaciones'] >= min_operaciones]
+        # max_drawdown: menor es mejor
+        orden = tabla[criterio] if criterio == 'max_drawdown' else -tabla[criterio]
+        return tabla[np.lexsort((orden, tabla['par']))]
+
+    def escribir_ranking(self, tabla):
+        with open(self.ruta_ranking, 'w', encoding='utf-8') as f:
+            f.write(','.join(DTYPE_BARRIDO.names) + '\n')
+            for fila in tabla.tolist():
+                f.write(','.join(str(valor) for valor in fila) + '\n')
+
+    def mejores_parametros(self, tabla):
+        """Mejor combinación de cada par en el formato de PARAMETROS_POR_PAR"""
+        mejores = {}
+        for fila in tabla:
+            par = str(fila['par'])
+            if par not in mejores:
+                mejores[par] = {
+                    'dca_niveles': [float(fila['dca_1']), float(fila['dca_2'])],
+                    'tp_niveles': [float(fila['tp1']), float(fila['tp2'])],
+                    'sl': float(fila['sl']),
+                    'leverage': int(fila['leverage']),
+                    'winrate': float(fila['winrate']),
+                    'rentabilidad': float(fila['rentabilidad'])
+                }
+        return mejores
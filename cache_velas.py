@@ -0,0 +1,81 @@
+# cache_velas.py - CACHE COMPARTIDA DE VELAS (TTL POR INTERVALO + LRU)
+import time
+import threading
+from collections import OrderedDict
+
+# TTL en segundos por intervalo de vela (una vela = un periodo de validez)
+TTL_POR_INTERVALO = {
+    '1m': 60, '2m': 120, '5m': 300, '15m': 900, '30m': 1800,
+    '60m': 3600, '90m': 5400, '1h': 3600, '4h': 14400,
+    '1d': 86400, '5d': 432000, '1wk': 604800, '1mo': 2592000
+}
+
+
+class CacheVelas:
+    def __init__(self, max_entradas=256, ttl_por_intervalo=None):
+        self.max_entradas = max_entradas
+        self.ttl_por_intervalo = dict(ttl_por_intervalo or TTL_POR_INTERVALO)
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _calcular_expiracion(self, intervalo, ahora):
+        """Expira al cierre de la vela actual del intervalo (alineado a epoch)"""
+        ttl = self.ttl_por_intervalo.get(intervalo, 60)
+        return (int(ahora // ttl) + 1) * ttl
+
+    def obtener(self, simbolo, rango, intervalo):
+        """Obtener datos cacheados o None si no existen o expiraron"""
+        clave = (simbolo, rango, intervalo)
+        ahora = time.time()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.misses += 1
+                return None
+            expira, datos = entrada
+            if ahora >= expira:
+                del self._entradas[clave]
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.hits += 1
+            return datos
+
+    def guardar(self, simbolo, rango, intervalo, datos):
+        """Guardar datos y desalojar la entrada menos usada si se supera el límite"""
+        clave = (simbolo, rango, intervalo)
+        expira = self._calcular_expiracion(intervalo, time.time())
+        with self._lock:
+            self._entradas[clave] = (expira, datos)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.evictions += 1
+
+    def invalidar(self, simbolo=None):
+        """Invalidar todas las entradas o solo las de un símbolo"""
+        with self._lock:
+            if simbolo is None:
+                self._entradas.clear()
+                return
+            for clave in [c for c in self._entradas if c[0] == simbolo]:
+                del self._entradas[clave]
+
+    def estadisticas(self):
+        """Contadores de hits/misses de la cache"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entradas': len(self._entradas),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total * 100, 2) if total else 0.0
+            }
+
+
+# Instancia global compartida por YahooFinanceAPI, IndicadoresReales y AnalisisTechnicoSR
+cache_velas = CacheVelas()
@@ -0,0 +1,357 @@
+# diario_operaciones.py - DIARIO PERSISTENTE DE OPERACIONES (SQLITE WAL, COMMIT AGRUPADO)
+import os
+import json
+import time
+import queue
+import sqlite3
+import atexit
+import threading
+from datetime import datetime
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+RUTA_DIARIO = os.environ.get('RUTA_DIARIO', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datos_diario', 'operaciones.db'))
+
+TIPOS_EVENTO = ('APERTURA', 'DCA', 'CIERRE')
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS eventos (
+    secuencia INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp REAL NOT NULL,
+    tipo TEXT NOT NULL,
+    operacion_id INTEGER NOT NULL,
+    par TEXT NOT NULL,
+    direccion TEXT,
+    precio REAL,
+    resultado TEXT,
+    profit REAL,
+    datos TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_eventos_par_timestamp ON eventos (par, timestamp);
+CREATE INDEX IF NOT EXISTS idx_eventos_timestamp ON eventos (timestamp);
+CREATE INDEX IF NOT EXISTS idx_eventos_operacion ON eventos (operacion_id);
+"""
+
+# Espera entre reintentos de un lote que no se pudo escribir (se duplica hasta el máximo)
+ESPERA_REINTENTO_MIN = 0.1
+ESPERA_REINTENTO_MAX = 5.0
+# Intentos con el diario ya cerrándose antes de dar el lote por perdido
+REINTENTOS_AL_CERRAR = 5
+
+COLUMNAS = ('secuencia', 'timestamp', 'tipo', 'operacion_id', 'par', 'direccion', 'precio', 'resultado', 'profit', 'datos')
+
+
+def a_epoch(valor):
+    """datetime / epoch / None -> epoch (float)"""
+    if valor is None:
+        return time.time()
+    if isinstance(valor, datetime):
+        return valor.timestamp()
+    return float(valor)
+
+
+def adquirir_bloqueo(ruta):
+    """Abrir `ruta` con un bloqueo exclusivo sin esperar (OSError si ya lo tiene otro)
+
+    El bloqueo dura mientras el archivo devuelto siga abierto y lo libera el
+    sistema si el proceso muere.
+    """
+    archivo = open(ruta, 'a+b')
+    try:
+        if os.name == 'nt':
+            archivo.seek(0)
+            msvcrt.locking(archivo.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(archivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        archivo.close()
+        raise
+    return archivo
+
+
+def _serializable(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    if hasattr(valor, 'item'):  # escalares numpy
+        return valor.item()
+    return str(valor)
+
+
+class DiarioOperaciones:
+    """Diario append-only de aperturas, DCA ejecutados y cierres en SQLite (modo WAL)
+
+    `registrar` solo encola el evento: un hilo escritor agrupa todo lo que
+    llega en `intervalo_commit` segundos (hasta `max_lote` eventos) en una
+    única transacción, así el coste del fsync se paga una vez por lote y el
+    hilo del monitor nunca espera al disco. Las consultas usan conexiones
+    propias; en WAL los lectores no bloquean al escritor.
+
+    La secuencia de cada evento se asigna al encolarlo, así una instantánea
+    puede anotar hasta qué evento refleja y reaplicar solo los posteriores.
+    Un lote que falla no se descarta: se reintenta y, mientras tanto,
+    `error` describe el fallo y `secuencia_escrita` no avanza.
+
+    Como las secuencias se numeran aquí, solo puede haber un escritor por
+    base de datos: se toma un bloqueo exclusivo sobre `<ruta>.lock` hasta
+    `cerrar` y una segunda instancia (de este u otro proceso) falla al crearse.
+    """
+
+    def __init__(self, ruta=None, intervalo_commit=0.2, max_lote=1000):
+        self.ruta = ruta or RUTA_DIARIO
+        self.intervalo_commit = intervalo_commit
+        self.max_lote = max_lote
+        directorio = os.path.dirname(os.path.abspath(self.ruta))
+        os.makedirs(directorio, exist_ok=True)
+        try:
+            self._bloqueo = adquirir_bloqueo(f"{self.ruta}.lock")
+        except OSError as e:
+            raise RuntimeError(f"El diario {self.ruta} ya tiene otro escritor abierto ({e})") from e
+
+        conexion = self._conectar()
+        try:
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.executescript(ESQUEMA)
+            ultima = conexion.execute('SELECT MAX(secuencia) FROM eventos').fetchone()[0] or 0
+        except Exception:
+            self._bloqueo.close()
+            raise
+        finally:
+            conexion.close()
+
+        self.eventos_escritos = 0
+        self.lotes_escritos = 0
+        self.ultima_secuencia = ultima   # último evento encolado
+        self.secuencia_escrita = ultima  # último evento en disco
+        self.error = None                # último error de escritura sin resolver
+        self.fallos_escritura = 0
+        self._escrito = threading.Condition()
+        self._lock = threading.Lock()
+        self._cola = queue.Queue()
+        self._cerrado = False
+        self._hilo = threading.Thread(target=self._escribir, name='diario-operaciones', daemon=True)
+        self._hilo.start()
+        atexit.register(self.cerrar)
+
+    def _conectar(self):
+        conexion = sqlite3.connect(self.ruta, timeout=30)
+        # FULL: cada commit (un lote) llega al disco del WAL
+        conexion.execute('PRAGMA synchronous=FULL')
+        return conexion
+
+    # ---------------------------------------------------------------- escritura
+
+    def registrar(self, tipo, operacion_id, par, timestamp=None, direccion=None, precio=None,
+                  resultado=None, profit=None, **datos):
+        """Encolar un evento (no bloquea); los campos extra se guardan como JSON"""
+        if tipo not in TIPOS_EVENTO:
+            raise ValueError(f"Tipo de evento desconocido: {tipo}")
+        if self._cerrado:
+            raise RuntimeError("Diario de operaciones cerrado")
+        evento = [
+            a_epoch(timestamp), tipo, int(operacion_id), par, direccion,
+            None if precio is None else float(precio), resultado,
+            None if profit is None else float(profit),
+            json.dumps(datos, default=_serializable) if datos else None
+        ]
+        with self._lock:
+            self.ultima_secuencia += 1
+            self._cola.put((self.ultima_secuencia, *evento))
+            return self.ultima_secuencia
+
+    def registrar_apertura(self, operacion, timestamp=None):
+        self.registrar(
+            'APERTURA', operacion['id'], operacion['par'], timestamp or operacion.get('timestamp_apertura'),
+            operacion['direccion'], operacion['precio_entrada'],
+            tp1=operacion['tp1'], tp2=operacion['tp2'], sl=operacion['sl'],
+            dca_niveles=[nivel['precio'] for nivel in operacion.get('dca_niveles', [])],
+            leverage=operacion.get('leverage', 1)
+        )
+
+    def registrar_dca(self, operacion, nivel, precio, timestamp=None):
+        self.registrar(
+            'DCA', operacion['id'], operacion['par'], timestamp, operacion['direccion'], precio,
+            nivel=nivel, precio_promedio=operacion.get('precio_promedio')
+        )
+
+    def registrar_cierre(self, operacion):
+        self.registrar(
+            'CIERRE', operacion['id'], operacion['par'], operacion.get('timestamp_cierre'),
+            operacion['direccion'], operacion.get('precio_cierre'), operacion.get('resultado'), operacion.get('profit'),
+            precio_entrada=operacion['precio_entrada'], precio_promedio=operacion.get('precio_promedio'),
+            niveles_dca_activados=operacion.get('niveles_dca_activados', 0),
+            leverage=operacion.get('leverage', 1),
+            timestamp_apertura=operacion.get('timestamp_apertura')
+        )
+
+    def _escribir(self):
+        """Hilo escritor: espera un evento y agrupa lo que llegue durante `intervalo_commit`"""
+        conexion = self._conectar()
+        terminar = False
+        while not terminar:
+            lote = [self._cola.get()]
+            limite = time.monotonic() + self.intervalo_commit
+            while len(lote) < self.max_lote and lote[-1] is not None:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(self._cola.get(timeout=restante))
+                except queue.Empty:
+                    break
+
+            eventos = [evento for evento in lote if evento is not None]
+            terminar = len(eventos) < len(lote)
+            if eventos:
+                self._escribir_lote(conexion, eventos)
+            for _ in lote:
+                self._cola.task_done()
+        conexion.close()
+
+    def _escribir_lote(self, conexion, eventos):
+        """Insertar el lote en una transacción, reintentando con espera creciente hasta lograrlo"""
+        espera = ESPERA_REINTENTO_MIN
+        intentos = 0
+        while True:
+            try:
+                with conexion:
+                    conexion.executemany(
+                        f'INSERT INTO eventos ({", ".join(COLUMNAS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', eventos
+                    )
+                break
+            except sqlite3.Error as e:
+                intentos += 1
+                with self._escrito:
+                    self.error = f"{type(e).__name__}: {e}"
+                    self.fallos_escritura += 1
+                    self._escrito.notify_all()
+                if self._cerrado and intentos >= REINTENTOS_AL_CERRAR:
+                    print(f"❌ Diario de operaciones cerrado con {len(eventos)} eventos sin escribir: {e}")
+                    return False
+                print(f"❌ Error escribiendo diario de operaciones ({len(eventos)} eventos, intento {intentos}), "
+                      f"reintento en {espera:.1f}s: {e}")
+                time.sleep(espera)
+                espera = min(espera * 2, ESPERA_REINTENTO_MAX)
+
+        self.eventos_escritos += len(eventos)
+        self.lotes_escritos += 1
+        with self._escrito:
+            self.error = None
+            self.secuencia_escrita = eventos[-1][0]
+            self._escrito.notify_all()
+        return True
+
+    def vaciar(self):
+        """Esperar a que todos los eventos encolados estén en disco"""
+        self._cola.join()
+
+    def esperar_escritura(self, secuencia, timeout=None):
+        """Esperar a que los eventos hasta `secuencia` estén en disco (sin esperar a los posteriores)
+
+        Devuelve False si vence `timeout` o si falla un intento de escritura
+        mientras se espera (ver `error`).
+        """
+        with self._escrito:
+            fallos = self.fallos_escritura
+            self._escrito.wait_for(lambda: self.secuencia_escrita >= secuencia or self.fallos_escritura > fallos, timeout)
+            return self.secuencia_escrita >= secuencia
+
+    def cerrar(self):
+        """Escribir lo pendiente y detener el hilo escritor"""
+        if self._cerrado:
+            return
+        self._cerrado = True
+        self._cola.put(None)
+        self._hilo.join()
+        self._bloqueo.close()
+        atexit.unregister(self.cerrar)
+
+    @property
+    def pendientes(self):
+        return self._cola.qsize()
+
+    # ---------------------------------------------------------------- consultas
+
+    def _fila_a_evento(self, fila):
+        evento = dict(zip(COLUMNAS, fila))
+        datos = evento.pop('datos')
+        if datos:
+            evento.update(json.loads(datos))
+        evento['timestamp'] = datetime.fromtimestamp(evento['timestamp'])
+        return evento
+
+    def _filtros(self, par=None, desde=None, hasta=None, tipo=None, operacion_id=None, despues_de=None):
+        condiciones, valores = [], []
+        if despues_de is not None:
+            condiciones.append('secuencia > ?')
+            valores.append(int(despues_de))
+        if par is not None:
+            condiciones.append('par = ?')
+            valores.append(par)
+        if desde is not None:
+            condiciones.append('timestamp >= ?')
+            valores.append(a_epoch(desde))
+        if hasta is not None:
+            condiciones.append('timestamp < ?')
+            valores.append(a_epoch(hasta))
+        if tipo is not None:
+            condiciones.append('tipo = ?')
+            valores.append(tipo)
+        if operacion_id is not None:
+            condiciones.append('operacion_id = ?')
+            valores.append(int(operacion_id))
+        return (' WHERE ' + ' AND '.join(condiciones) if condiciones else ''), valores
+
+    def consultar(self, par=None, desde=None, hasta=None, tipo=None, operacion_id=None, limite=None, recientes=False):
+        """Eventos filtrados por par, rango [desde, hasta), tipo u operación (índice par+timestamp)
+
+        Con `recientes` se devuelven los `limite` más nuevos (en orden cronológico).
+        """
+        where, valores = self._filtros(par, desde, hasta, tipo, operacion_id)
+        consulta = f'SELECT {", ".join(COLUMNAS)} FROM eventos{where} ORDER BY timestamp {"DESC" if recientes else "ASC"}, secuencia {"DESC" if recientes else "ASC"}'
+        if limite is not None:
+            consulta += ' LIMIT ?'
+            valores.append(int(limite))
+
+        conexion = self._conectar()
+        try:
+            filas = conexion.execute(consulta, valores).fetchall()
+        finally:
+            conexion.close()
+        if recientes:
+            filas.reverse()
+        return [self._fila_a_evento(fila) for fila in filas]
+
+    def eventos_posteriores(self, secuencia):
+        """Eventos con secuencia mayor que `secuencia`, en orden de registro (cola del diario)"""
+        where, valores = self._filtros(despues_de=secuencia)
+        conexion = self._conectar()
+        try:
+            filas = conexion.execute(f'SELECT {", ".join(COLUMNAS)} FROM eventos{where} ORDER BY secuencia', valores).fetchall()
+        finally:
+            conexion.close()
+        return [self._fila_a_evento(fila) for fila in filas]
+
+    def operaciones_cerradas(self, par=None, desde=None, hasta=None, limite=None, recientes=False):
+        return self.consultar(par, desde, hasta, 'CIERRE', limite=limite, recientes=recientes)
+
+    def estadisticas(self, par=None, desde=None, hasta=None):
+        """Agregados de los cierres en el formato de GestorOperaciones.estadisticas"""
+        where, valores = self._filtros(par, desde, hasta)
+        conexion = self._conectar()
+        try:
+            aperturas = conexion.execute(f"SELECT COUNT(*) FROM eventos{where}{' AND' if where else ' WHERE'} tipo = 'APERTURA'", valores).fetchone()[0]
+            ganadoras, perdedoras, profit_total = conexion.execute(
+                f"SELECT COALESCE(SUM(profit > 0), 0), COALESCE(SUM(profit <= 0), 0), COALESCE(SUM(profit), 0.0) "
+                f"FROM eventos{where}{' AND' if where else ' WHERE'} tipo = 'CIERRE'", valores
+            ).fetchone()
+        finally:
+            conexion.close()
+        return {
+            'total_operaciones': int(aperturas),
+            'operaciones_ganadoras': int(ganadoras),
+            'operaciones_perdedoras': int(perdedoras),
+            'profit_total': float(profit_total)
+        }
@@ -0,0 +1,166 @@
+# estadisticas_riesgo.py - ESTADÍSTICAS DE RIESGO EN STREAMING O(1) Y LÍMITES DE RISK_MANAGEMENT
+import math
+from collections import deque
+
+# Operaciones de la ventana del Sharpe móvil
+VENTANA_SHARPE = 50
+
+
+class EstadisticasRiesgo:
+    """Equity, drawdown, rachas, winrate, profit factor y Sharpe móvil actualizados por cierre
+
+    Cada cierre cuesta O(1) y la memoria es fija (solo la ventana del
+    Sharpe). El capital se compone igual que Backtester.curva_equity: una
+    fracción fija del capital por operación. Si se supera `max_drawdown`
+    (fracción) o `limite_perdidas_consecutivas`, `bloqueado` pasa a True
+    hasta llamar a `reanudar`.
+    """
+
+    def __init__(self, capital_inicial=1000, fraccion_por_operacion=0.1, ventana_sharpe=VENTANA_SHARPE,
+                 max_drawdown=None, limite_perdidas_consecutivas=None):
+        self.capital_inicial = capital_inicial
+        self.fraccion_por_operacion = fraccion_por_operacion
+        self.max_drawdown_permitido = max_drawdown
+        self.limite_perdidas_consecutivas = limite_perdidas_consecutivas
+
+        self.capital = float(capital_inicial)
+        self.pico = float(capital_inicial)
+        self.drawdown_actual = 0.0
+        self.max_drawdown = 0.0
+        self.operaciones = 0
+        self.ganadoras = 0
+        self.perdidas_consecutivas = 0
+        self.max_perdidas_consecutivas = 0
+        self.suma_ganancias = 0.0
+        self.suma_perdidas = 0.0
+
+        self.ventana = deque(maxlen=ventana_sharpe)
+        self.suma = 0.0
+        self.suma_cuadrados = 0.0
+
+        self.bloqueado = False
+        self.motivo_bloqueo = None
+
+    @classmethod
+    def desde_config(cls, limites, fraccion_por_operacion=0.1, ventana_sharpe=VENTANA_SHARPE):
+        """Instancia con los límites de un dict con el formato de config.RISK_MANAGEMENT"""
+        return cls(limites.get('capital_inicial', 1000), fraccion_por_operacion, ventana_sharpe,
+                   limites.get('max_drawdown'), limites.get('consecutive_loss_limit'))
+
+    def registrar(self, profit):
+        """Añadir el profit (%) de una operación cerrada; devuelve el motivo si activa un límite"""
+        retorno = profit / 100 * self.fraccion_por_operacion
+        self.capital *= max(1 + retorno, 0.0)
+        self.pico = max(self.pico, self.capital)
+        self.drawdown_actual = 1 - self.capital / self.pico if self.pico > 0 else 0.0
+        self.max_drawdown = max(self.max_drawdown, self.drawdown_actual)
+
+        self.operaciones += 1
+        if profit > 0:
+            self.ganadoras += 1
+            self.suma_ganancias += profit
+            self.perdidas_consecutivas = 0
+        else:
+            self.suma_perdidas -= profit
+            self.perdidas_consecutivas += 1
+            self.max_perdidas_consecutivas = max(self.max_perdidas_consecutivas, self.perdidas_consecutivas)
+
+        if len(self.ventana) == self.ventana.maxlen:
+            saliente = self.ventana[0]
+            self.suma -= saliente
+            self.suma_cuadrados -= saliente * saliente
+        self.ventana.append(retorno)
+        self.suma += retorno
+        self.suma_cuadrados += retorno * retorno
+        # Recalcular las sumas una vez por ventana evita que acumulen error de redondeo (O(1) amortizado)
+        if self.operaciones % self.ventana.maxlen == 0:
+            self.suma = sum(self.ventana)
+            self.suma_cuadrados = sum(valor * valor for valor in self.ventana)
+
+        return self._verificar_limites()
+
+    def _verificar_limites(self):
+        if self.bloqueado:
+            return None
+        if self.max_drawdown_permitido is not None and self.drawdown_actual >= self.max_drawdown_permitido:
+            self.motivo_bloqueo = f"Drawdown {self.drawdown_actual * 100:.1f}% >= {self.max_drawdown_permitido * 100:.0f}%"
+        elif self.limite_perdidas_consecutivas is not None and self.perdidas_consecutivas >= self.limite_perdidas_consecutivas:
+            self.motivo_bloqueo = f"{self.perdidas_consecutivas} pérdidas consecutivas (límite {self.limite_perdidas_consecutivas})"
+        else:
+            return None
+        self.bloqueado = True
+        print(f"🛑 Límite de riesgo alcanzado: {self.motivo_bloqueo}. No se abrirán nuevas operaciones")
+        return self.motivo_bloqueo
+
+    def reanudar(self):
+        """Levantar el bloqueo (manual); la racha se reinicia y el drawdown se mide desde el capital actual"""
+        self.bloqueado = False
+        self.motivo_bloqueo = None
+        self.perdidas_consecutivas = 0
+        self.pico = self.capital
+        self.drawdown_actual = 0.0
+        print("▶️ Operativa reanudada tras límite de riesgo")
+
+    @property
+    def win_rate(self):
+        return self.ganadoras / self.operaciones * 100 if self.operaciones else 0.0
+
+    @property
+    def profit_factor(self):
+        if self.suma_perdidas > 0:
+            return self.suma_ganancias / self.suma_perdidas
+        return float('inf') if self.suma_ganancias > 0 else 0.0
+
+    @property
+    def sharpe_movil(self):
+        """Media / desviación de los retornos por operación de la ventana (sin anualizar)"""
+        n = len(self.ventana)
+        if n < 2:
+            return 0.0
+        media = self.suma / n
+        varianza = max(self.suma_cuadrados / n - media * media, 0.0) * n / (n - 1)
+        # Por debajo de este umbral la varianza es solo error de redondeo (retornos iguales)
+        if varianza <= 1e-12 * self.suma_cuadrados / n:
+            return 0.0
+        return media / math.sqrt(varianza)
+
+    def resumen(self):
+        """Claves que usan MonitorMercado y TelegramBotReal.enviar_estadisticas_diarias
+
+        Valores aptos para JSON: sin pérdidas el profit factor (infinito) es None.
+        """
+        profit_factor = self.profit_factor
+        return {
+            'capital_inicial': self.capital_inicial,
+            'capital_actual': round(self.capital, 2),
+            'drawdown_actual': round(self.drawdown_actual * 100, 2),
+            'max_drawdown': round(self.max_drawdown * 100, 2),
+            'perdidas_consecutivas': self.perdidas_consecutivas,
+            'max_perdidas_consecutivas': self.max_perdidas_consecutivas,
+            'win_rate': round(self.win_rate, 1),
+            'profit_factor': None if math.isinf(profit_factor) else round(profit_factor, 2),
+            'sharpe_movil': round(self.sharpe_movil, 3),
+            'bloqueado': self.bloqueado,
+            'motivo_bloqueo': self.motivo_bloqueo
+        }
+
+    def a_dict(self):
+        datos = {campo: getattr(self, campo) for campo in (
+            'capital_inicial', 'fraccion_por_operacion', 'max_drawdown_permitido', 'limite_perdidas_consecutivas',
+            'capital', 'pico', 'drawdown_actual', 'max_drawdown', 'operaciones', 'ganadoras',
+            'perdidas_consecutivas', 'max_perdidas_consecutivas', 'suma_ganancias', 'suma_perdidas',
+            'suma', 'suma_cuadrados', 'bloqueado', 'motivo_bloqueo'
+        )}
+        datos['ventana_sharpe'] = self.ventana.maxlen
+        datos['ventana'] = list(self.ventana)
+        return datos
+
+    @classmethod
+    def desde_dict(cls, datos):
+        riesgo = cls(datos['capital_inicial'], datos['fraccion_por_operacion'], datos['ventana_sharpe'],
+                     datos['max_drawdown_permitido'], datos['limite_perdidas_consecutivas'])
+        for campo, valor in datos.items():
+            if campo not in ('ventana_sharpe', 'ventana'):
+                setattr(riesgo, campo, valor)
+        riesgo.ventana.extend(datos['ventana'])
+        return riesgo
@@ -1,7 +1,13 @@
 # estrategia_dca.py - ESTRATEGIA S/R REAL CON INDICADORES REALES
+import time
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 
+# Etapas de generar_señal_real, de la más barata a la más cara
+ETAPAS_SEÑAL = ('indicadores', 'banda_rsi', 'sr', 'zona_optima')
+
 class EstrategiaDCA:
     def __init__(self):
         self.operaciones_activas = {}
@@ -9,6 +15,14 @@ class EstrategiaDCA:
         self.yahoo = None
         self.analisis_sr = None
         self.indicadores_reales = None
+        self.motor_indicadores = None
+        # Contadores por etapa del pipeline de señales
+        self.estadisticas_pipeline = {
+            etapa: {'evaluadas': 0, 'rechazadas': 0, 'tiempo_total': 0.0} for etapa in ETAPAS_SEÑAL
+        }
+        self._lock_pipeline = threading.Lock()
+        # Futuro del último análisis lanzado por escanear_universo para cada par
+        self._escaneos_en_curso = {}
     
     def _get_yahoo(self):
         if self.yahoo is None:
@@ -28,96 +42,242 @@ class EstrategiaDCA:
             self.indicadores_reales = IndicadoresReales()
         return self.indicadores_reales
     
-    def generar_señal_real(self, par):
-        """Generar señal REAL con indicadores REALES"""
+    def _get_motor_indicadores(self):
+        if self.motor_indicadores is None:
+            from motor_indicadores import MotorIndicadores
+            self.motor_indicadores = MotorIndicadores(self._get_indicadores_reales(), self._get_analisis_sr())
+        return self.motor_indicadores
+    
+    def escanear_candidatos(self, pares=None):
+        """Tabla de indicadores de todos los pares; devuelve solo las filas con señal óptima"""
         try:
-            from config import PARAMETROS_POR_PAR
-            params = PARAMETROS_POR_PAR.get(par, PARAMETROS_POR_PAR['EURUSD'])
-            
-            # Obtener datos TÉCNICOS REALES
-            datos_reales = self.obtener_datos_tecnicos_reales(par)
-            
-            if not datos_reales:
-                print(f"❌ No se pudieron obtener datos técnicos reales para {par}")
-                return None
-            
-            precio = datos_reales['precio_actual']
-            rsi = datos_reales['rsi']
-            tendencia = datos_reales['tendencia']
-            fuente = datos_reales['fuente']
-            
-            print(f"🔍 Analizando {par} - Precio: {precio:.5f}, RSI: {rsi}, Tendencia: {tendencia}, Fuente: {fuente}")
+            if pares is None:
+                from config import TOP_PARES
+                pares = TOP_PARES
             
-            # 🎯 ANÁLISIS S/R REAL (ESTRATEGIA BACKTESTING)
-            analisis_sr = self._get_analisis_sr().analizar_estructura_mercado(
-                par, precio, tendencia, rsi
-            )
+            tabla = self._get_motor_indicadores().calcular(pares)
+            candidatos = tabla[tabla['optima']]
             
-            # Solo generar señal si el análisis S/R es favorable
-            if not analisis_sr['señal']:
-                print(f"📊 {par}: {analisis_sr['motivo']}")
-                return None
-            
-            # Verificar condiciones óptimas según backtesting
-            if (analisis_sr['señal'] == "COMPRA" and 
-                not self._get_analisis_sr().es_zona_compra_optima(analisis_sr)):
-                print(f"📊 {par}: Condiciones compra no óptimas - {analisis_sr['motivo']}")
-                return None
-                
-            if (analisis_sr['señal'] == "VENTA" and 
-                not self._get_analisis_sr().es_zona_venta_optima(analisis_sr)):
-                print(f"📊 {par}: Condiciones venta no óptimas - {analisis_sr['motivo']}") 
-                return None
-            
-            direccion = analisis_sr['señal']
-            confianza = analisis_sr['confianza']
-            
-            print(f"🎯 SEÑAL S/R CONFIRMADA: {par} {direccion} - {analisis_sr['motivo']}")
-            
-            # Calcular niveles con parámetros optimizados del backtesting
-            if direccion == "COMPRA":
-                tp1 = precio * (1 + params['tp_niveles'][0])
-                tp2 = precio * (1 + params['tp_niveles'][1])
-                sl = precio * (1 - params['sl'])
-                dca_1 = precio * (1 - params['dca_niveles'][0])
-                dca_2 = precio * (1 - params['dca_niveles'][1])
-            else:
-                tp1 = precio * (1 - params['tp_niveles'][0])
-                tp2 = precio * (1 - params['tp_niveles'][1])
-                sl = precio * (1 + params['sl'])
-                dca_1 = precio * (1 + params['dca_niveles'][0])
-                dca_2 = precio * (1 + params['dca_niveles'][1])
+            print(f"📋 Escaneo batch: {len(tabla)} pares, {len(candidatos)} candidatos S/R")
+            return candidatos
             
+        except Exception as e:
+            print(f"❌ Error en escaneo batch: {e}")
+            return None
+    
+    def escanear_universo(self, pares=None, deadline=30, max_workers=8):
+        """Generar señales de todos los pares en paralelo con límite de tiempo por escaneo
+        
+        Devuelve lo que haya terminado antes del deadline; los pares pendientes
+        se marcan como TIMEOUT y siguen en segundo plano sin bloquear el escaneo.
+        Un par cuyo análisis de un escaneo anterior sigue en marcha no se lanza
+        otra vez (estado EN_CURSO). Los errores del análisis quedan como ERROR.
+        """
+        if pares is None:
+            from config import TOP_PARES
+            pares = TOP_PARES
+        pares = list(dict.fromkeys(pares))
+        
+        # Crear dependencias antes de lanzar hilos (evita inicializaciones duplicadas)
+        self._get_indicadores_reales()
+        self._get_analisis_sr()
+        self._get_yahoo()
+        
+        inicio = time.monotonic()
+        resultados = {par: {'estado': 'TIMEOUT', 'duracion': None, 'señal': None} for par in pares}
+        
+        def analizar(par):
+            t0 = time.monotonic()
+            try:
+                señal = self._generar_señal(par)
+                resultados[par] = {
+                    'estado': 'SEÑAL' if señal else 'SIN_SEÑAL',
+                    'duracion': round(time.monotonic() - t0, 3),
+                    'señal': señal
+                }
+            except Exception as e:
+                resultados[par] = {'estado': 'ERROR', 'duracion': round(time.monotonic() - t0, 3), 'señal': None, 'error': str(e)}
+        
+        with self._lock_pipeline:
+            en_curso = [par for par in pares if par in self._escaneos_en_curso and not self._escaneos_en_curso[par].done()]
+        for par in en_curso:
+            resultados[par] = {'estado': 'EN_CURSO', 'duracion': None, 'señal': None}
+        lanzar = [par for par in pares if par not in en_curso]
+        
+        executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(lanzar))))
+        try:
+            futuros = {par: executor.submit(analizar, par) for par in lanzar}
+            with self._lock_pipeline:
+                self._escaneos_en_curso.update(futuros)
+            wait(futuros.values(), timeout=deadline)
+        finally:
+            # No esperar a los pares lentos: el escaneo termina en el deadline
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        # Copia: los hilos pendientes no deben modificar el resultado devuelto
+        resultados = {par: dict(resultado) for par, resultado in resultados.items()}
+        señales = [r['señal'] for r in resultados.values() if r['señal']]
+        pendientes = [par for par, r in resultados.items() if r['estado'] == 'TIMEOUT']
+        duracion_total = round(time.monotonic() - inicio, 3)
+        
+        completados = len(lanzar) - len(pendientes)
+        
+        print(f"🌐 Escaneo universo: {completados}/{len(pares)} pares en {duracion_total}s, {len(señales)} señales"
+              f"{f', {len(en_curso)} aún en curso del escaneo anterior' if en_curso else ''}")
+        
+        return {
+            'señales': señales,
+            'resultados': resultados,
+            'completados': completados,
+            'pendientes': pendientes,
+            'en_curso': en_curso,
+            'duracion_total': duracion_total
+        }
+    
+    def _registrar_etapa(self, etapa, aceptada, duracion):
+        with self._lock_pipeline:
+            stats = self.estadisticas_pipeline[etapa]
+            stats['evaluadas'] += 1
+            stats['rechazadas'] += 0 if aceptada else 1
+            stats['tiempo_total'] += duracion
+    
+    def obtener_estadisticas_pipeline(self):
+        """Rechazos y tiempo medio (ms) por etapa de generar_señal_real"""
+        with self._lock_pipeline:
             return {
-                'par': par,
-                'direccion': direccion,
-                'precio_actual': round(precio, 5),
-                'tp1': round(tp1, 5),
-                'tp2': round(tp2, 5),
-                'sl': round(sl, 5),
-                'dca_1': round(dca_1, 5),
-                'dca_2': round(dca_2, 5),
-                'rsi': rsi,
-                'tendencia': tendencia,
-                'winrate_esperado': params['winrate'],
-                'rentabilidad_esperada': params['rentabilidad'],
-                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                'fuente_datos': fuente,
-                'leverage': params['leverage'],
-                'confianza': confianza,
-                # NUEVOS DATOS S/R
-                'estrategia': 'S/R Etapa 1',
-                'niveles_sr': analisis_sr['niveles_sr'],
-                'zona_actual': analisis_sr['zona_actual'],
-                'motivo_señal': analisis_sr['motivo'],
-                'distancia_support': analisis_sr['distancia_support'],
-                'distancia_resistance': analisis_sr['distancia_resistance']
+                etapa: {
+                    'evaluadas': stats['evaluadas'],
+                    'rechazadas': stats['rechazadas'],
+                    'tiempo_medio_ms': round(stats['tiempo_total'] / stats['evaluadas'] * 1000, 3) if stats['evaluadas'] else 0.0
+                }
+                for etapa, stats in self.estadisticas_pipeline.items()
             }
+    
+    def _etapa_indicadores(self, ctx):
+        """Etapa 1: RSI/tendencia (estado incremental + cache, sin S/R)"""
+        datos_reales = self.obtener_datos_tecnicos_reales(ctx['par'])
+        if not datos_reales:
+            print(f"❌ No se pudieron obtener datos técnicos reales para {ctx['par']}")
+            return False
+        
+        ctx['precio'] = datos_reales['precio_actual']
+        ctx['rsi'] = datos_reales['rsi']
+        ctx['tendencia'] = datos_reales['tendencia']
+        ctx['fuente'] = datos_reales['fuente']
+        
+        print(f"🔍 Analizando {ctx['par']} - Precio: {ctx['precio']:.5f}, RSI: {ctx['rsi']}, Tendencia: {ctx['tendencia']}, Fuente: {ctx['fuente']}")
+        return True
+    
+    def _etapa_banda_rsi(self, ctx):
+        """Etapa 2: con RSI entre los umbrales de compra/venta nunca hay señal S/R"""
+        if not self._get_analisis_sr().rsi_en_banda_operable(ctx['rsi']):
+            print(f"📊 {ctx['par']}: RSI {ctx['rsi']} fuera de zona operable, se omite análisis S/R")
+            return False
+        return True
+    
+    def _etapa_sr(self, ctx):
+        """Etapa 3: proximidad a niveles S/R (índice incremental)"""
+        analisis_sr = self._get_analisis_sr().analizar_estructura_mercado(
+            ctx['par'], ctx['precio'], ctx['tendencia'], ctx['rsi']
+        )
+        ctx['analisis_sr'] = analisis_sr
+        
+        # Solo generar señal si el análisis S/R es favorable
+        if not analisis_sr['señal']:
+            print(f"📊 {ctx['par']}: {analisis_sr['motivo']}")
+            return False
+        return True
+    
+    def _etapa_zona_optima(self, ctx):
+        """Etapa 4: verificar condiciones óptimas según backtesting"""
+        analisis_sr = ctx['analisis_sr']
+        if (analisis_sr['señal'] == "COMPRA" and 
+            not self._get_analisis_sr().es_zona_compra_optima(analisis_sr)):
+            print(f"📊 {ctx['par']}: Condiciones compra no óptimas - {analisis_sr['motivo']}")
+            return False
             
+        if (analisis_sr['señal'] == "VENTA" and 
+            not self._get_analisis_sr().es_zona_venta_optima(analisis_sr)):
+            print(f"📊 {ctx['par']}: Condiciones venta no óptimas - {analisis_sr['motivo']}") 
+            return False
+        return True
+    
+    def construir_señal(self, par, precio, rsi, tendencia, fuente, analisis_sr, params=None, timestamp=None):
+        """Construir la señal con niveles TP/SL/DCA a partir de un análisis S/R favorable"""
+        if params is None:
+            from config import PARAMETROS_POR_PAR
+            params = PARAMETROS_POR_PAR.get(par, PARAMETROS_POR_PAR['EURUSD'])
+        
+        direccion = analisis_sr['señal']
+        confianza = analisis_sr['confianza']
+        
+        # Calcular niveles con parámetros optimizados del backtesting
+        if direccion == "COMPRA":
+            tp1 = precio * (1 + params['tp_niveles'][0])
+            tp2 = precio * (1 + params['tp_niveles'][1])
+            sl = precio * (1 - params['sl'])
+            dca_1 = precio * (1 - params['dca_niveles'][0])
+            dca_2 = precio * (1 - params['dca_niveles'][1])
+        else:
+            tp1 = precio * (1 - params['tp_niveles'][0])
+            tp2 = precio * (1 - params['tp_niveles'][1])
+            sl = precio * (1 + params['sl'])
+            dca_1 = precio * (1 + params['dca_niveles'][0])
+            dca_2 = precio * (1 + params['dca_niveles'][1])
+        
+        return {
+            'par': par,
+            'direccion': direccion,
+            'precio_actual': round(precio, 5),
+            'tp1': round(tp1, 5),
+            'tp2': round(tp2, 5),
+            'sl': round(sl, 5),
+            'dca_1': round(dca_1, 5),
+            'dca_2': round(dca_2, 5),
+            'rsi': rsi,
+            'tendencia': tendencia,
+            'winrate_esperado': params['winrate'],
+            'rentabilidad_esperada': params['rentabilidad'],
+            'timestamp': (timestamp or datetime.now()).strftime("%Y-%m-%d %H:%M:%S"),
+            'fuente_datos': fuente,
+            'leverage': params['leverage'],
+            'confianza': confianza,
+            # NUEVOS DATOS S/R
+            'estrategia': 'S/R Etapa 1',
+            'niveles_sr': analisis_sr['niveles_sr'],
+            'zona_actual': analisis_sr['zona_actual'],
+            'motivo_señal': analisis_sr['motivo'],
+            'distancia_support': analisis_sr['distancia_support'],
+            'distancia_resistance': analisis_sr['distancia_resistance']
+        }
+    
+    def generar_señal_real(self, par):
+        """Generar señal REAL con indicadores REALES (etapas de la más barata a la más cara)"""
+        try:
+            return self._generar_señal(par)
         except Exception as e:
             print(f"❌ Error en generar_señal_real: {e}")
             return None
     
+    def _generar_señal(self, par):
+        """Pipeline de etapas de generar_señal_real; las excepciones se propagan"""
+        from config import PARAMETROS_POR_PAR
+        params = PARAMETROS_POR_PAR.get(par, PARAMETROS_POR_PAR['EURUSD'])
+        
+        ctx = {'par': par}
+        for nombre_etapa in ETAPAS_SEÑAL:
+            t0 = time.perf_counter()
+            aceptada = getattr(self, f"_etapa_{nombre_etapa}")(ctx)
+            self._registrar_etapa(nombre_etapa, aceptada, time.perf_counter() - t0)
+            if not aceptada:
+                return None
+        
+        analisis_sr = ctx['analisis_sr']
+        print(f"🎯 SEÑAL S/R CONFIRMADA: {par} {analisis_sr['señal']} - {analisis_sr['motivo']}")
+        
+        return self.construir_señal(par, ctx['precio'], ctx['rsi'], ctx['tendencia'],
+                                    ctx['fuente'], analisis_sr, params)
+    
     def obtener_datos_tecnicos_reales(self, par):
         """Obtener datos técnicos REALES usando IndicadoresReales"""
         try:
@@ -1,20 +1,43 @@
 # gestor_operaciones.py - GESTIÓN REAL DE OPERACIONES CON SIMULACIÓN AVANZADA
 import time
 import random
+import threading
+from collections import deque
 from datetime import datetime
+import numpy as np
+from almacen_posiciones import AlmacenPosiciones, VistaOperaciones
+from libro_triggers import LibroTriggers
+from estadisticas_riesgo import EstadisticasRiesgo
+
+# Operaciones cerradas que se mantienen en memoria; el histórico completo está en el diario
+MAX_HISTORIAL = 500
 
 class GestorOperaciones:
-    def __init__(self):
-        self.operaciones_activas = {}
-        self.historial = []
+    def __init__(self, diario=None, max_historial=MAX_HISTORIAL, estado_inicial=None, limites_riesgo=None):
+        # Posiciones activas en arrays; operaciones_activas es una vista id -> dict
+        self.posiciones = AlmacenPosiciones()
+        self.operaciones_activas = VistaOperaciones(self.posiciones)
+        # Niveles DCA/TP/SL pendientes indexados por precio
+        self.libro_triggers = LibroTriggers()
+        self.historial = deque(maxlen=max_historial)
         self.estadisticas = {
             'total_operaciones': 0,
             'operaciones_ganadoras': 0,
             'operaciones_perdedoras': 0,
             'profit_total': 0.0
         }
+        # Equity, drawdown, rachas y Sharpe móvil; con `limites_riesgo` (formato
+        # config.RISK_MANAGEMENT) no se abren operaciones al superarlos
+        self.riesgo = EstadisticasRiesgo.desde_config(limites_riesgo) if limites_riesgo else EstadisticasRiesgo()
+        # Serializa los cambios de estado frente a las instantáneas (InstantaneasEstado)
+        self._lock = threading.RLock()
+        # Diario persistente (DiarioOperaciones); sin diario no se persiste nada
+        self.diario = diario
+        if diario is not None or estado_inicial is not None:
+            self.recuperar_estado(estado_inicial)
         # IMPORTAR DENTRO DEL MÉTODO CUANDO SE NECESITE
         self.simulador = None
+        self.simulador_cartera = None
     
     def _get_simulador(self):
         """Obtener simulador (lazy loading)"""
@@ -23,108 +46,220 @@ class GestorOperaciones:
             self.simulador = SimuladorAvanzado()
         return self.simulador
     
-    def abrir_operacion(self, señal):
-        """Abrir operación REAL con seguimiento - TIMESTAMP CORREGIDO"""
-        operacion_id = f"{señal['par']}_{datetime.now().strftime('%H%M%S')}"
+    def _get_simulador_cartera(self):
+        """Obtener simulador de cartera (lazy loading)"""
+        if self.simulador_cartera is None:
+            from simulador_cartera import SimuladorCartera
+            self.simulador_cartera = SimuladorCartera()
+        return self.simulador_cartera
+    
+    def exportar_estado(self):
+        """Posiciones, estadísticas y secuencia del diario capturadas de forma consistente"""
+        with self._lock:
+            filas, simbolos, siguiente_id = self.posiciones.exportar()
+            return {
+                'posiciones': filas,
+                'simbolos': simbolos,
+                'siguiente_id': siguiente_id,
+                'estadisticas': dict(self.estadisticas),
+                'riesgo': self.riesgo.a_dict(),
+                'secuencia_diario': self.diario.ultima_secuencia if self.diario is not None else 0
+            }
+    
+    def recuperar_estado(self, estado=None):
+        """Restaurar tras un reinicio: instantánea (si hay) + eventos posteriores del diario
         
-        operacion = {
-            'id': operacion_id,
-            'par': señal['par'],
-            'direccion': señal['direccion'],
-            'precio_entrada': señal['precio_actual'],
-            'precio_actual': señal['precio_actual'],
-            'tp1': señal['tp1'],
-            'tp2': señal['tp2'],
-            'sl': señal['sl'],
-            'dca_niveles': [
-                {'nivel': 1, 'precio': señal['dca_1'], 'activado': False},
-                {'nivel': 2, 'precio': señal['dca_2'], 'activado': False}
-            ],
-            'estado': 'ACTIVA',
-            'timestamp_apertura': datetime.now(),  # ✅ OBJETO DATETIME
-            'timestamp_cierre': None,
-            'resultado': None,
-            'profit': 0.0,
-            'niveles_dca_activados': 0,
-            'precio_promedio': señal['precio_actual'],
-            'leverage': señal.get('leverage', 1)
-        }
+        Sin instantánea se reaplica el diario completo. Devuelve el número
+        de eventos reaplicados.
+        """
+        with self._lock:
+            secuencia = 0
+            if estado is not None:
+                self.posiciones.importar(estado['posiciones'], estado['simbolos'], estado['siguiente_id'])
+                self.estadisticas.update(estado['estadisticas'])
+                if estado.get('riesgo'):
+                    # Los límites vigentes son los configurados ahora, no los de la instantánea
+                    riesgo = EstadisticasRiesgo.desde_dict(estado['riesgo'])
+                    riesgo.max_drawdown_permitido = self.riesgo.max_drawdown_permitido
+                    riesgo.limite_perdidas_consecutivas = self.riesgo.limite_perdidas_consecutivas
+                    self.riesgo = riesgo
+                secuencia = estado['secuencia_diario']
+            
+            eventos = self.diario.eventos_posteriores(secuencia) if self.diario is not None else []
+            # Las operaciones abiertas y cerradas dentro de la cola solo cuentan en las estadísticas
+            cerradas = {evento['operacion_id'] for evento in eventos if evento['tipo'] == 'CIERRE'}
+            for evento in eventos:
+                self._reaplicar_evento(evento, evento['operacion_id'] in cerradas)
+            if eventos:
+                self.posiciones.reservar_ids(max(evento['operacion_id'] for evento in eventos))
+            
+            self.libro_triggers = LibroTriggers()
+            for fila in self.posiciones.activas:
+                dca = fila['dca'][~np.isnan(fila['dca'])]
+                self.libro_triggers.agregar_posicion(
+                    int(fila['id']), self.posiciones.simbolos[fila['simbolo']],
+                    "COMPRA" if fila['direccion'] > 0 else "VENTA",
+                    float(fila['tp1']), float(fila['tp2']), float(fila['sl']),
+                    dca.tolist(), fila['dca_activado'][:len(dca)].tolist()
+                )
+            
+            self.historial.clear()
+            if self.diario is not None:
+                for evento in self.diario.operaciones_cerradas(limite=self.historial.maxlen, recientes=True):
+                    self.historial.append(dict(
+                        evento, id=evento['operacion_id'], estado='CERRADA',
+                        precio_cierre=evento['precio'], timestamp_cierre=evento['timestamp']
+                    ))
+            return len(eventos)
+    
+    def _reaplicar_evento(self, evento, cerrada=False):
+        """Aplicar un evento del diario al estado (sin volver a registrarlo)"""
+        operacion_id = evento['operacion_id']
+        if evento['tipo'] == 'APERTURA':
+            if not cerrada and operacion_id not in self.posiciones:
+                self.posiciones.abrir(
+                    evento['par'], evento['direccion'], evento['precio'],
+                    evento['tp1'], evento['tp2'], evento['sl'], evento['dca_niveles'],
+                    evento['leverage'], evento['timestamp'].timestamp(), posicion_id=operacion_id
+                )
+            self.estadisticas['total_operaciones'] += 1
+        elif evento['tipo'] == 'DCA':
+            if operacion_id in self.posiciones:
+                self.posiciones.activar_dca(operacion_id, [nivel == evento['nivel'] for nivel in (1, 2)])
+        elif evento['tipo'] == 'CIERRE':
+            if operacion_id in self.posiciones:
+                self.posiciones.cerrar(operacion_id)
+            if evento['profit'] > 0:
+                self.estadisticas['operaciones_ganadoras'] += 1
+            else:
+                self.estadisticas['operaciones_perdedoras'] += 1
+            self.estadisticas['profit_total'] += evento['profit']
+            self.riesgo.registrar(evento['profit'])
+    
+    def _registrar_dca(self, operacion, niveles, timestamp=None):
+        if self.diario is None:
+            return
+        precios = {nivel['nivel']: nivel['precio'] for nivel in operacion['dca_niveles']}
+        for nivel in niveles:
+            self.diario.registrar_dca(operacion, nivel, precios[nivel], timestamp)
+    
+    def simular_riesgo_cartera(self, n_caminos=10000, duracion_horas=6, semilla=None):
+        """Drawdown y pérdida de cola de todas las operaciones activas simuladas conjuntamente"""
+        return self._get_simulador_cartera().simular_cartera(
+            list(self.operaciones_activas.values()), n_caminos, duracion_horas, semilla=semilla
+        )
+    
+    def reanudar_operativa(self):
+        """Levantar el bloqueo por límite de riesgo; devuelve el motivo que había (None si no estaba bloqueado)"""
+        with self._lock:
+            motivo = self.riesgo.motivo_bloqueo if self.riesgo.bloqueado else None
+            if motivo is not None:
+                self.riesgo.reanudar()
+            return motivo
+    
+    def abrir_operacion(self, señal, timestamp_apertura=None):
+        """Abrir operación REAL con seguimiento - TIMESTAMP CORREGIDO"""
+        with self._lock:
+            if self.riesgo.bloqueado:
+                print(f"⛔ Operación {señal['par']} no abierta: {self.riesgo.motivo_bloqueo}")
+                return None
+            timestamp_apertura = timestamp_apertura or datetime.now()
         
-        self.operaciones_activas[operacion_id] = operacion
-        self.estadisticas['total_operaciones'] += 1
+            # ID entero único y creciente (dos señales del mismo par en el mismo segundo no colisionan)
+            operacion_id = self.posiciones.abrir(
+                señal['par'], señal['direccion'], señal['precio_actual'],
+                señal['tp1'], señal['tp2'], señal['sl'],
+                [señal['dca_1'], señal['dca_2']],
+                señal.get('leverage', 1),
+                timestamp_apertura.timestamp()
+            )
+            self.libro_triggers.agregar_posicion(
+                operacion_id, señal['par'], señal['direccion'], señal['tp1'], señal['tp2'], señal['sl'],
+                [señal['dca_1'], señal['dca_2']]
+            )
+            self.estadisticas['total_operaciones'] += 1
+            if self.diario is not None:
+                self.diario.registrar_apertura(self.operaciones_activas[operacion_id], timestamp_apertura)
         
-        return operacion_id
+            return operacion_id
     
     def simular_seguimiento(self, operacion_id):
         """Seguimiento MÁS REALISTA con simulador avanzado"""
-        if operacion_id not in self.operaciones_activas:
-            return None
-        
-        operacion = self.operaciones_activas[operacion_id]
-        
-        # Verificar DCA primero
-        self._verificar_dca(operacion)
-        
-        # Usar simulador avanzado en lugar de movimiento aleatorio simple
-        simulador = self._get_simulador()
-        resultado = simulador.simular_operacion_realista(operacion)
-        
-        if resultado:
-            # Calcular profit REALISTA
-            profit = resultado.get('profit', self._calcular_profit_realista(operacion, resultado['precio_cierre']))
+        with self._lock:
+            operacion = self.operaciones_activas.get(operacion_id)
+            if operacion is None:
+                return None
             
+            # Usar simulador avanzado: DCA, TP y SL se resuelven a lo largo del camino
+            simulador = self._get_simulador()
+            resultado = simulador.simular_operacion_realista(operacion)
+            
+            if resultado:
+                return self.cerrar_operacion(
+                    operacion_id, resultado['resultado'], resultado['precio_cierre'],
+                    resultado.get('dca_activados', [])
+                )
+            
+            return {'operacion': operacion, 'resultado': None}
+    
+    def cerrar_operacion(self, operacion_id, resultado, precio_cierre, dca_activados=(), timestamp_cierre=None):
+        """Cerrar operación: aplicar DCA activados, calcular profit y mover a historial"""
+        with self._lock:
+            # Aplicar los DCA activados antes del cierre y calcular profit REALISTA
+            nuevos_dca = self.posiciones.activar_dca(operacion_id, dca_activados)
+            operacion = self.posiciones.a_dict(self.posiciones.cerrar(operacion_id))
+            self.libro_triggers.eliminar_posicion(operacion_id)
+            profit = self._calcular_profit_realista(operacion, precio_cierre)
+        
             operacion['estado'] = 'CERRADA'
-            operacion['timestamp_cierre'] = datetime.now()  # ✅ OBJETO DATETIME
-            operacion['resultado'] = resultado['resultado']
+            operacion['timestamp_cierre'] = timestamp_cierre or datetime.now()  # ✅ OBJETO DATETIME
+            operacion['resultado'] = resultado
             operacion['profit'] = profit
-            operacion['precio_cierre'] = resultado['precio_cierre']
-            
+            operacion['precio_cierre'] = precio_cierre
+        
             # Actualizar estadísticas
             if profit > 0:
                 self.estadisticas['operaciones_ganadoras'] += 1
             else:
                 self.estadisticas['operaciones_perdedoras'] += 1
             self.estadisticas['profit_total'] += profit
-            
-            # Mover a historial
+            self.riesgo.registrar(profit)
+        
+            # Mover a historial (ventana reciente) y al diario
             self.historial.append(operacion)
-            del self.operaciones_activas[operacion_id]
-            
+            if self.diario is not None:
+                self._registrar_dca(operacion, nuevos_dca, operacion['timestamp_cierre'])
+                self.diario.registrar_cierre(operacion)
+        
             return {
                 'operacion': operacion,
-                'resultado': resultado['resultado'],
+                'resultado': resultado,
                 'profit': profit
             }
-        
-        return {'operacion': operacion, 'resultado': None}
     
-    def _verificar_dca(self, operacion):
-        """Verificar y activar niveles DCA"""
-        precio_actual = operacion['precio_actual']
-        
-        for nivel in operacion['dca_niveles']:
-            if not nivel['activado']:
-                if operacion['direccion'] == 'COMPRA':
-                    if precio_actual <= nivel['precio']:
-                        nivel['activado'] = True
-                        operacion['niveles_dca_activados'] += 1
-                        # Recalcular precio promedio
-                        self._recalcular_precio_promedio(operacion)
-                else:  # VENTA
-                    if precio_actual >= nivel['precio']:
-                        nivel['activado'] = True
-                        operacion['niveles_dca_activados'] += 1
-                        # Recalcular precio promedio
-                        self._recalcular_precio_promedio(operacion)
+    def marcar_a_mercado(self, precios):
+        """Profit (%) de todas las operaciones activas a los precios dados (dict par -> precio)"""
+        ids, profit = self.posiciones.marcar_a_mercado(precios)
+        return dict(zip(ids.tolist(), profit.tolist()))
     
-    def _recalcular_precio_promedio(self, operacion):
-        """Recalcular precio promedio después de DCA"""
-        precios = [operacion['precio_entrada']]
-        for nivel in operacion['dca_niveles']:
-            if nivel['activado']:
-                precios.append(nivel['precio'])
+    def procesar_precio(self, par, precio, timestamp=None):
+        """Aplicar un precio nuevo: solo se evalúan los triggers cruzados (DCA, TP, SL)
         
-        operacion['precio_promedio'] = sum(precios) / len(precios)
+        Devuelve las operaciones cerradas por este precio.
+        """
+        with self._lock:
+            cerradas = []
+            for evento in self.libro_triggers.actualizar(par, precio):
+                operacion_id = evento['posicion_id']
+                if operacion_id not in self.posiciones:
+                    continue
+                if evento['dca']:
+                    nuevos_dca = self.posiciones.activar_dca(operacion_id, [nivel in evento['dca'] for nivel in (1, 2)])
+                    if nuevos_dca and self.diario is not None:
+                        self._registrar_dca(self.operaciones_activas[operacion_id], nuevos_dca, timestamp)
+                if evento['salida']:
+                    cerradas.append(self.cerrar_operacion(operacion_id, evento['salida'], precio, timestamp_cierre=timestamp))
+            return cerradas
     
     def _calcular_profit_realista(self, operacion, precio_cierre):
         """Calcular profit de forma REALISTA con leverage"""
@@ -1,93 +1,110 @@
 # indicadores_reales.py - CÁLCULO REAL DE INDICADORES
-import requests
+import time
+import threading
 import numpy as np
 from datetime import datetime, timedelta
+from yahoo_api import YahooFinanceAPI
+from cache_velas import cache_velas
+from almacen_velas import almacen_velas
+from resampleo_velas import resamplear_ohlcv
+from indicadores_vectorizados import rsi_wilder
+from indicadores_streaming import EstadoIndicadores
+
+# Duración en segundos de los rangos de Yahoo Finance
+DURACION_PERIODO = {
+    '1d': 86400, '5d': 5 * 86400, '1mo': 31 * 86400, '3mo': 92 * 86400,
+    '6mo': 183 * 86400, '1y': 366 * 86400, '2y': 731 * 86400
+}
+
+# Margen para fines de semana/festivos al comprobar si el almacén cubre un periodo
+HOLGURA_COBERTURA = 4 * 86400
+
+# Serie base descargada; el resto de timeframes se derivan localmente
+PERIODO_BASE = '3mo'
+INTERVALO_BASE = '1h'
 
 class IndicadoresReales:
     def __init__(self):
         self.base_url = "https://query1.finance.yahoo.com/v8/finance/chart"
+        self.yahoo = YahooFinanceAPI()
+        self.almacen = almacen_velas
+        self.estados = {}
+        self._lock_estados = threading.Lock()
     
     def obtener_datos_historicos(self, simbolo, periodo="1mo", intervalo="1h"):
-        """Obtener datos históricos REALES de Yahoo Finance"""
+        """Obtener datos históricos REALES (almacén local + top-up incremental de Yahoo)"""
         try:
-            symbol_mapping = {
-                "EURUSD": "EURUSD=X", "USDCAD": "CAD=X", "EURCHF": "EURCHF=X", "EURAUD": "EURAUD=X",
-                "XAUUSD": "GC=F", "XAGUSD": "SI=F", "OILUSD": "CL=F", "XPTUSD": "PL=F"
-            }
+            datos = cache_velas.obtener(simbolo, periodo, intervalo)
+            if datos is not None:
+                return datos
+            
+            desde = time.time() - DURACION_PERIODO.get(periodo, DURACION_PERIODO['1mo'])
+            ultimo = self.almacen.ultimo_timestamp(simbolo, intervalo)
+            primero = self.almacen.primer_timestamp(simbolo, intervalo)
+            cubre_periodo = primero is not None and primero <= desde + HOLGURA_COBERTURA
             
-            yahoo_symbol = symbol_mapping.get(simbolo)
-            if not yahoo_symbol:
+            if ultimo is not None and ultimo >= desde and cubre_periodo:
+                # Solo pedir velas desde la última almacenada (se reescribe si seguía abierta)
+                nuevas = self.yahoo.obtener_chart(simbolo, periodo, intervalo, timeout=15, desde=ultimo)
+            else:
+                nuevas = self.yahoo.obtener_chart(simbolo, periodo, intervalo, timeout=15)
+            
+            if nuevas is not None:
+                self.almacen.agregar(simbolo, intervalo, nuevas)
+            elif ultimo is None:
                 return None
             
-            url = f"{self.base_url}/{yahoo_symbol}"
-            params = {
-                'range': periodo,
-                'interval': intervalo
-            }
+            datos = self.almacen.leer(simbolo, intervalo, desde)
+            if len(datos) == 0:
+                return None
+            datos.precio = nuevas.precio if nuevas is not None else None
             
-            headers = {'User-Agent': 'Mozilla/5.0'}
-            response = requests.get(url, params=params, headers=headers, timeout=15)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if 'chart' in data and 'result' in data['chart'] and data['chart']['result']:
-                    result = data['chart']['result'][0]
-                    timestamps = result['timestamp']
-                    prices = result['indicators']['quote'][0]
-                    
-                    # Extraer precios de cierre
-                    closes = prices['close']
-                    highs = prices['high']
-                    lows = prices['low']
-                    
-                    return {
-                        'timestamp': timestamps,
-                        'close': closes,
-                        'high': highs,
-                        'low': lows
-                    }
-            return None
+            cache_velas.guardar(simbolo, periodo, intervalo, datos)
+            return datos
             
         except Exception as e:
             print(f"❌ Error datos históricos {simbolo}: {e}")
             return None
     
+    def obtener_datos_timeframe(self, simbolo, periodo="1mo", timeframe="1h"):
+        """Obtener velas de cualquier timeframe resampleando la serie base local"""
+        try:
+            base = self.obtener_datos_historicos(simbolo, PERIODO_BASE, INTERVALO_BASE)
+            if base is None:
+                return None
+            
+            velas = base.desde(time.time() - DURACION_PERIODO.get(periodo, DURACION_PERIODO['1mo']))
+            if timeframe == INTERVALO_BASE:
+                return velas
+            return resamplear_ohlcv(velas, timeframe, INTERVALO_BASE)
+            
+        except Exception as e:
+            print(f"❌ Error resampleando {simbolo} a {timeframe}: {e}")
+            return None
+    
+    def obtener_historicos_batch(self, simbolos, periodo="1mo", intervalo="1h"):
+        """Obtener datos históricos de varios símbolos en paralelo"""
+        try:
+            return self.yahoo.ejecutar_en_paralelo(
+                lambda simbolo: self.obtener_datos_historicos(simbolo, periodo, intervalo),
+                simbolos
+            )
+            
+        except Exception as e:
+            print(f"❌ Error datos históricos batch: {e}")
+            return {simbolo: None for simbolo in simbolos}
+    
+    def calcular_rsi_serie(self, precios, periodo=14):
+        """Serie completa de RSI de Wilder (1-D o símbolos x velas)"""
+        return rsi_wilder(precios, periodo)
+    
     def calcular_rsi_real(self, precios, periodo=14):
-        """Calcular RSI REAL con fórmula estándar"""
+        """Calcular RSI REAL con suavizado de Wilder (último valor)"""
         if len(precios) < periodo + 1:
             return 50  # Valor neutral si no hay suficientes datos
         
-        # Calcular cambios de precio
-        deltas = np.diff(precios)
-        
-        # Separar ganancias y pérdidas
-        gains = np.where(deltas > 0, deltas, 0)
-        losses = np.where(deltas < 0, -deltas, 0)
-        
-        # Calcular promedio de ganancias/pérdidas
-        avg_gains = []
-        avg_losses = []
-        
-        for i in range(periodo, len(gains)):
-            avg_gain = np.mean(gains[i-periodo:i])
-            avg_loss = np.mean(losses[i-periodo:i])
-            avg_gains.append(avg_gain)
-            avg_losses.append(avg_loss)
-        
-        if not avg_gains or not avg_losses:
-            return 50
-        
-        # Calcular RS y RSI
-        rs_values = []
-        for i in range(len(avg_gains)):
-            if avg_losses[i] == 0:
-                rs = 100  # Evitar división por cero
-            else:
-                rs = avg_gains[i] / avg_losses[i]
-            rsi = 100 - (100 / (1 + rs))
-            rs_values.append(rsi)
-        
-        return round(float(rs_values[-1]), 2) if rs_values else 50
+        rsi = self.calcular_rsi_serie(precios, periodo)[-1]
+        return 50 if np.isnan(rsi) else round(float(rsi), 2)
     
     def determinar_tendencia(self, precios, periodo=20):
         """Determinar tendencia REAL basada en medias móviles"""
@@ -109,28 +126,29 @@ class IndicadoresReales:
     def obtener_indicadores_reales(self, simbolo):
         """Obtener todos los indicadores REALES"""
         try:
-            # Obtener datos históricos (último mes, 1h timeframe)
-            datos = self.obtener_datos_historicos(simbolo, "1mo", "1h")
+            # Obtener datos históricos (último mes, 1h timeframe) desde la serie base
+            datos = self.obtener_datos_timeframe(simbolo, "1mo", "1h")
             
-            if not datos or len(datos['close']) < 50:
+            if datos is None or len(datos) < 50:
                 print(f"⚠️ Datos insuficientes para {simbolo}, usando cálculo básico")
                 return self._indicadores_basicos(simbolo)
             
-            precios_cierre = [p for p in datos['close'] if p is not None]
+            velas = datos.validas()
+            precios_cierre = velas.close
             
             if len(precios_cierre) < 20:
                 return self._indicadores_basicos(simbolo)
             
-            # Calcular indicadores REALES
-            rsi_real = self.calcular_rsi_real(precios_cierre)
-            tendencia_real = self.determinar_tendencia(precios_cierre)
+            # Calcular indicadores REALES (estado incremental + vela en curso)
+            self._actualizar_estado(simbolo, velas)
+            rsi_real, tendencia_real = self.provisional(simbolo, float(precios_cierre[-1]))
             
             print(f"📊 {simbolo} - RSI REAL: {rsi_real}, Tendencia REAL: {tendencia_real}")
             
             return {
                 'rsi': rsi_real,
                 'tendencia': tendencia_real,
-                'precio_actual': precios_cierre[-1],
+                'precio_actual': float(precios_cierre[-1]),
                 'fuente': 'Cálculo Real'
             }
             
@@ -138,11 +156,46 @@ class IndicadoresReales:
             print(f"❌ Error calculando indicadores reales {simbolo}: {e}")
             return self._indicadores_basicos(simbolo)
     
+    def _actualizar_estado(self, simbolo, velas):
+        """Alimentar el estado incremental del símbolo solo con las velas cerradas nuevas"""
+        with self._lock_estados:
+            estado = self.estados.get(simbolo)
+            # Sin estado o con un hueco respecto al histórico disponible: sembrar de nuevo
+            if estado is None or estado.ultimo_timestamp is None or estado.ultimo_timestamp < velas.timestamp[0]:
+                estado = EstadoIndicadores()
+                self.estados[simbolo] = estado
+            
+            # La última vela puede seguir abierta: se evalúa como provisional
+            inicio = int(np.searchsorted(velas.timestamp, estado.ultimo_timestamp, side='right')) if estado.ultimo_timestamp is not None else 0
+            for timestamp, close in zip(velas.timestamp[inicio:-1].tolist(), velas.close[inicio:-1].tolist()):
+                estado.actualizar(timestamp, close)
+            return estado
+    
+    def provisional(self, simbolo, precio):
+        """(rsi, tendencia) del estado incremental incluyendo `precio`; None si el símbolo no tiene estado
+
+        Se evalúa bajo el lock para no leer un estado a medio actualizar por otro hilo.
+        """
+        with self._lock_estados:
+            estado = self.estados.get(simbolo)
+            if estado is None:
+                return None
+            return estado.rsi_provisional(precio), estado.tendencia_provisional(precio)
+    
+    def exportar_estados(self):
+        """Estado incremental de todos los símbolos (serializable)"""
+        with self._lock_estados:
+            return {simbolo: estado.a_dict() for simbolo, estado in self.estados.items()}
+    
+    def importar_estados(self, estados):
+        """Restaurar estados exportados con exportar_estados"""
+        with self._lock_estados:
+            for simbolo, datos in estados.items():
+                self.estados[simbolo] = EstadoIndicadores.desde_dict(datos)
+    
     def _indicadores_basicos(self, simbolo):
         """Fallback a cálculo básico si falla el real"""
-        from yahoo_api import YahooFinanceAPI
-        yahoo = YahooFinanceAPI()
-        precio = yahoo.obtener_precio_real(simbolo)
+        precio = self.yahoo.obtener_precio_real(simbolo)
         
         # Cálculo básico mejorado
         precios_base = {"EURUSD": 1.0850, "XAUUSD": 2185.50, "USDCAD": 1.3450}
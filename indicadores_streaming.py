@@ -0,0 +1,293 @@
+# indicadores_streaming.py - INDICADORES INCREMENTALES O(1) POR VELA (SERIALIZABLES)
+from collections import deque
+
+
+class SMAStream:
+    """Media móvil simple con suma rodante"""
+
+    def __init__(self, periodo):
+        self.periodo = periodo
+        self.ventana = deque(maxlen=periodo)
+        self.suma = 0.0
+
+    def actualizar(self, valor):
+        if len(self.ventana) == self.periodo:
+            self.suma -= self.ventana[0]
+        self.ventana.append(valor)
+        self.suma += valor
+        return self.valor
+
+    @property
+    def lista(self):
+        return len(self.ventana) == self.periodo
+
+    @property
+    def valor(self):
+        return self.suma / len(self.ventana) if self.ventana else None
+
+    def provisional(self, valor):
+        """Valor si la próxima vela cerrara en `valor` (sin modificar el estado)"""
+        if len(self.ventana) == self.periodo:
+            return (self.suma - self.ventana[0] + valor) / self.periodo
+        return (self.suma + valor) / (len(self.ventana) + 1)
+
+    def a_dict(self):
+        return {'periodo': self.periodo, 'ventana': list(self.ventana)}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        sma = cls(datos['periodo'])
+        for valor in datos['ventana']:
+            sma.actualizar(valor)
+        return sma
+
+
+class EMAStream:
+    """Media móvil exponencial (semilla = SMA de las primeras `periodo` velas)"""
+
+    def __init__(self, periodo, alfa=None):
+        self.periodo = periodo
+        self.alfa = alfa if alfa is not None else 2.0 / (periodo + 1)
+        self.valor = None
+        self.n = 0
+        self._suma_semilla = 0.0
+
+    def actualizar(self, valor):
+        self.n += 1
+        if self.n < self.periodo:
+            self._suma_semilla += valor
+        elif self.n == self.periodo:
+            self.valor = (self._suma_semilla + valor) / self.periodo
+        else:
+            self.valor += self.alfa * (valor - self.valor)
+        return self.valor
+
+    @property
+    def lista(self):
+        return self.valor is not None
+
+    def provisional(self, valor):
+        if self.valor is None:
+            return None
+        return self.valor + self.alfa * (valor - self.valor)
+
+    def a_dict(self):
+        return {'periodo': self.periodo, 'alfa': self.alfa, 'valor': self.valor,
+                'n': self.n, 'suma_semilla': self._suma_semilla}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        ema = cls(datos['periodo'], datos['alfa'])
+        ema.valor = datos['valor']
+        ema.n = datos['n']
+        ema._suma_semilla = datos['suma_semilla']
+        return ema
+
+
+class RSIWilderStream:
+    """RSI de Wilder incremental (mismo resultado que rsi_wilder sobre la serie)"""
+
+    def __init__(self, periodo=14):
+        self.periodo = periodo
+        self.precio_previo = None
+        self.media_ganancias = None
+        self.media_perdidas = None
+        self.n_deltas = 0
+        self._suma_ganancias = 0.0
+        self._suma_perdidas = 0.0
+
+    def _rsi(self, media_ganancias, media_perdidas):
+        if media_perdidas == 0:
+            return 50.0 if media_ganancias == 0 else 100.0
+        return 100.0 - 100.0 / (1.0 + media_ganancias / media_perdidas)
+
+    def _medias_con(self, precio):
+        delta = precio - self.precio_previo
+        ganancia, perdida = max(delta, 0.0), max(-delta, 0.0)
+        n = self.n_deltas + 1
+        if n < self.periodo:
+            return None, None
+        if n == self.periodo:
+            return (self._suma_ganancias + ganancia) / self.periodo, (self._suma_perdidas + perdida) / self.periodo
+        return (self.media_ganancias + (ganancia - self.media_ganancias) / self.periodo,
+                self.media_perdidas + (perdida - self.media_perdidas) / self.periodo)
+
+    def actualizar(self, precio):
+        if self.precio_previo is not None:
+            delta = precio - self.precio_previo
+            if self.n_deltas + 1 < self.periodo:
+                self._suma_ganancias += max(delta, 0.0)
+                self._suma_perdidas += max(-delta, 0.0)
+            else:
+                self.media_ganancias, self.media_perdidas = self._medias_con(precio)
+            self.n_deltas += 1
+        self.precio_previo = precio
+        return self.valor
+
+    @property
+    def lista(self):
+        return self.media_ganancias is not None
+
+    @property
+    def valor(self):
+        if self.media_ganancias is None:
+            return None
+        return self._rsi(self.media_ganancias, self.media_perdidas)
+
+    def provisional(self, precio):
+        """RSI si la vela en curso cerrara en `precio` (sin modificar el estado)"""
+        if self.precio_previo is None:
+            return None
+        media_ganancias, media_perdidas = self._medias_con(precio)
+        if media_ganancias is None:
+            return None
+        return self._rsi(media_ganancias, media_perdidas)
+
+    def a_dict(self):
+        return {'periodo': self.periodo, 'precio_previo': self.precio_previo,
+                'media_ganancias': self.media_ganancias, 'media_perdidas': self.media_perdidas,
+                'n_deltas': self.n_deltas, 'suma_ganancias': self._suma_ganancias,
+                'suma_perdidas': self._suma_perdidas}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        rsi = cls(datos['periodo'])
+        rsi.precio_previo = datos['precio_previo']
+        rsi.media_ganancias = datos['media_ganancias']
+        rsi.media_perdidas = datos['media_perdidas']
+        rsi.n_deltas = datos['n_deltas']
+        rsi._suma_ganancias = datos['suma_ganancias']
+        rsi._suma_perdidas = datos['suma_perdidas']
+        return rsi
+
+
+class MaxMinRodante:
+    """Máximo/mínimo de una ventana deslizante con deque monótona (O(1) amortizado)"""
+
+    def __init__(self, ventana, es_maximo=True):
+        self.ventana = ventana
+        self.es_maximo = es_maximo
+        self.indice = -1
+        self._candidatos = deque()  # (indice, valor) monótono
+
+    def actualizar(self, valor):
+        self.indice += 1
+        if self.es_maximo:
+            while self._candidatos and self._candidatos[-1][1] <= valor:
+                self._candidatos.pop()
+        else:
+            while self._candidatos and self._candidatos[-1][1] >= valor:
+                self._candidatos.pop()
+        self._candidatos.append((self.indice, valor))
+        while self._candidatos[0][0] <= self.indice - self.ventana:
+            self._candidatos.popleft()
+        return self.valor
+
+    @property
+    def lista(self):
+        return self.indice + 1 >= self.ventana
+
+    @property
+    def valor(self):
+        return self._candidatos[0][1] if self._candidatos else None
+
+    def a_dict(self):
+        return {'ventana': self.ventana, 'es_maximo': self.es_maximo, 'indice': self.indice,
+                'candidatos': [list(c) for c in self._candidatos]}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        rodante = cls(datos['ventana'], datos['es_maximo'])
+        rodante.indice = datos['indice']
+        rodante._candidatos = deque(tuple(c) for c in datos['candidatos'])
+        return rodante
+
+
+class DetectorPivotsStream:
+    """Confirma pivots (mismo criterio que AnalisisTechnicoSR._detectar_pivots)
+
+    Una vela es pivot high si su máximo es el mayor de las `window` velas a
+    cada lado; se confirma `window` velas después.
+    """
+
+    def __init__(self, window=5):
+        self.window = window
+        self.maximos = MaxMinRodante(2 * window + 1, es_maximo=True)
+        self.minimos = MaxMinRodante(2 * window + 1, es_maximo=False)
+        self._velas = deque(maxlen=2 * window + 1)  # (timestamp, high, low)
+
+    def actualizar(self, timestamp, high, low):
+        """Añadir una vela cerrada; devuelve los pivots confirmados [(tipo, timestamp, precio)]"""
+        self._velas.append((timestamp, high, low))
+        maximo = self.maximos.actualizar(high)
+        minimo = self.minimos.actualizar(low)
+        if len(self._velas) < self._velas.maxlen:
+            return []
+
+        ts_centro, high_centro, low_centro = self._velas[self.window]
+        confirmados = []
+        if high_centro == maximo:
+            confirmados.append(('resistance', ts_centro, high_centro))
+        if low_centro == minimo:
+            confirmados.append(('support', ts_centro, low_centro))
+        return confirmados
+
+    def a_dict(self):
+        return {'window': self.window, 'maximos': self.maximos.a_dict(),
+                'minimos': self.minimos.a_dict(), 'velas': [list(v) for v in self._velas]}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        detector = cls(datos['window'])
+        detector.maximos = MaxMinRodante.desde_dict(datos['maximos'])
+        detector.minimos = MaxMinRodante.desde_dict(datos['minimos'])
+        detector._velas.extend(tuple(v) for v in datos['velas'])
+        return detector
+
+
+class EstadoIndicadores:
+    """Estado incremental por símbolo: RSI de Wilder + medias de determinar_tendencia"""
+
+    def __init__(self, periodo_rsi=14, periodo_tendencia=20):
+        self.rsi = RSIWilderStream(periodo_rsi)
+        self.ma_rapida = SMAStream(periodo_tendencia // 2)
+        self.ma_lenta = SMAStream(periodo_tendencia)
+        self.ultimo_timestamp = None
+
+    def actualizar(self, timestamp, close):
+        """Añadir una vela cerrada (ignora velas ya procesadas)"""
+        if self.ultimo_timestamp is not None and timestamp <= self.ultimo_timestamp:
+            return
+        self.rsi.actualizar(close)
+        self.ma_rapida.actualizar(close)
+        self.ma_lenta.actualizar(close)
+        self.ultimo_timestamp = timestamp
+
+    def rsi_provisional(self, precio):
+        rsi = self.rsi.provisional(precio)
+        return 50 if rsi is None else round(rsi, 2)
+
+    def tendencia_provisional(self, precio):
+        """Misma regla que IndicadoresReales.determinar_tendencia incluyendo `precio`"""
+        if len(self.ma_lenta.ventana) + 1 < self.ma_lenta.periodo:
+            return "LATERAL"
+        ma_rapida = self.ma_rapida.provisional(precio)
+        ma_lenta = self.ma_lenta.provisional(precio)
+        if ma_rapida > ma_lenta * 1.002:
+            return "ALCISTA"
+        elif ma_rapida < ma_lenta * 0.998:
+            return "BAJISTA"
+        return "LATERAL"
+
+    def a_dict(self):
+        return {'rsi': self.rsi.a_dict(), 'ma_rapida': self.ma_rapida.a_dict(),
+                'ma_lenta': self.ma_lenta.a_dict(), 'ultimo_timestamp': self.ultimo_timestamp}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        estado = cls()
+        estado.rsi = RSIWilderStream.desde_dict(datos['rsi'])
+        estado.ma_rapida = SMAStream.desde_dict(datos['ma_rapida'])
+        estado.ma_lenta = SMAStream.desde_dict(datos['ma_lenta'])
+        estado.ultimo_timestamp = datos['ultimo_timestamp']
+        return estado
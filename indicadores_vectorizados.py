@@ -0,0 +1,123 @@
+# indicadores_vectorizados.py - INDICADORES NUMPY SOBRE SERIES COMPLETAS (1-D O SÍMBOLOS x VELAS)
+import numpy as np
+
+
+def rellenar_adelante(valores):
+    """Forward-fill de NaN a lo largo del último eje (los NaN iniciales se mantienen)"""
+    valores = np.asarray(valores, dtype=np.float64)
+    validos = ~np.isnan(valores)
+    indices = np.where(validos, np.arange(valores.shape[-1]), 0)
+    np.maximum.accumulate(indices, axis=-1, out=indices)
+    rellenos = np.take_along_axis(valores, indices, axis=-1)
+    # Posiciones antes del primer valor válido siguen siendo NaN
+    rellenos[np.cumsum(validos, axis=-1) == 0] = np.nan
+    return rellenos
+
+
+def desplazar(valores, desplazamiento, relleno=np.nan):
+    """Mover cada fila del último eje `desplazamiento` posiciones a la izquierda (negativo: a la derecha)
+
+    `desplazamiento` es un escalar o uno por fila; los huecos que quedan se
+    llenan con `relleno`.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    n = valores.shape[-1]
+    indices = np.arange(n) + np.asarray(desplazamiento)[..., None]
+    salida = np.take_along_axis(valores, np.clip(indices, 0, max(n - 1, 0)), axis=-1)
+    salida[(indices < 0) | (indices >= n)] = relleno
+    return salida
+
+
+def suavizado_wilder(valores, periodo):
+    """Media móvil de Wilder (RMA) a lo largo del último eje
+
+    La semilla es la media simple de las primeras `periodo` muestras
+    (índice periodo-1); desde ahí y = y_prev + (x - y_prev) / periodo.
+    La recursión se resuelve en bloques con potencias de (1 - 1/periodo),
+    sin bucle por vela.
+    """
+    x = np.asarray(valores, dtype=np.float64)
+    salida = np.full(x.shape, np.nan)
+    n = x.shape[-1]
+    if n < periodo:
+        return salida
+    if periodo == 1:
+        salida[...] = x
+        return salida
+
+    alfa = 1.0 / periodo
+    beta = 1.0 - alfa
+    estado = x[..., :periodo].mean(axis=-1)
+    salida[..., periodo - 1] = estado
+
+    # Tamaño de bloque para que beta**-k no desborde float64
+    bloque = max(1, int(100 * np.log(10) / -np.log(beta)))
+    for inicio in range(periodo, n, bloque):
+        fin = min(inicio + bloque, n)
+        k = np.arange(1, fin - inicio + 1)
+        acumulado = np.cumsum(x[..., inicio:fin] * beta ** -k, axis=-1) * alfa
+        tramo = (estado[..., None] + acumulado) * beta ** k
+        salida[..., inicio:fin] = tramo
+        estado = tramo[..., -1]
+
+    return salida
+
+
+def rsi_wilder(precios, periodo=14):
+    """Serie completa de RSI de Wilder, alineada con `precios`
+
+    Acepta un array 1-D (una serie) o 2-D (símbolos x velas). Los NaN se
+    rellenan hacia adelante; el RSI vale NaN hasta tener `periodo` cambios
+    válidos y en las velas cuyo precio original era NaN. Las filas con NaN
+    al principio dan el mismo RSI que la serie sin ellos.
+    """
+    precios = np.asarray(precios, dtype=np.float64)
+    rellenos = rellenar_adelante(precios)
+    deltas = np.diff(rellenos, axis=-1)
+    validos = ~np.isnan(deltas)
+    if deltas.shape[-1] == 0:
+        return np.full(precios.shape, np.nan)
+
+    # Cada fila se suaviza desde su primer cambio válido: los NaN iniciales
+    # no pueden entrar como ceros en la semilla de Wilder
+    primeros = np.argmax(validos, axis=-1)
+    alineados = desplazar(np.where(validos, deltas, 0.0), primeros, 0.0)
+    media_ganancias = desplazar(suavizado_wilder(np.maximum(alineados, 0.0), periodo), -primeros)
+    media_perdidas = desplazar(suavizado_wilder(np.maximum(-alineados, 0.0), periodo), -primeros)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100.0 - 100.0 / (1.0 + media_ganancias / media_perdidas)
+    # Sin pérdidas: 100 (o 50 si tampoco hubo ganancias)
+    rsi = np.where(media_perdidas == 0, np.where(media_ganancias == 0, 50.0, 100.0), rsi)
+    rsi[np.cumsum(validos, axis=-1) < periodo] = np.nan
+
+    salida = np.full(precios.shape, np.nan)
+    salida[..., 1:] = rsi
+    salida[np.isnan(precios)] = np.nan
+    return salida
+
+
+def mascara_pivots(precios, window=5, es_maximo=True, longitudes=None):
+    """Máscara de pivots high/low sobre el último eje (1-D o símbolos x velas)
+
+    Una vela es pivot si su precio es el extremo de las `window` velas a cada
+    lado (ignorando NaN), igual que AnalisisTechnicoSR._detectar_pivots. Con
+    `longitudes` (matriz rellenada con NaN al final) las últimas `window`
+    velas reales de cada fila no se evalúan.
+    """
+    precios = np.asarray(precios, dtype=np.float64)
+    mascara = np.zeros(precios.shape, dtype=bool)
+    n = precios.shape[-1]
+    if n < 2 * window + 1:
+        return mascara
+
+    ventanas = np.lib.stride_tricks.sliding_window_view(precios, 2 * window + 1, axis=-1)
+    # fmax/fmin ignoran NaN sin avisos de "All-NaN slice"
+    extremos = (np.fmax if es_maximo else np.fmin).reduce(ventanas, axis=-1)
+    centros = precios[..., window:n - window]
+    mascara[..., window:n - window] = (centros == extremos) & ~np.isnan(centros)
+
+    if longitudes is not None:
+        limites = np.asarray(longitudes)[..., None] - window
+        mascara &= np.arange(n) < limites
+    return mascara
@@ -0,0 +1,105 @@
+# indice_niveles_sr.py - ÍNDICE INCREMENTAL DE NIVELES S/R (BISECT)
+import bisect
+from indicadores_streaming import DetectorPivotsStream
+
+TIPOS_NIVEL = ('support', 'resistance')
+
+
+class IndiceNivelesSR:
+    """Niveles S/R ordenados por precio, actualizados solo al confirmarse un pivot
+
+    Un pivot a menos de `tolerancia` (0.2%) de un nivel existente lo refuerza
+    en lugar de crear uno nuevo. Los niveles sin toques dentro de `horizonte`
+    segundos (3 meses) se descartan.
+    """
+
+    def __init__(self, window=5, tolerancia=0.002, horizonte=92 * 86400):
+        self.tolerancia = tolerancia
+        self.horizonte = horizonte
+        self.detector = DetectorPivotsStream(window)
+        self.niveles = {tipo: [] for tipo in TIPOS_NIVEL}
+        self.ultimo_toque = {tipo: {} for tipo in TIPOS_NIVEL}
+        self.ultimo_timestamp = None
+        self.ultimo_cierre = None
+        self.proxima_revision = 0
+
+    def __len__(self):
+        return sum(len(niveles) for niveles in self.niveles.values())
+
+    def agregar_pivot(self, tipo, timestamp, precio):
+        """Insertar un pivot confirmado (o reforzar el nivel cercano)"""
+        niveles = self.niveles[tipo]
+        i = bisect.bisect_left(niveles, precio)
+        for vecino in niveles[max(0, i - 1):i + 1]:
+            if abs(vecino - precio) <= precio * self.tolerancia:
+                self.ultimo_toque[tipo][vecino] = max(self.ultimo_toque[tipo][vecino], timestamp)
+                return False
+        niveles.insert(i, precio)
+        self.ultimo_toque[tipo][precio] = timestamp
+        return True
+
+    def actualizar(self, velas):
+        """Procesar las velas cerradas nuevas (la última se considera abierta)"""
+        nuevos = 0
+        timestamps = velas.timestamp.tolist()
+        highs, lows, closes = velas.high.tolist(), velas.low.tolist(), velas.close.tolist()
+        inicio = bisect.bisect_right(timestamps, self.ultimo_timestamp) if self.ultimo_timestamp is not None else 0
+
+        for i in range(inicio, len(timestamps) - 1):
+            nuevos += self.agregar_vela(timestamps[i], highs[i], lows[i], podar=False)
+
+        if closes:
+            self.ultimo_cierre = closes[-1]
+        if nuevos and self.ultimo_timestamp is not None:
+            self._podar(self.ultimo_timestamp - self.horizonte)
+        return nuevos
+
+    def agregar_vela(self, timestamp, high, low, podar=True):
+        """Procesar una vela cerrada; devuelve el número de niveles nuevos"""
+        nuevos = 0
+        for tipo, ts_pivot, precio in self.detector.actualizar(timestamp, high, low):
+            nuevos += self.agregar_pivot(tipo, ts_pivot, precio)
+        self.ultimo_timestamp = timestamp
+        if nuevos and podar:
+            self._podar(timestamp - self.horizonte)
+        return nuevos
+
+    def _podar(self, limite):
+        """Eliminar niveles sin toques desde `limite`"""
+        for tipo in TIPOS_NIVEL:
+            caducados = [precio for precio, ts in self.ultimo_toque[tipo].items() if ts < limite]
+            for precio in caducados:
+                del self.ultimo_toque[tipo][precio]
+                self.niveles[tipo].pop(bisect.bisect_left(self.niveles[tipo], precio))
+
+    def supports_relevantes(self, precio, n=2):
+        """Los `n` supports más altos por debajo de precio * 1.02 (O(log n))"""
+        niveles = self.niveles['support']
+        i = bisect.bisect_left(niveles, precio * 1.02)
+        return niveles[max(0, i - n):i][::-1]
+
+    def resistances_relevantes(self, precio, n=2):
+        """Las `n` resistances más bajas por encima de precio * 0.98 (O(log n))"""
+        niveles = self.niveles['resistance']
+        i = bisect.bisect_right(niveles, precio * 0.98)
+        return niveles[i:i + n]
+
+    def a_dict(self):
+        return {
+            'tolerancia': self.tolerancia, 'horizonte': self.horizonte,
+            'detector': self.detector.a_dict(),
+            'niveles': {tipo: [[precio, self.ultimo_toque[tipo][precio]] for precio in self.niveles[tipo]]
+                        for tipo in TIPOS_NIVEL},
+            'ultimo_timestamp': self.ultimo_timestamp, 'ultimo_cierre': self.ultimo_cierre
+        }
+
+    @classmethod
+    def desde_dict(cls, datos):
+        indice = cls(tolerancia=datos['tolerancia'], horizonte=datos['horizonte'])
+        indice.detector = DetectorPivotsStream.desde_dict(datos['detector'])
+        for tipo in TIPOS_NIVEL:
+            indice.niveles[tipo] = [precio for precio, _ in datos['niveles'][tipo]]
+            indice.ultimo_toque[tipo] = {precio: ts for precio, ts in datos['niveles'][tipo]}
+        indice.ultimo_timestamp = datos['ultimo_timestamp']
+        indice.ultimo_cierre = datos['ultimo_cierre']
+        return indice
@@ -0,0 +1,154 @@
+# instantaneas_estado.py - INSTANTÁNEAS ATÓMICAS DEL ESTADO Y RECUPERACIÓN RÁPIDA TRAS UN REINICIO
+import os
+import json
+import time
+import threading
+import numpy as np
+from almacen_posiciones import DTYPE_POSICION
+
+DIRECTORIO_INSTANTANEAS = os.environ.get('DIRECTORIO_INSTANTANEAS', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datos_diario'))
+
+VERSION_INSTANTANEA = 1
+NOMBRE_INSTANTANEA = 'estado.npz'
+
+
+def escribir_atomico(ruta, escribir):
+    """Escribir con `escribir(f)` en un temporal del mismo directorio y renombrarlo encima de `ruta`
+
+    Un lector (o un reinicio a mitad) ve el archivo anterior completo o el
+    nuevo completo, nunca uno a medias.
+    """
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    try:
+        with open(temporal, 'wb') as f:
+            escribir(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, ruta)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+    # Persistir también la entrada del directorio (no disponible en Windows)
+    if hasattr(os, 'O_DIRECTORY'):
+        descriptor = os.open(directorio, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+
+class InstantaneasEstado:
+    """Instantáneas periódicas de posiciones, estadísticas, indicadores y niveles S/R
+
+    Formato: un .npz sin comprimir con el array estructurado de posiciones
+    (DTYPE_POSICION tal cual, sin pickle) y un bloque JSON con el resto.
+    La instantánea anota la última secuencia del diario que refleja y solo
+    se publica cuando el diario ya tiene esos eventos en disco; al arrancar
+    se carga y se reaplican los eventos posteriores del diario.
+    """
+
+    def __init__(self, directorio=None, diario=None, indicadores=None, analisis_sr=None):
+        self.directorio = directorio or DIRECTORIO_INSTANTANEAS
+        self.ruta = os.path.join(self.directorio, NOMBRE_INSTANTANEA)
+        self.diario = diario
+        self.indicadores = indicadores    # IndicadoresReales (exportar_estados / importar_estados)
+        self.analisis_sr = analisis_sr    # AnalisisTecnico (niveles_sr_historicos)
+        self.ultima_guardada = None
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def capturar(self, gestor):
+        """Estado actual en memoria (rápido; el disco se toca en `escribir`)"""
+        estado = gestor.exportar_estado()
+        meta = {
+            'version': VERSION_INSTANTANEA,
+            'timestamp': time.time(),
+            'simbolos': estado['simbolos'],
+            'siguiente_id': estado['siguiente_id'],
+            'estadisticas': estado['estadisticas'],
+            'riesgo': estado['riesgo'],
+            'secuencia_diario': estado['secuencia_diario'],
+            'indicadores': self.indicadores.exportar_estados() if self.indicadores is not None else {},
+            'niveles_sr': {par: indice.a_dict() for par, indice in list(self.analisis_sr.niveles_sr_historicos.items())}
+                          if self.analisis_sr is not None else {}
+        }
+        return estado['posiciones'], meta
+
+    def escribir(self, posiciones, meta):
+        os.makedirs(self.directorio, exist_ok=True)
+        # La instantánea no puede ir por delante del diario: esperar a sus eventos
+        if self.diario is not None and meta['secuencia_diario']:
+            if not self.diario.esperar_escritura(meta['secuencia_diario']):
+                raise RuntimeError(f"Diario sin escribir hasta el evento {meta['secuencia_diario']} "
+                                   f"({self.diario.error}), no se publica la instantánea")
+        bloque = np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8)
+        escribir_atomico(self.ruta, lambda f: np.savez(f, posiciones=posiciones, meta=bloque))
+        self.ultima_guardada = meta['timestamp']
+        return self.ruta
+
+    def guardar(self, gestor):
+        return self.escribir(*self.capturar(gestor))
+
+    def cargar(self):
+        """Última instantánea como estado de GestorOperaciones (None si no hay o no es válida)"""
+        if not os.path.exists(self.ruta):
+            return None
+        try:
+            with np.load(self.ruta, allow_pickle=False) as datos:
+                posiciones = datos['posiciones']
+                meta = json.loads(datos['meta'].tobytes().decode('utf-8'))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Instantánea ilegible ({self.ruta}): {e}")
+            return None
+        if meta.get('version') != VERSION_INSTANTANEA or posiciones.dtype != DTYPE_POSICION:
+            print(f"⚠️ Instantánea con formato distinto (versión {meta.get('version')}), se ignora")
+            return None
+        meta['posiciones'] = posiciones
+        return meta
+
+    def restaurar(self, max_historial=None, limites_riesgo=None):
+        """GestorOperaciones recuperado: instantánea + cola del diario; restaura indicadores y S/R"""
+        from gestor_operaciones import GestorOperaciones, MAX_HISTORIAL
+
+        inicio = time.perf_counter()
+        estado = self.cargar()
+        if estado is not None:
+            if self.indicadores is not None:
+                self.indicadores.importar_estados(estado['indicadores'])
+            if self.analisis_sr is not None:
+                from indice_niveles_sr import IndiceNivelesSR
+                self.analisis_sr.niveles_sr_historicos.update(
+                    {par: IndiceNivelesSR.desde_dict(datos) for par, datos in estado['niveles_sr'].items()}
+                )
+
+        gestor = GestorOperaciones(self.diario, max_historial or MAX_HISTORIAL, estado, limites_riesgo)
+        origen = "instantánea + diario" if estado is not None else ("diario completo" if self.diario is not None else "vacío")
+        print(f"♻️ Estado recuperado ({origen}): {len(gestor.posiciones)} posiciones activas "
+              f"en {time.perf_counter() - inicio:.3f}s")
+        return gestor
+
+    def iniciar(self, gestor, intervalo=60):
+        """Guardar una instantánea cada `intervalo` segundos en un hilo de fondo"""
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        self._detener.clear()
+
+        def bucle():
+            while not self._detener.wait(intervalo):
+                try:
+                    self.guardar(gestor)
+                except Exception as e:
+                    print(f"❌ Error guardando instantánea: {e}")
+
+        self._hilo = threading.Thread(target=bucle, name='instantaneas-estado', daemon=True)
+        self._hilo.start()
+
+    def detener(self, gestor=None):
+        """Parar el hilo periódico; con `gestor` se guarda una última instantánea"""
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+        if gestor is not None:
+            self.guardar(gestor)
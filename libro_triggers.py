@@ -0,0 +1,99 @@
+# libro_triggers.py - LIBRO DE TRIGGERS DCA/TP/SL INDEXADO POR PRECIO (BISECT)
+import bisect
+import itertools
+import threading
+
+# Prioridad de salida en una misma actualización (como SimuladorAvanzado._verificar_objetivos)
+PRIORIDAD_SALIDA = ('TP2', 'TP1', 'SL')
+
+
+class LibroTriggers:
+    """Triggers pendientes por símbolo en listas ordenadas, separadas por lado
+
+    `bajada` guarda los niveles que se disparan cuando el precio cae hasta
+    ellos (DCA y SL de COMPRA, TP de VENTA) y `subida` los que se disparan
+    al subir (guardados con precio negado). En ambos casos los disparados
+    quedan al final de la lista, así cada actualización cuesta O(log n)
+    más el número de triggers disparados, sin recorrer las posiciones.
+    """
+
+    def __init__(self):
+        self.bajada = {}   # simbolo -> [(precio, secuencia, posicion_id, tipo)]
+        self.subida = {}   # simbolo -> [(-precio, secuencia, posicion_id, tipo)]
+        self.ultimo_precio = {}
+        self._triggers_posicion = {}  # posicion_id -> [(lista, entrada)]
+        self._secuencia = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(triggers) for triggers in self._triggers_posicion.values())
+
+    def agregar_posicion(self, posicion_id, simbolo, direccion, tp1, tp2, sl, dca_niveles=(), dca_activados=()):
+        """Registrar los triggers de una posición (los DCA ya activados se omiten)"""
+        compra = direccion == "COMPRA"
+        triggers = [(not compra, tp1, 'TP1'), (not compra, tp2, 'TP2'), (compra, sl, 'SL')]
+        activados = list(dca_activados) + [False] * (len(dca_niveles) - len(dca_activados))
+        triggers += [(compra, precio, f'DCA{k + 1}')
+                     for k, (precio, activado) in enumerate(zip(dca_niveles, activados)) if not activado]
+
+        with self._lock:
+            registrados = self._triggers_posicion.setdefault(posicion_id, [])
+            for es_bajada, precio, tipo in triggers:
+                if es_bajada:
+                    lista, entrada = self.bajada.setdefault(simbolo, []), (precio, next(self._secuencia), posicion_id, tipo)
+                else:
+                    lista, entrada = self.subida.setdefault(simbolo, []), (-precio, next(self._secuencia), posicion_id, tipo)
+                bisect.insort(lista, entrada)
+                registrados.append((lista, entrada))
+
+    def eliminar_posicion(self, posicion_id):
+        """Quitar los triggers pendientes de una posición (O(log n) cada uno)"""
+        with self._lock:
+            self._eliminar(posicion_id)
+
+    def _eliminar(self, posicion_id):
+        for lista, entrada in self._triggers_posicion.pop(posicion_id, []):
+            i = bisect.bisect_left(lista, entrada)
+            if i < len(lista) and lista[i] == entrada:
+                del lista[i]
+
+    def actualizar(self, simbolo, precio):
+        """Disparar los triggers cruzados por `precio`; devuelve un evento por posición afectada
+
+        Cada evento indica los niveles DCA activados y la salida (TP2 > TP1 >
+        SL si varios se cruzan en la misma actualización), en orden de cruce.
+        Las posiciones con salida quedan fuera del libro.
+        """
+        with self._lock:
+            self.ultimo_precio[simbolo] = precio
+            disparados = []
+
+            bajada = self.bajada.get(simbolo)
+            if bajada:
+                # Niveles >= precio; el precio que cae toca antes los más altos
+                i = bisect.bisect_left(bajada, (precio,))
+                disparados.extend(reversed(bajada[i:]))
+                del bajada[i:]
+
+            subida = self.subida.get(simbolo)
+            if subida:
+                # Niveles <= precio (negados: >= -precio); primero los más bajos
+                i = bisect.bisect_left(subida, (-precio,))
+                disparados.extend(reversed(subida[i:]))
+                del subida[i:]
+
+            eventos = {}
+            for _, _, posicion_id, tipo in disparados:
+                evento = eventos.setdefault(posicion_id, {'posicion_id': posicion_id, 'dca': [], 'salida': None, 'precio': precio})
+                registrados = self._triggers_posicion.get(posicion_id)
+                if registrados is not None:
+                    self._triggers_posicion[posicion_id] = [(l, e) for l, e in registrados if e[2:] != (posicion_id, tipo)]
+                if tipo.startswith('DCA'):
+                    evento['dca'].append(int(tipo[3:]))
+                elif evento['salida'] is None or PRIORIDAD_SALIDA.index(tipo) < PRIORIDAD_SALIDA.index(evento['salida']):
+                    evento['salida'] = tipo
+
+            for evento in eventos.values():
+                if evento['salida'] is not None:
+                    self._eliminar(evento['posicion_id'])
+            return list(eventos.values())
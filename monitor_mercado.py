@@ -1,59 +1,395 @@
-# monitor_mercado.py - VERSIÓN SIMPLIFICADA
+# monitor_mercado.py - MONITOR ASÍNCRONO SINCRONIZADO CON EL CIERRE DE VELAS
 import time
+import asyncio
 import threading
+from collections import deque
 from datetime import datetime
+import numpy as np
+from resampleo_velas import SEGUNDOS_INTERVALO
+from planificador_sondeo import PlanificadorSondeo, PresupuestoPeticiones, urgencia_analisis, PRESUPUESTO_POR_MINUTO
+
+# Segundos tras el cierre de la vela antes de analizar (el proveedor publica la vela cerrada con retraso)
+MARGEN_CIERRE = 5
+# Análisis simultáneos como máximo (cada uno hace peticiones HTTP en un hilo)
+MAX_CONCURRENTES = 4
+# Muestras que se conservan para los percentiles de latencia y lag
+VENTANA_METRICAS = 500
+# Peticiones HTTP estimadas por sondeo de precio y por análisis completo
+COSTE_SONDEO = 1
+COSTE_ANALISIS = 2
+
+
+def proximo_cierre(ahora, segundos_intervalo):
+    """Epoch del próximo cierre de vela (múltiplos del intervalo, como las velas de Yahoo)"""
+    return (ahora // segundos_intervalo + 1) * segundos_intervalo
+
+
+def resumen_percentiles(valores):
+    if not valores:
+        return {'p50': None, 'p95': None, 'max': None}
+    p50, p95 = np.percentile(valores, [50, 95])
+    return {'p50': round(float(p50), 3), 'p95': round(float(p95), 3), 'max': round(float(max(valores)), 3)}
+
 
 class MonitorMercado:
-    def __init__(self):
+    """Una tarea asyncio por par que analiza en cada cierre de vela del intervalo
+
+    Los análisis (bloqueantes, con HTTP) se ejecutan en hilos con
+    asyncio.to_thread, limitados por un semáforo. Métricas por análisis:
+    lag = retraso del inicio respecto al momento previsto (cierre + margen),
+    latencia = desde el cierre de la vela hasta tener el resultado; la
+    latencia de ciclo es la del último par analizado para ese cierre.
+
+    Entre cierres, una tarea de sondeo consulta el precio de cada par con
+    una frecuencia según su urgencia (distancia S/R y RSI, ver
+    planificador_sondeo): aplica el precio a las operaciones abiertas y
+    abre la señal si el par entra en zona óptima. Sondeos y análisis
+    comparten un presupuesto de peticiones por minuto; su ráfaga cubre los
+    análisis de todos los pares en un mismo cierre y los análisis tienen
+    prioridad: mientras alguno espera saldo, los sondeos no reservan.
+
+    Aperturas, DCA y cierres se registran en `diario` (DiarioOperaciones,
+    por defecto el de RUTA_DIARIO). Al crear el monitor el estado se
+    recupera de la última instantánea más la cola del diario; mientras
+    monitorea se guarda una instantánea periódica y al detenerlo una final
+    antes de cerrar el diario.
+    """
+
+    def __init__(self, pares=None, intervalo='1h', margen_cierre=MARGEN_CIERRE, max_concurrentes=MAX_CONCURRENTES,
+                 presupuesto_por_minuto=PRESUPUESTO_POR_MINUTO, sondeo=True, diario=None, directorio_instantaneas=None):
+        from config import RISK_MANAGEMENT, TOP_PARES
+        from diario_operaciones import DiarioOperaciones
+        from instantaneas_estado import InstantaneasEstado
+        self.pares = list(pares or TOP_PARES)
+        self.intervalo = intervalo
+        self.segundos_intervalo = SEGUNDOS_INTERVALO[intervalo]
+        self.margen_cierre = margen_cierre
+        self.max_concurrentes = max_concurrentes
         self.monitoreando = False
-        self.capital_actual = 1000
-        self.gestor = type('obj', (object,), {'operaciones_activas': {}})()
-        
+        # IMPORTACIONES DIFERIDAS
+        self.estrategia = None
+        estrategia = self._get_estrategia()
+
+        self.diario = diario if diario is not None else DiarioOperaciones()
+        self.instantaneas = InstantaneasEstado(directorio_instantaneas, self.diario,
+                                               estrategia._get_indicadores_reales(), estrategia._get_analisis_sr())
+        # Límites de RISK_MANAGEMENT aplicados en cada apertura
+        self.gestor = self.instantaneas.restaurar(limites_riesgo=RISK_MANAGEMENT)
+        self._persistencia_cerrada = False
+
+        self.metricas_par = {par: {'analisis': 0, 'errores': 0, 'señales': 0, 'ultimo_cierre': None,
+                                   'lag': None, 'latencia': None, 'duracion': None} for par in self.pares}
+        self.lags = deque(maxlen=VENTANA_METRICAS)
+        self.latencias = deque(maxlen=VENTANA_METRICAS)
+        self.latencias_ciclo = deque(maxlen=VENTANA_METRICAS)
+        self._ciclos = {}  # cierre -> [pares analizados, latencia máxima]
+        self._lock_metricas = threading.Lock()
+
+        # Presupuesto común; lo que no reservan los análisis al cierre queda para sondeos
+        self.sondeo = sondeo
+        self.presupuesto = PresupuestoPeticiones(
+            presupuesto_por_minuto, max(presupuesto_por_minuto / 6, len(self.pares) * COSTE_ANALISIS)
+        )
+        reserva_analisis = len(self.pares) * COSTE_ANALISIS * 60 / self.segundos_intervalo
+        self.planificador = PlanificadorSondeo(self.pares, max(presupuesto_por_minuto - reserva_analisis, 1))
+        self.sondeos_par = {par: 0 for par in self.pares}
+        self._tareas_sondeo = set()
+        self._analisis_esperando = 0  # análisis esperando saldo (solo se toca desde el bucle)
+
+        self._loop = None
+        self._parada = None
+        self._semaforo = None
+        self._hilo_bucle = None
+        self._terminado = threading.Event()
+
+    def _get_estrategia(self):
+        if self.estrategia is None:
+            from estrategia_dca import EstrategiaDCA
+            self.estrategia = EstrategiaDCA()
+        return self.estrategia
+
+    @property
+    def capital_actual(self):
+        return self.gestor.riesgo.capital
+
     def obtener_estadisticas_riesgo(self):
+        """Estadísticas del gestor + métricas de riesgo en streaming (formato de enviar_estadisticas_diarias)"""
+        estadisticas = dict(self.gestor.estadisticas)
+        estadisticas.update(self.gestor.riesgo.resumen())
+        estadisticas['operaciones_activas'] = len(self.gestor.operaciones_activas)
+        estadisticas['timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return estadisticas
+
+    def reanudar_operativa(self):
+        """Levantar el bloqueo de riesgo (manual) y guardarlo ya en una instantánea
+
+        Sin la instantánea, un reinicio volvería a cargar el estado bloqueado.
+        Devuelve el motivo del bloqueo levantado o None si no había.
+        """
+        motivo = self.gestor.reanudar_operativa()
+        if motivo is not None:
+            self.instantaneas.guardar(self.gestor)
+        return motivo
+
+    def analizar_par(self, par):
+        """Análisis bloqueante de un par (se ejecuta en un hilo)
+
+        Si el par tiene operaciones abiertas, su precio se aplica antes a los
+        triggers (DCA/TP/SL) para que también se gestionen en cada cierre.
+        """
+        estrategia = self._get_estrategia()
+        if self.gestor.posiciones.tiene_simbolo(par):
+            # Solo precio real: con Yahoo caído se omite este tick
+            precio = estrategia._get_yahoo().obtener_precio_mercado(par)
+            if precio is not None:
+                self.gestor.procesar_precio(par, precio)
+        return estrategia.generar_señal_real(par)
+
+    def sondear_par(self, par):
+        """Sondeo bloqueante: precio actual -> triggers de las operaciones, urgencia y posible señal
+        
+        Solo el precio sale de la red; RSI/tendencia son provisionales sobre el
+        estado incremental y los niveles S/R vienen del índice en memoria.
+        """
+        estrategia = self._get_estrategia()
+        # Solo precio real: con Yahoo caído no hay triggers ni señal en este sondeo.
+        # Sin cache: el token del presupuesto ya está gastado y la vela de 1m
+        # cacheada puede tener hasta un minuto.
+        precio = estrategia._get_yahoo().obtener_precio_mercado(par, refrescar=True)
+        if precio is None:
+            return None
+        self.gestor.procesar_precio(par, precio)
+        
+        provisional = estrategia._get_indicadores_reales().provisional(par, precio)
+        if provisional is None:
+            # Sin estado hasta el primer análisis completo del par
+            return None
+        rsi, tendencia = provisional
+        analisis_sr = estrategia._get_analisis_sr()
+        # Mismas reglas que analizar_estructura_mercado sin su traza por llamada (el sondeo es frecuente)
+        niveles = analisis_sr.niveles_relevantes(par, precio) or analisis_sr._niveles_sr_base(par)
+        analisis = analisis_sr.evaluar_estructura(par, precio, tendencia, rsi, niveles)
+        
+        señal = None
+        if analisis_sr.es_zona_compra_optima(analisis) or analisis_sr.es_zona_venta_optima(analisis):
+            señal = estrategia.construir_señal(par, precio, rsi, tendencia, 'Sondeo', analisis)
         return {
-            'capital_actual': self.capital_actual,
-            'total_operaciones': 0,
-            'operaciones_ganadoras': 0,
-            'win_rate': 0,
-            'perdidas_consecutivas': 0
+            'precio': precio,
+            'rsi': rsi,
+            'urgencia': urgencia_analisis(analisis, precio, analisis_sr.umbral_proximidad_pct(par), rsi,
+                                          analisis_sr.rsi_compra, analisis_sr.rsi_venta),
+            'señal': señal
         }
-    
-    def analizar_par(self, par):
-        print(f"🔍 Analizando {par}...")
-        # Simulación de análisis
-        return None
-    
+
     def ejecutar_señal(self, señal):
-        print(f"🎯 Ejecutando señal: {señal}")
-    
-    def iniciar_monitoreo(self):
-        print("🤖 INICIANDO MONITOREO AUTOMÁTICO...")
+        if self.gestor.posiciones.tiene_simbolo(señal['par']):
+            print(f"⏭️ {señal['par']}: ya hay una operación activa, señal ignorada")
+            return None
+        print(f"🎯 Ejecutando señal: {señal['par']} {señal['direccion']} @ {señal['precio_actual']}")
+        return self.gestor.abrir_operacion(señal)
+
+    # ------------------------------------------------------------ métricas
+
+    def _registrar_analisis(self, par, cierre, lag, latencia, duracion, error=False, señal=False, inicial=False):
+        with self._lock_metricas:
+            metricas = self.metricas_par[par]
+            metricas['analisis'] += 1
+            metricas['errores'] += int(error)
+            metricas['señales'] += int(señal)
+            metricas['ultimo_cierre'] = datetime.fromtimestamp(cierre).isoformat()
+            metricas['lag'] = round(lag, 3)
+            metricas['latencia'] = round(latencia, 3)
+            metricas['duracion'] = round(duracion, 3)
+            if inicial:
+                # El análisis de arranque no está ligado a un cierre: fuera de los percentiles
+                return
+            self.lags.append(lag)
+            self.latencias.append(latencia)
+
+            ciclo = self._ciclos.setdefault(cierre, [0, 0.0])
+            ciclo[0] += 1
+            ciclo[1] = max(ciclo[1], latencia)
+            if ciclo[0] == len(self.pares):
+                self.latencias_ciclo.append(ciclo[1])
+                del self._ciclos[cierre]
+            # Cierres que nunca se completarán (monitor detenido a mitad): no acumular
+            for antiguo in [c for c in self._ciclos if c < cierre - 2 * self.segundos_intervalo]:
+                del self._ciclos[antiguo]
+
+    def obtener_metricas(self):
+        """Lag y latencia (segundos) por par y percentiles globales"""
+        with self._lock_metricas:
+            return {
+                'intervalo': self.intervalo,
+                'pares': {par: dict(metricas) for par, metricas in self.metricas_par.items()},
+                'lag': resumen_percentiles(list(self.lags)),
+                'latencia': resumen_percentiles(list(self.latencias)),
+                'latencia_ciclo': resumen_percentiles(list(self.latencias_ciclo)),
+                'sondeo': {
+                    par: dict(prioridad, sondeos=self.sondeos_par[par])
+                    for par, prioridad in self.planificador.resumen().items()
+                },
+                'peticiones_consumidas': self.presupuesto.consumidas
+            }
+
+    # ------------------------------------------------------------ bucle asíncrono
+
+    async def _esperar_hasta(self, instante):
+        """Dormir hasta `instante` (epoch); False si se pide parar antes"""
+        espera = instante - time.time()
+        if espera > 0:
+            try:
+                await asyncio.wait_for(self._parada.wait(), espera)
+            except asyncio.TimeoutError:
+                pass
+        return not self._parada.is_set()
+
+    async def _reservar(self, coste, ceder=False):
+        """Esperar saldo en el presupuesto de peticiones; False si se pide parar antes
+
+        Con `ceder` (sondeos) no se reserva mientras algún análisis espera saldo.
+        """
+        while True:
+            espera = 1.0 if ceder and self._analisis_esperando else self.presupuesto.reservar(coste)
+            if espera <= 0:
+                return True
+            if not await self._esperar_hasta(time.time() + espera):
+                return False
+
+    async def _analizar(self, par, cierre, inicial=False):
+        previsto = cierre + self.margen_cierre
+        self._analisis_esperando += 1
+        try:
+            reservado = await self._reservar(COSTE_ANALISIS)
+        finally:
+            self._analisis_esperando -= 1
+        if not reservado:
+            return
+        async with self._semaforo:
+            inicio = time.time()
+            error, señal = False, None
+            try:
+                señal = await asyncio.to_thread(self.analizar_par, par)
+            except Exception as e:
+                error = True
+                print(f"❌ Error analizando {par}: {e}")
+            fin = time.time()
+        self._registrar_analisis(par, cierre, max(inicio - previsto, 0.0), fin - cierre, fin - inicio, error, bool(señal), inicial)
+        if señal:
+            try:
+                self.ejecutar_señal(señal)
+            except Exception as e:
+                print(f"❌ Error ejecutando señal {par}: {e}")
+
+    async def _tarea_par(self, par, analizar_al_iniciar):
+        if analizar_al_iniciar:
+            # Primera pasada con la última vela ya cerrada
+            await self._analizar(par, proximo_cierre(time.time(), self.segundos_intervalo) - self.segundos_intervalo, inicial=True)
+        while True:
+            cierre = proximo_cierre(time.time(), self.segundos_intervalo)
+            if not await self._esperar_hasta(cierre + self.margen_cierre):
+                return
+            await self._analizar(par, cierre)
+
+    async def _sondear(self, par):
+        resultado = None
+        async with self._semaforo:
+            try:
+                resultado = await asyncio.to_thread(self.sondear_par, par)
+            except Exception as e:
+                print(f"❌ Error sondeando {par}: {e}")
+        self.sondeos_par[par] += 1
+        self.planificador.completar_sondeo(par, resultado['urgencia'] if resultado else None)
+        if resultado and resultado['señal']:
+            try:
+                self.ejecutar_señal(resultado['señal'])
+            except Exception as e:
+                print(f"❌ Error ejecutando señal {par}: {e}")
+
+    async def _tarea_sondeo(self):
+        """Lanzar el sondeo del par con el vencimiento más próximo (revisa al menos cada segundo)"""
+        while True:
+            siguiente = self.planificador.siguiente()
+            instante = siguiente[1] if siguiente else time.time() + 1
+            if not await self._esperar_hasta(min(instante, time.time() + 1)):
+                return
+            if siguiente is None or siguiente[1] > time.time():
+                continue
+            par = siguiente[0]
+            self.planificador.iniciar_sondeo(par)
+            if not await self._reservar(COSTE_SONDEO, ceder=True):
+                return
+            tarea = asyncio.create_task(self._sondear(par), name=f"sondeo-{par}")
+            self._tareas_sondeo.add(tarea)
+            tarea.add_done_callback(self._tareas_sondeo.discard)
+
+    async def monitorear(self, analizar_al_iniciar=True):
+        """Lanzar una tarea por par y esperar hasta `detener_monitoreo`
+
+        Un monitor detenido ya cerró su diario: para volver a monitorear se crea otro.
+        """
+        if self._persistencia_cerrada:
+            raise RuntimeError("Monitor detenido (diario cerrado): crear un MonitorMercado nuevo")
         self.monitoreando = True
-        
-        ciclo = 0
-        while self.monitoreando:
-            ciclo += 1
-            print(f"🔄 Ciclo #{ciclo} - {datetime.now().strftime('%H:%M:%S')}")
-            
-            # Pares a monitorear
-            pares = ["EURUSD", "USDCAD", "XAUUSD"]
-            
-            for par in pares:
-                if not self.monitoreando:
-                    break
-                    
-                señal = self.analizar_par(par)
-                if señal:
-                    self.ejecutar_señal(señal)
-                
-                time.sleep(2)
-            
-            print("⏳ Esperando 2 minutos para próximo ciclo...")
-            for i in range(120):
-                if not self.monitoreando:
-                    break
-                time.sleep(1)
-    
-    def detener_monitoreo(self):
+        self._terminado.clear()
+        self._hilo_bucle = threading.get_ident()
+        self._loop = asyncio.get_running_loop()
+        self._parada = asyncio.Event()
+        self._semaforo = asyncio.Semaphore(self.max_concurrentes)
+        tareas = []
+        try:
+            # Crear dependencias antes de lanzar hilos (evita inicializaciones duplicadas)
+            await asyncio.to_thread(self._crear_dependencias)
+            self.instantaneas.iniciar(self.gestor)
+
+            print(f"🤖 INICIANDO MONITOREO: {len(self.pares)} pares, análisis al cierre de cada vela {self.intervalo}"
+                  f"{', sondeo por prioridad' if self.sondeo else ''} ({self.presupuesto.por_minuto} peticiones/min)")
+            tareas = [asyncio.create_task(self._tarea_par(par, analizar_al_iniciar), name=f"monitor-{par}") for par in self.pares]
+            if self.sondeo:
+                tareas.append(asyncio.create_task(self._tarea_sondeo(), name="monitor-sondeo"))
+            await asyncio.gather(*tareas)
+            # Los hilos de los sondeos en curso no se pueden cancelar: terminarlos antes de cerrar el diario
+            await asyncio.gather(*self._tareas_sondeo, return_exceptions=True)
+        finally:
+            for tarea in tareas + list(self._tareas_sondeo):
+                tarea.cancel()
+            self.monitoreando = False
+            self._cerrar_persistencia()
+            self._terminado.set()
+
+    def _cerrar_persistencia(self):
+        """Instantánea final y cierre del diario (una sola vez)"""
+        if self._persistencia_cerrada:
+            return
+        self._persistencia_cerrada = True
+        try:
+            self.instantaneas.detener(self.gestor)
+        except Exception as e:
+            print(f"❌ Error guardando la instantánea final: {e}")
+        self.diario.cerrar()
+
+    def _crear_dependencias(self):
+        estrategia = self._get_estrategia()
+        estrategia._get_yahoo()
+        estrategia._get_indicadores_reales()
+        estrategia._get_analisis_sr()
+
+    def iniciar_monitoreo(self, analizar_al_iniciar=True):
+        """Bloqueante: ejecuta el bucle asyncio en el hilo que llama"""
+        asyncio.run(self.monitorear(analizar_al_iniciar))
+
+    def detener_monitoreo(self, timeout=60):
+        """Se puede llamar desde cualquier hilo
+
+        Desde otro hilo espera (hasta `timeout`) a que terminen los análisis y
+        sondeos en curso y se cierre el diario.
+        """
         print("🛑 Deteniendo monitoreo...")
         self.monitoreando = False
+        if self._loop is None or self._parada is None or self._terminado.is_set():
+            # Nunca arrancó o ya terminó: no hay nada en curso
+            self._cerrar_persistencia()
+            return
+        self._loop.call_soon_threadsafe(self._parada.set)
+        if threading.get_ident() != self._hilo_bucle:
+            self._terminado.wait(timeout)
@@ -0,0 +1,139 @@
+# motor_indicadores.py - MOTOR DE INDICADORES MULTI-SÍMBOLO (MATRIZ SÍMBOLOS x VELAS)
+import numpy as np
+from indicadores_vectorizados import rsi_wilder
+
+# Tabla compacta de resultados (una fila por símbolo)
+DTYPE_RESULTADO = np.dtype([
+    ('par', 'U16'),
+    ('timestamp', 'i8'),
+    ('precio', 'f8'),
+    ('rsi', 'f8'),
+    ('ma_rapida', 'f8'),
+    ('ma_lenta', 'f8'),
+    ('tendencia', 'U8'),
+    ('distancia_support', 'f8'),
+    ('distancia_resistance', 'f8'),
+    ('umbral_proximidad', 'f8'),
+    ('zona_actual', 'U10'),
+    ('señal', 'U6'),
+    ('confianza', 'U5'),
+    ('optima', '?')
+])
+
+
+def alinear_series(series, columna='close'):
+    """Alinear series VelasOHLCV en una rejilla común de timestamps (NaN = sin vela)"""
+    pares = list(series)
+    rejilla = np.unique(np.concatenate([series[par].timestamp for par in pares])) if pares else np.empty(0, dtype=np.int64)
+    matriz = np.full((len(pares), len(rejilla)), np.nan)
+    for fila, par in enumerate(pares):
+        velas = series[par]
+        matriz[fila, np.searchsorted(rejilla, velas.timestamp)] = velas[columna]
+    return pares, rejilla, matriz
+
+
+def empaquetar_izquierda(matriz):
+    """Mover los valores válidos de cada fila al inicio (orden estable) y devolver longitudes
+
+    Así cada fila es la serie propia del símbolo sin huecos de la rejilla
+    común, y los indicadores recursivos (Wilder) arrancan en su primera vela.
+    """
+    orden = np.argsort(np.isnan(matriz), axis=1, kind='stable')
+    return np.take_along_axis(matriz, orden, axis=1), (~np.isnan(matriz)).sum(axis=1)
+
+
+class MotorIndicadores:
+    def __init__(self, indicadores=None, analisis_sr=None, periodo_rsi=14, periodo_tendencia=20):
+        # IMPORTACIONES DIFERIDAS
+        if indicadores is None:
+            from indicadores_reales import IndicadoresReales
+            indicadores = IndicadoresReales()
+        if analisis_sr is None:
+            from analisis_tecnico import AnalisisTechnicoSR
+            analisis_sr = AnalisisTechnicoSR()
+            analisis_sr.indicadores = indicadores
+        self.indicadores = indicadores
+        self.analisis_sr = analisis_sr
+        self.periodo_rsi = periodo_rsi
+        self.periodo_tendencia = periodo_tendencia
+
+    def obtener_series(self, pares, periodo="1mo", timeframe="1h"):
+        """Descargar (en paralelo, vía cache/almacén) las velas válidas de cada par"""
+        datos = self.indicadores.yahoo.ejecutar_en_paralelo(
+            lambda par: self.indicadores.obtener_datos_timeframe(par, periodo, timeframe), pares
+        )
+        return {par: velas.validas() for par, velas in datos.items() if velas is not None and len(velas)}
+
+    def calcular(self, pares, periodo="1mo", timeframe="1h", series=None):
+        """Calcular RSI, medias, tendencia y proximidad S/R de todos los pares a la vez"""
+        if series is None:
+            series = self.obtener_series(pares, periodo, timeframe)
+        pares_validos, _, cierres = alinear_series(series)
+        tabla = np.zeros(len(pares_validos), dtype=DTYPE_RESULTADO)
+        if not pares_validos:
+            return tabla
+
+        cierres, longitudes = empaquetar_izquierda(cierres)
+        filas = np.arange(len(pares_validos))
+        ultimo = np.maximum(longitudes - 1, 0)
+
+        # RSI de Wilder de todas las series en una pasada
+        rsi = rsi_wilder(cierres, self.periodo_rsi)[filas, ultimo]
+        rsi = np.where(np.isnan(rsi), 50.0, np.round(rsi, 2))
+
+        # Medias de determinar_tendencia con sumas acumuladas
+        acumulado = np.concatenate([np.zeros((len(filas), 1)), np.cumsum(np.nan_to_num(cierres), axis=1)], axis=1)
+        n_rapida, n_lenta = self.periodo_tendencia // 2, self.periodo_tendencia
+        ma_rapida = (acumulado[filas, longitudes] - acumulado[filas, np.maximum(longitudes - n_rapida, 0)]) / n_rapida
+        ma_lenta = (acumulado[filas, longitudes] - acumulado[filas, np.maximum(longitudes - n_lenta, 0)]) / n_lenta
+        con_datos = longitudes >= n_lenta
+        tendencia = np.select(
+            [con_datos & (ma_rapida > ma_lenta * 1.002), con_datos & (ma_rapida < ma_lenta * 0.998)],
+            ["ALCISTA", "BAJISTA"], "LATERAL"
+        )
+
+        precio = cierres[filas, ultimo]
+
+        # Niveles S/R del índice incremental (2 por lado), proximidad vectorizada
+        supports = np.full((len(filas), 2), np.nan)
+        resistances = np.full((len(filas), 2), np.nan)
+        umbral_pct = np.empty(len(filas))
+        for fila, par in enumerate(pares_validos):
+            niveles = self.analisis_sr.niveles_relevantes(par, float(precio[fila])) or self.analisis_sr._niveles_sr_base(par)
+            supports[fila, :len(niveles['support'][:2])] = niveles['support'][:2]
+            resistances[fila, :len(niveles['resistance'][:2])] = niveles['resistance'][:2]
+            umbral_pct[fila] = self.analisis_sr.umbral_proximidad_pct(par)
+
+        distancia_support = np.fmin.reduce(np.abs(precio[:, None] - supports), axis=1)
+        distancia_resistance = np.fmin.reduce(np.abs(precio[:, None] - resistances), axis=1)
+        umbral = precio * umbral_pct
+
+        # Mismas reglas que AnalisisTechnicoSR.analizar_estructura_mercado
+        cerca_support = distancia_support < umbral
+        cerca_resistance = distancia_resistance < umbral
+        sr = self.analisis_sr
+        compra_alta = cerca_support & (rsi < sr.rsi_sobreventa) & (tendencia == "ALCISTA")
+        compra_media = cerca_support & (rsi < sr.rsi_compra)
+        venta_alta = cerca_resistance & (rsi > sr.rsi_sobrecompra) & (tendencia == "BAJISTA")
+        venta_media = cerca_resistance & (rsi > sr.rsi_venta)
+
+        señal = np.select([venta_alta | venta_media, compra_alta | compra_media], ["VENTA", "COMPRA"], "")
+        confianza = np.select([venta_alta, venta_media, compra_alta, compra_media], ["ALTA", "MEDIA", "ALTA", "MEDIA"], "BAJA")
+        zona = np.select([distancia_support < distancia_resistance, distancia_resistance < distancia_support],
+                         ["SUPPORT", "RESISTANCE"], "NEUTRAL")
+
+        tabla['par'] = pares_validos
+        tabla['timestamp'] = [series[par].timestamp[-1] for par in pares_validos]
+        tabla['precio'] = precio
+        tabla['rsi'] = rsi
+        tabla['ma_rapida'] = ma_rapida
+        tabla['ma_lenta'] = ma_lenta
+        tabla['tendencia'] = tendencia
+        tabla['distancia_support'] = np.round(distancia_support, 5)
+        tabla['distancia_resistance'] = np.round(distancia_resistance, 5)
+        tabla['umbral_proximidad'] = umbral
+        tabla['zona_actual'] = zona
+        tabla['señal'] = señal
+        tabla['confianza'] = confianza
+        tabla['optima'] = ((señal == "COMPRA") & (zona == "SUPPORT")) | ((señal == "VENTA") & (zona == "RESISTANCE"))
+        return tabla
@@ -0,0 +1,82 @@
+# motor_salidas.py - MOTOR VECTORIZADO DE SALIDAS (DCA + PRECIO PROMEDIO + TP/SL)
+import numpy as np
+
+
+def _primer_cruce(mascara):
+    """Índice del primer True a lo largo del eje de pasos (-1 si nunca ocurre)"""
+    return np.where(mascara.any(axis=1), mascara.argmax(axis=1), -1)
+
+
+def resolver_salidas(caminos, direccion, precio_entrada, tp1, tp2, sl, dca_niveles=None,
+                     leverage=1, dca_activados=None, cierre_en_nivel=False):
+    """Resolver a la vez N posiciones/caminos sobre una matriz de precios (N x pasos)
+
+    Los parámetros pueden ser escalares (misma operación en todos los caminos)
+    o arrays de longitud N (una posición por fila); `dca_niveles` es (K,) o
+    (N, K). Cada nivel DCA se activa en su primer cruce si ocurre antes o en
+    el mismo paso que la salida, y el precio promedio (igual peso por
+    entrada, como AlmacenPosiciones.activar_dca) se calcula
+    con los niveles activados en ese momento. La salida es el primer cruce
+    de TP1/TP2/SL con la prioridad de SimuladorAvanzado._verificar_objetivos;
+    sin cruce se cierra al último precio (TP1 si hay profit, si no SL).
+
+    Por defecto el precio de cierre es el del paso que cruza. Con
+    `cierre_en_nivel` es el nivel cruzado (TP2, TP1 o SL): para caminos de
+    velas (high/low), donde el paso que cruza es un extremo de la vela y no
+    el precio al que se habría ejecutado la orden.
+    """
+    caminos = np.atleast_2d(np.asarray(caminos, dtype=np.float64))
+    n, pasos = caminos.shape
+    filas = np.arange(n)
+
+    signo = np.where(np.broadcast_to(np.asarray(direccion) == "COMPRA", (n,)), 1.0, -1.0)[:, None]
+    columna = lambda valor: np.broadcast_to(np.asarray(valor, dtype=np.float64), (n,))[:, None]
+    entrada, tp1, tp2, sl = columna(precio_entrada), columna(tp1), columna(tp2), columna(sl)
+
+    # Distancias orientadas: > 0 a favor de la posición
+    toca_tp1 = signo * (caminos - tp1) >= 0
+    toca_tp2 = signo * (caminos - tp2) >= 0
+    toca_sl = signo * (caminos - sl) <= 0
+
+    paso_cierre = _primer_cruce(toca_tp1 | toca_tp2 | toca_sl)
+    timeout = paso_cierre < 0
+    paso = np.where(timeout, pasos - 1, paso_cierre)
+    precio_cierre = caminos[filas, paso]
+    if cierre_en_nivel:
+        nivel = np.select([toca_tp2[filas, paso], toca_tp1[filas, paso]], [tp2[:, 0], tp1[:, 0]], sl[:, 0])
+        precio_cierre = np.where(timeout, precio_cierre, nivel)
+
+    # Niveles DCA: primer cruce por nivel (N x K)
+    if dca_niveles is None:
+        dca = np.empty((n, 0))
+    else:
+        dca = np.asarray(dca_niveles, dtype=np.float64)
+        dca = np.broadcast_to(dca, (n, dca.shape[-1])) if dca.ndim <= 1 else dca
+    toca_dca = signo[:, :, None] * (caminos[:, :, None] - dca[:, None, :]) <= 0
+    pasos_dca = np.where(toca_dca.any(axis=1), toca_dca.argmax(axis=1), -1)
+    activados = (pasos_dca >= 0) & (pasos_dca <= paso[:, None])
+    if dca_activados is not None:
+        activados |= np.broadcast_to(np.asarray(dca_activados, dtype=bool), activados.shape)
+
+    n_activados = activados.sum(axis=1)
+    precio_promedio = (entrada[:, 0] + np.where(activados, dca, 0.0).sum(axis=1)) / (1 + n_activados)
+
+    profit = signo[:, 0] * (precio_cierre - precio_promedio) / precio_promedio * 100
+    profit = profit * np.broadcast_to(np.asarray(leverage, dtype=np.float64), (n,))
+
+    resultado = np.select(
+        [~timeout & toca_tp2[filas, paso], ~timeout & toca_tp1[filas, paso], ~timeout, profit > 0],
+        ['TP2', 'TP1', 'SL', 'TP1'], 'SL'
+    )
+
+    return {
+        'resultado': resultado,
+        'paso': paso,
+        'timeout': timeout,
+        'precio_cierre': precio_cierre,
+        'precio_promedio': precio_promedio,
+        'dca_activados': activados,
+        'pasos_dca': np.where(activados, pasos_dca, -1),
+        'niveles_dca_activados': n_activados,
+        'profit': profit
+    }
@@ -0,0 +1,117 @@
+# planificador_sondeo.py - PRIORIDAD DE SONDEO POR PAR (DISTANCIA S/R + RSI) CON PRESUPUESTO GLOBAL
+import time
+import math
+import threading
+
+# Intervalo de sondeo de un par en zona operable y de uno lejos de todo (segundos)
+INTERVALO_MIN = 5
+INTERVALO_MAX = 600
+# Peticiones por minuto para todo el monitor (sondeos + análisis al cierre de vela)
+PRESUPUESTO_POR_MINUTO = 60
+# Puntos de RSI fuera de la banda operable que reducen la urgencia a la mitad
+ESCALA_RSI = 5.0
+
+
+def urgencia_lado(distancia, umbral, puntos_rsi):
+    """Urgencia (0-1] de un lado: 1 dentro de la zona de proximidad y con RSI en banda
+
+    `distancia` y `umbral` en precio; `puntos_rsi` son los puntos que le
+    faltan al RSI para entrar en la banda operable (0 si ya está).
+    """
+    distancia_relativa = max(distancia / umbral - 1, 0.0) if umbral > 0 else 0.0
+    return 1 / (1 + distancia_relativa) / (1 + max(puntos_rsi, 0.0) / ESCALA_RSI)
+
+
+def urgencia_analisis(analisis, precio, umbral_pct, rsi, rsi_compra, rsi_venta):
+    """Urgencia de un par a partir de analizar_estructura_mercado: el lado más cercano a dar señal"""
+    umbral = precio * umbral_pct
+    compra = urgencia_lado(analisis['distancia_support'], umbral, rsi - rsi_compra)
+    venta = urgencia_lado(analisis['distancia_resistance'], umbral, rsi_venta - rsi)
+    return max(compra, venta)
+
+
+def intervalo_por_urgencia(urgencia, intervalo_min=INTERVALO_MIN, intervalo_max=INTERVALO_MAX):
+    """Interpolación geométrica: urgencia 1 -> intervalo_min, 0 -> intervalo_max"""
+    urgencia = min(max(urgencia, 0.0), 1.0)
+    return intervalo_min * (intervalo_max / intervalo_min) ** (1 - urgencia)
+
+
+class PresupuestoPeticiones:
+    """Cubo de tokens compartido: `por_minuto` peticiones con ráfagas de hasta `rafaga`"""
+
+    def __init__(self, por_minuto=PRESUPUESTO_POR_MINUTO, rafaga=None):
+        self.por_minuto = por_minuto
+        self.tasa = por_minuto / 60.0
+        self.capacidad = rafaga or max(1.0, por_minuto / 6)
+        self.tokens = self.capacidad
+        self.consumidas = 0
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reservar(self, coste=1):
+        """Consumir `coste` si hay saldo (devuelve 0) o los segundos que faltan para tenerlo"""
+        with self._lock:
+            ahora = time.monotonic()
+            self.tokens = min(self.capacidad, self.tokens + (ahora - self._ultimo) * self.tasa)
+            self._ultimo = ahora
+            if self.tokens >= coste:
+                self.tokens -= coste
+                self.consumidas += coste
+                return 0.0
+            return (coste - self.tokens) / self.tasa
+
+
+class PlanificadorSondeo:
+    """Próximo sondeo de cada par según su urgencia, ajustado al presupuesto
+
+    Cada par pide un intervalo según su urgencia; si la suma de peticiones
+    por minuto supera lo disponible para sondeos, todos los intervalos se
+    alargan en la misma proporción (se mantiene el orden de prioridad).
+    """
+
+    def __init__(self, pares, presupuesto_sondeo=PRESUPUESTO_POR_MINUTO, intervalo_min=INTERVALO_MIN,
+                 intervalo_max=INTERVALO_MAX):
+        self.presupuesto_sondeo = presupuesto_sondeo
+        self.intervalo_min = intervalo_min
+        self.intervalo_max = intervalo_max
+        # Sin datos todavía: prioridad intermedia y primer sondeo inmediato
+        self.urgencias = {par: 0.5 for par in pares}
+        self.proximo = {par: 0.0 for par in pares}
+        self._lock = threading.Lock()
+
+    def intervalo_deseado(self, par):
+        return intervalo_por_urgencia(self.urgencias[par], self.intervalo_min, self.intervalo_max)
+
+    @property
+    def factor_presupuesto(self):
+        """>= 1: cuánto se alargan los intervalos para no superar el presupuesto"""
+        demanda = sum(60.0 / self.intervalo_deseado(par) for par in self.urgencias)
+        return max(1.0, demanda / self.presupuesto_sondeo) if self.presupuesto_sondeo > 0 else math.inf
+
+    def intervalos(self):
+        factor = self.factor_presupuesto
+        return {par: self.intervalo_deseado(par) * factor for par in self.urgencias}
+
+    def siguiente(self):
+        """(par, instante epoch) del próximo sondeo pendiente; None si todos están en curso"""
+        with self._lock:
+            par = min(self.proximo, key=self.proximo.get)
+            return None if math.isinf(self.proximo[par]) else (par, self.proximo[par])
+
+    def iniciar_sondeo(self, par):
+        """Marcar el par como en curso (no se vuelve a programar hasta `completar_sondeo`)"""
+        with self._lock:
+            self.proximo[par] = math.inf
+
+    def completar_sondeo(self, par, urgencia=None, ahora=None):
+        """Registrar la nueva urgencia (None = sin cambios) y programar el siguiente sondeo"""
+        with self._lock:
+            if urgencia is not None:
+                self.urgencias[par] = urgencia
+            self.proximo[par] = (ahora or time.time()) + self.intervalo_deseado(par) * self.factor_presupuesto
+            return self.proximo[par]
+
+    def resumen(self):
+        intervalos = self.intervalos()
+        return {par: {'urgencia': round(self.urgencias[par], 3), 'intervalo': round(intervalos[par], 1)}
+                for par in self.urgencias}
@@ -0,0 +1,45 @@
+# resampleo_velas.py - RESAMPLEO LOCAL OHLCV (TIMEFRAMES SUPERIORES SIN DESCARGAS)
+import numpy as np
+from velas_ohlcv import VelasOHLCV
+
+# Duración en segundos de cada intervalo/timeframe
+SEGUNDOS_INTERVALO = {
+    '1m': 60, '2m': 120, '5m': 300, '15m': 900, '30m': 1800,
+    '60m': 3600, '90m': 5400, '1h': 3600, '2h': 7200, '4h': 14400,
+    '6h': 21600, '8h': 28800, '12h': 43200, '1d': 86400, '1wk': 604800
+}
+
+
+def resamplear_ohlcv(velas, timeframe, intervalo_base='1h', offset=0, solo_completas=False):
+    """Agregar velas de un intervalo base a un timeframe superior (vectorizado)
+
+    Los buckets se alinean a epoch UTC (+ `offset` segundos). Las velas base
+    sin cierre (NaN) se descartan y los buckets vacíos no se generan, así los
+    huecos (fines de semana, festivos) no producen velas ficticias.
+    """
+    segundos = SEGUNDOS_INTERVALO[timeframe]
+    segundos_base = SEGUNDOS_INTERVALO[intervalo_base]
+
+    velas = velas.validas()
+    if len(velas) == 0:
+        return VelasOHLCV.vacia()
+
+    buckets = (velas.timestamp - offset) // segundos * segundos + offset
+    inicios = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    finales = np.r_[inicios[1:], len(buckets)] - 1
+
+    resultado = VelasOHLCV(
+        buckets[inicios],
+        velas.open[inicios],
+        np.maximum.reduceat(velas.high, inicios),
+        np.minimum.reduceat(velas.low, inicios),
+        velas.close[finales],
+        np.add.reduceat(velas.volume, inicios),
+        precio=velas.precio
+    )
+
+    if solo_completas and velas.timestamp[-1] + segundos_base < resultado.timestamp[-1] + segundos:
+        # La última vela del timeframe superior aún no ha cerrado
+        resultado = resultado.recortar(fin=-1)
+
+    return resultado
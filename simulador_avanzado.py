@@ -2,6 +2,7 @@
 import numpy as np
 import random
 from datetime import datetime, timedelta
+from motor_salidas import resolver_salidas
 
 class SimuladorAvanzado:
     def __init__(self):
@@ -37,8 +38,73 @@ class SimuladorAvanzado:
         
         return precios
     
+    def simular_caminos_montecarlo(self, par, direccion, precio_inicial, duracion_horas=1,
+                                   n_caminos=10000, semilla=None, generador=None):
+        """Generar N caminos a la vez (matriz n_caminos x pasos+1), mismo modelo que simular_movimiento_realista
+        
+        El bucle es solo sobre pasos temporales; cada paso opera sobre todos los
+        caminos. La mean reversion se aplica en términos relativos al precio.
+        """
+        rng = generador if generador is not None else np.random.default_rng(semilla)
+        volatilidad = self.volatilidad_historica.get(par, 0.005)
+        steps = duracion_horas * 12  # 5-min intervals
+        drift = volatilidad * 0.05 * (1 if direccion == "COMPRA" else -1)
+        ventana = 10
+        
+        movimientos = rng.normal(drift, volatilidad, size=(n_caminos, steps))
+        precios = np.empty((n_caminos, steps + 1))
+        precios[:, 0] = precio_inicial
+        suma_ventana = np.zeros(n_caminos)
+        
+        for i in range(steps):
+            # Suma rodante de los últimos 10 precios para la mean reversion
+            suma_ventana += precios[:, i]
+            if i >= ventana:
+                suma_ventana -= precios[:, i - ventana]
+            movimiento = movimientos[:, i]
+            if i > ventana:
+                media = suma_ventana / ventana
+                movimiento = movimiento + (media - precios[:, i]) / precios[:, i] * 0.01
+            precios[:, i + 1] = np.maximum(precios[:, i] * (1 + movimiento), 0.0001)
+        
+        return precios
+    
+    def resolver_salidas(self, operacion, caminos):
+        """Resolver DCA, precio promedio y TP/SL de una operación sobre una matriz de caminos"""
+        niveles = operacion.get('dca_niveles', [])
+        return resolver_salidas(
+            caminos, operacion['direccion'], operacion['precio_entrada'],
+            operacion['tp1'], operacion['tp2'], operacion['sl'],
+            dca_niveles=[nivel['precio'] for nivel in niveles],
+            leverage=operacion.get('leverage', 1),
+            dca_activados=[nivel['activado'] for nivel in niveles]
+        )
+    
+    def simular_distribucion_operacion(self, operacion, n_caminos=10000, duracion_maxima=6, semilla=None):
+        """Distribución de resultados de una operación sobre N caminos Monte Carlo"""
+        caminos = self.simular_caminos_montecarlo(
+            operacion['par'], operacion['direccion'], operacion['precio_entrada'],
+            duracion_maxima, n_caminos, semilla
+        )
+        salidas = self.resolver_salidas(operacion, caminos)
+        profit = salidas['profit']
+        cuantiles = np.percentile(profit, [5, 25, 50, 75, 95])
+        
+        return {
+            'n_caminos': n_caminos,
+            'prob_tp1': round(float(np.mean((salidas['resultado'] == 'TP1') & ~salidas['timeout'])), 4),
+            'prob_tp2': round(float(np.mean(salidas['resultado'] == 'TP2')), 4),
+            'prob_sl': round(float(np.mean((salidas['resultado'] == 'SL') & ~salidas['timeout'])), 4),
+            'prob_timeout': round(float(np.mean(salidas['timeout'])), 4),
+            'prob_ganadora': round(float(np.mean(profit > 0)), 4),
+            'profit_esperado': round(float(np.mean(profit)), 4),
+            'cuantiles_profit': {p: round(float(q), 4) for p, q in zip((5, 25, 50, 75, 95), cuantiles)},
+            'pasos_medios': round(float(np.mean(salidas['paso'])), 2),
+            'dca_medios': round(float(np.mean(salidas['niveles_dca_activados'])), 4)
+        }
+    
     def simular_operacion_realista(self, operacion, duracion_maxima=6):
-        """Simular operación de forma REALISTA"""
+        """Simular operación de forma REALISTA (DCA activado a lo largo del camino)"""
         par = operacion['par']
         direccion = operacion['direccion']
         precio_entrada = operacion['precio_entrada']
@@ -46,25 +112,16 @@ class SimuladorAvanzado:
         # Generar camino de precio realista (más corto para simulación más rápida)
         camino_precio = self.simular_movimiento_realista(par, direccion, precio_entrada, duracion_maxima)
         
-        # Verificar TP/SL en cada paso del camino
-        for precio in camino_precio:
-            resultado = self._verificar_objetivos(operacion, precio)
-            if resultado:
-                return resultado
-        
-        # Si no se alcanzó TP/SL en el tiempo máximo, cerrar al precio final
-        precio_final = camino_precio[-1]
-        profit_pct = self._calcular_profit(operacion, precio_final)
+        # Primer cruce de DCA/TP/SL sobre el camino completo
+        salida = self.resolver_salidas(operacion, np.array([camino_precio]))
         
-        if profit_pct > 0:
-            resultado_str = 'TP1'
-        else:
-            resultado_str = 'SL'
-            
         return {
-            'resultado': resultado_str,
-            'precio_cierre': precio_final,
-            'profit': profit_pct
+            'resultado': str(salida['resultado'][0]),
+            'precio_cierre': float(salida['precio_cierre'][0]),
+            'profit': float(salida['profit'][0]),
+            'precio_promedio': float(salida['precio_promedio'][0]),
+            'dca_activados': salida['dca_activados'][0].tolist(),
+            'paso': int(salida['paso'][0])
         }
     
     def _verificar_objetivos(self, operacion, precio_actual):
@@ -0,0 +1,206 @@
+# simulador_cartera.py - SIMULACIÓN DE CARTERA CON CAMINOS CORRELACIONADOS (CHOLESKY)
+import time
+import numpy as np
+from motor_salidas import resolver_salidas
+from motor_indicadores import alinear_series
+from resampleo_velas import SEGUNDOS_INTERVALO
+
+# Mismo paso que SimuladorAvanzado (intervalos de 5 minutos)
+SEGUNDOS_PASO = 300
+PASOS_POR_HORA = 3600 // SEGUNDOS_PASO
+# Mínimo de retornos comunes para confiar en la covarianza estimada
+MIN_OBSERVACIONES = 100
+
+
+def factor_cholesky(covarianza):
+    """Factor L (covarianza = L @ L.T); si no es definida positiva se recortan autovalores"""
+    try:
+        return np.linalg.cholesky(covarianza)
+    except np.linalg.LinAlgError:
+        valores, vectores = np.linalg.eigh(covarianza)
+        valores = np.maximum(valores, max(valores.max(), 1e-18) * 1e-10)
+        return np.linalg.cholesky((vectores * valores) @ vectores.T)
+
+
+def correlacion_desde_covarianza(covarianza):
+    desviaciones = np.sqrt(np.diag(covarianza))
+    return covarianza / np.outer(desviaciones, desviaciones)
+
+
+def max_drawdown_caminos(equity):
+    """Máximo drawdown (fracción) de cada fila de una matriz de equity (caminos x pasos)"""
+    picos = np.maximum.accumulate(equity, axis=1)
+    return np.max(1 - equity / picos, axis=1)
+
+
+class SimuladorCartera:
+    """Simula a la vez todas las posiciones abiertas con caminos correlacionados
+
+    La covarianza se estima con los retornos logarítmicos de las velas del
+    almacén local (solo velas consecutivas presentes en todos los pares) y
+    se escala al paso de 5 minutos. Los pares sin histórico usan
+    SimuladorAvanzado.volatilidad_historica sin correlación.
+    """
+
+    def __init__(self, almacen=None, intervalo='1h', ventana_dias=90):
+        self.intervalo = intervalo
+        self.ventana_dias = ventana_dias
+        # IMPORTACIONES DIFERIDAS
+        self.almacen = almacen
+        self.simulador = None
+
+    def _get_almacen(self):
+        if self.almacen is None:
+            from almacen_velas import almacen_velas
+            self.almacen = almacen_velas
+        return self.almacen
+
+    def _get_simulador(self):
+        if self.simulador is None:
+            from simulador_avanzado import SimuladorAvanzado
+            self.simulador = SimuladorAvanzado()
+        return self.simulador
+
+    def estimar_covarianza(self, pares):
+        """Covarianza por paso de 5 minutos entre `pares` (mismo orden)"""
+        volatilidades = self._get_simulador().volatilidad_historica
+        covarianza = np.diag([volatilidades.get(par, 0.005) ** 2 for par in pares])
+
+        desde = time.time() - self.ventana_dias * 86400
+        series = {}
+        for par in pares:
+            velas = self._get_almacen().leer(par, self.intervalo, desde).validas()
+            if len(velas) > 1:
+                series[par] = velas
+
+        con_datos, rejilla, cierres = alinear_series(series)
+        observaciones = 0
+        if con_datos:
+            # Solo instantes con cierre en todos los pares y velas consecutivas (sin fines de semana)
+            completas = ~np.isnan(cierres).any(axis=0)
+            timestamps, cierres = rejilla[completas], cierres[:, completas]
+            consecutivas = np.diff(timestamps) == SEGUNDOS_INTERVALO[self.intervalo]
+            retornos = np.diff(np.log(cierres), axis=1)[:, consecutivas]
+            observaciones = retornos.shape[1]
+
+            if observaciones >= MIN_OBSERVACIONES:
+                escala = SEGUNDOS_PASO / SEGUNDOS_INTERVALO[self.intervalo]
+                indices = [pares.index(par) for par in con_datos]
+                covarianza[np.ix_(indices, indices)] = np.atleast_2d(np.cov(retornos)) * escala
+
+        return {
+            'pares': list(pares),
+            'covarianza': covarianza,
+            'correlacion': correlacion_desde_covarianza(covarianza),
+            'observaciones': observaciones,
+            'estimados': list(con_datos) if observaciones >= MIN_OBSERVACIONES else []
+        }
+
+    def generar_caminos(self, precios_iniciales, covarianza, shocks):
+        """Caminos de todos los activos en una llamada: (caminos x pasos+1 x activos)
+
+        `shocks` son normales estándar (caminos x pasos x activos); el factor
+        de Cholesky las correlaciona. Retornos log-normales sin deriva.
+        """
+        factor = factor_cholesky(covarianza)
+        retornos = shocks @ factor.T - 0.5 * np.diag(covarianza)
+        acumulados = np.concatenate([np.zeros(shocks[:, :1].shape), np.cumsum(retornos, axis=1)], axis=1)
+        return np.asarray(precios_iniciales)[None, None, :] * np.exp(acumulados)
+
+    def _profit_marcado(self, operacion, camino, salida):
+        """Profit (%) de la operación en cada paso: a mercado hasta la salida, fijo después"""
+        niveles = operacion.get('dca_niveles', [])
+        precios_dca = np.array([nivel['precio'] for nivel in niveles], dtype=np.float64)
+        previos = np.array([nivel['activado'] for nivel in niveles], dtype=bool)
+        pasos = np.arange(camino.shape[1])
+
+        # Niveles DCA activos en cada paso (caminos x niveles x pasos)
+        pasos_dca = salida['pasos_dca'][:, :, None]
+        activos = previos[None, :, None] | ((pasos_dca >= 0) & (pasos_dca <= pasos[None, None, :]))
+        promedio = (operacion['precio_entrada'] + (activos * precios_dca[None, :, None]).sum(axis=1)) / (1 + activos.sum(axis=1))
+
+        signo = 1.0 if operacion['direccion'] == "COMPRA" else -1.0
+        profit = signo * (camino - promedio) / promedio * 100 * operacion.get('leverage', 1)
+        cerrada = pasos[None, :] >= salida['paso'][:, None]
+        return np.where(cerrada, salida['profit'][:, None], profit)
+
+    def _evaluar(self, operaciones, pares, precios_iniciales, covarianza, shocks, fraccion_por_operacion):
+        caminos = self.generar_caminos(precios_iniciales, covarianza, shocks)
+        retorno_cartera = np.zeros(caminos.shape[:2])
+        por_operacion = {}
+
+        for operacion in operaciones:
+            camino = caminos[:, :, pares.index(operacion['par'])]
+            niveles = operacion.get('dca_niveles', [])
+            salida = resolver_salidas(
+                camino, operacion['direccion'], operacion['precio_entrada'],
+                operacion['tp1'], operacion['tp2'], operacion['sl'],
+                dca_niveles=[nivel['precio'] for nivel in niveles],
+                leverage=operacion.get('leverage', 1),
+                dca_activados=[nivel['activado'] for nivel in niveles]
+            )
+            retorno_cartera += self._profit_marcado(operacion, camino, salida) * fraccion_por_operacion
+            por_operacion[operacion.get('id', operacion['par'])] = {
+                'prob_sl': round(float(np.mean((salida['resultado'] == 'SL') & ~salida['timeout'])), 4),
+                'profit_esperado': round(float(np.mean(salida['profit'])), 4)
+            }
+
+        # Equity relativa al capital (1 = capital actual)
+        equity = 1 + retorno_cartera / 100
+        drawdown = max_drawdown_caminos(equity) * 100
+        final = retorno_cartera[:, -1]
+        var_95, var_99 = np.percentile(final, [5, 1])
+
+        from config import RISK_MANAGEMENT
+        return {
+            'retorno_esperado': round(float(np.mean(final)), 4),
+            'prob_perdida': round(float(np.mean(final < 0)), 4),
+            'drawdown': {
+                'medio': round(float(np.mean(drawdown)), 4),
+                'p50': round(float(np.percentile(drawdown, 50)), 4),
+                'p95': round(float(np.percentile(drawdown, 95)), 4),
+                'p99': round(float(np.percentile(drawdown, 99)), 4),
+                'prob_supera_limite': round(float(np.mean(drawdown >= RISK_MANAGEMENT['max_drawdown'] * 100)), 4)
+            },
+            'perdida_cola': {
+                'var_95': round(float(-var_95), 4),
+                'var_99': round(float(-var_99), 4),
+                'cvar_95': round(float(-np.mean(final[final <= var_95])), 4),
+                'cvar_99': round(float(-np.mean(final[final <= var_99])), 4)
+            },
+            'operaciones': por_operacion
+        }
+
+    def simular_cartera(self, operaciones, n_caminos=10000, duracion_horas=6, fraccion_por_operacion=0.1,
+                        semilla=None, comparar_independiente=True):
+        """Drawdown y pérdidas de cola (% del capital) de la cartera simulada conjuntamente
+
+        Con `comparar_independiente` se repite con los mismos shocks pero sin
+        correlación, para ver cuánto riesgo oculta simular cada par por separado.
+        """
+        operaciones = list(operaciones)
+        if not operaciones:
+            return None
+
+        pares = list(dict.fromkeys(operacion['par'] for operacion in operaciones))
+        estimacion = self.estimar_covarianza(pares)
+        precios_iniciales = np.empty(len(pares))
+        for operacion in operaciones:
+            precios_iniciales[pares.index(operacion['par'])] = operacion.get('precio_actual', operacion['precio_entrada'])
+
+        rng = np.random.default_rng(semilla)
+        shocks = rng.standard_normal((n_caminos, duracion_horas * PASOS_POR_HORA, len(pares)))
+
+        resultado = self._evaluar(operaciones, pares, precios_iniciales, estimacion['covarianza'], shocks, fraccion_por_operacion)
+        resultado.update({
+            'n_caminos': n_caminos,
+            'pares': pares,
+            'correlacion': np.round(estimacion['correlacion'], 3).tolist(),
+            'observaciones': estimacion['observaciones'],
+            'pares_estimados': estimacion['estimados']
+        })
+        if comparar_independiente:
+            independiente = np.diag(np.diag(estimacion['covarianza']))
+            resultado['independiente'] = self._evaluar(operaciones, pares, precios_iniciales, independiente, shocks, fraccion_por_operacion)
+            del resultado['independiente']['operaciones']
+        return resultado
@@ -0,0 +1,63 @@
+# test_almacen_posiciones.py - LECTURAS POR ID FRENTE A CIERRES (HUECOS RELLENADOS CON LA ÚLTIMA FILA)
+import sys
+import threading
+
+import pytest
+
+from almacen_posiciones import AlmacenPosiciones, VistaOperaciones
+
+
+def abrir(almacen, simbolo, precio):
+    return almacen.abrir(simbolo, "COMPRA", precio, precio * 1.02, precio * 1.03, precio * 0.97)
+
+
+def test_la_vista_sigue_al_id_tras_cerrar_otra_posicion():
+    almacen = AlmacenPosiciones()
+    vista = VistaOperaciones(almacen)
+    primera = abrir(almacen, 'EURUSD', 1.10)
+    ultima = abrir(almacen, 'XAUUSD', 2000.0)
+
+    # Cerrar la primera mueve la última fila a su hueco
+    almacen.cerrar(primera)
+
+    assert vista[ultima]['par'] == 'XAUUSD'
+    assert vista[ultima]['precio_entrada'] == 2000.0
+    with pytest.raises(KeyError):
+        vista[primera]
+    assert vista.get(primera) is None
+
+
+def test_lecturas_concurrentes_con_cierres_no_devuelven_otra_posicion():
+    # Cambios de hilo muy frecuentes para que la carrera aparezca sin el lock
+    intervalo = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    almacen = AlmacenPosiciones()
+    vista = VistaOperaciones(almacen)
+    ids = {abrir(almacen, simbolo, precio): simbolo
+           for simbolo, precio in (('EURUSD', 1.10), ('XAUUSD', 2000.0), ('EURCHF', 0.95))}
+    errores = []
+
+    def leer():
+        for _ in range(2000):
+            for posicion_id, simbolo in ids.items():
+                operacion = vista.get(posicion_id)
+                if operacion is not None and operacion['par'] != simbolo:
+                    errores.append((posicion_id, operacion['par']))
+
+    def reabrir():
+        for _ in range(2000):
+            for posicion_id, simbolo in list(ids.items())[:2]:
+                fila = almacen.cerrar(posicion_id)
+                almacen.abrir(simbolo, "COMPRA", fila['precio_entrada'], fila['tp1'], fila['tp2'], fila['sl'],
+                              posicion_id=posicion_id)
+
+    hilos = [threading.Thread(target=leer), threading.Thread(target=reabrir)]
+    for hilo in hilos:
+        hilo.start()
+    try:
+        for hilo in hilos:
+            hilo.join()
+    finally:
+        sys.setswitchinterval(intervalo)
+
+    assert errores == []
@@ -0,0 +1,106 @@
+# test_cache_velas.py - EXPIRACIÓN AL CIERRE DE VELA, DESALOJO LRU Y DESCARGAS CON `desde`
+import pytest
+
+import cache_velas as modulo_cache
+import yahoo_api
+from cache_velas import CacheVelas
+
+
+class Reloj:
+    def __init__(self, ahora):
+        self.ahora = ahora
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj(1_800_000_000.0)  # múltiplo de 60 y 3600
+    monkeypatch.setattr(modulo_cache.time, 'time', reloj)
+    return reloj
+
+
+def test_expira_en_el_cierre_de_la_vela_alineado_a_epoch(reloj):
+    cache = CacheVelas()
+    reloj.ahora += 45
+    cache.guardar('EURUSD', '1d', '1m', 'datos')
+
+    # Guardado a los 45 s de la vela de 1m: vive 15 s, no 60
+    reloj.ahora += 14.999
+    assert cache.obtener('EURUSD', '1d', '1m') == 'datos'
+    reloj.ahora += 0.001
+    assert cache.obtener('EURUSD', '1d', '1m') is None
+    assert cache.estadisticas()['entradas'] == 0
+
+
+def test_guardado_justo_en_el_limite_vive_una_vela_entera(reloj):
+    cache = CacheVelas()
+    cache.guardar('EURUSD', '1mo', '1h', 'datos')
+
+    reloj.ahora += 3599
+    assert cache.obtener('EURUSD', '1mo', '1h') == 'datos'
+    reloj.ahora += 1
+    assert cache.obtener('EURUSD', '1mo', '1h') is None
+
+
+def test_intervalo_desconocido_usa_60_segundos(reloj):
+    cache = CacheVelas()
+    cache.guardar('EURUSD', '1d', '3m', 'datos')
+
+    reloj.ahora += 59
+    assert cache.obtener('EURUSD', '1d', '3m') == 'datos'
+    reloj.ahora += 1
+    assert cache.obtener('EURUSD', '1d', '3m') is None
+
+
+def test_desaloja_la_entrada_menos_usada(reloj):
+    cache = CacheVelas(max_entradas=2)
+    cache.guardar('EURUSD', '1d', '1m', 'eurusd')
+    cache.guardar('XAUUSD', '1d', '1m', 'xauusd')
+    # Un acceso convierte a EURUSD en la más reciente
+    assert cache.obtener('EURUSD', '1d', '1m') == 'eurusd'
+
+    cache.guardar('EURCHF', '1d', '1m', 'eurchf')
+
+    assert cache.obtener('XAUUSD', '1d', '1m') is None
+    assert cache.obtener('EURUSD', '1d', '1m') == 'eurusd'
+    assert cache.obtener('EURCHF', '1d', '1m') == 'eurchf'
+    assert cache.estadisticas()['evictions'] == 1
+
+
+class Respuesta:
+    status_code = 200
+
+    def __init__(self, precio):
+        self.precio = precio
+
+    def json(self):
+        return {'chart': {'result': [{'meta': {'regularMarketPrice': self.precio}, 'timestamp': [],
+                                      'indicators': {'quote': [{}]}}]}}
+
+
+class Sesion:
+    def __init__(self):
+        self.params = []
+
+    def get(self, url, params=None, timeout=None):
+        self.params.append(params)
+        return Respuesta(1.1 + len(self.params) / 1000)
+
+
+def test_desde_no_lee_ni_escribe_la_cache(reloj, monkeypatch):
+    cache = CacheVelas()
+    sesion = Sesion()
+    monkeypatch.setattr(yahoo_api, 'cache_velas', cache)
+    monkeypatch.setattr(yahoo_api, 'get_session', lambda: sesion)
+    yahoo = yahoo_api.YahooFinanceAPI()
+
+    assert yahoo.obtener_chart('EURUSD', '1mo', '1h').precio == 1.101
+    assert yahoo.obtener_chart('EURUSD', '1mo', '1h').precio == 1.101
+    assert yahoo.obtener_chart('EURUSD', '1mo', '1h', desde=reloj.ahora - 7200).precio == 1.102
+
+    assert len(sesion.params) == 2
+    assert sesion.params[1]['period1'] == int(reloj.ahora - 7200)
+    # La entrada por rango no se ha sustituido por la descarga parcial
+    assert cache.obtener('EURUSD', '1mo', '1h').precio == 1.101
@@ -0,0 +1,127 @@
+# test_indicadores_streaming.py - INDICADORES INCREMENTALES FRENTE A SUS VERSIONES SOBRE LA SERIE COMPLETA
+import json
+
+import numpy as np
+import pytest
+
+from indicadores_reales import IndicadoresReales
+from indicadores_streaming import (DetectorPivotsStream, EMAStream, EstadoIndicadores, MaxMinRodante,
+                                   RSIWilderStream, SMAStream)
+from indicadores_vectorizados import mascara_pivots, rsi_wilder, suavizado_wilder
+
+
+def serie(semilla, n=400, decimales=None):
+    precios = 100 * np.exp(np.cumsum(np.random.default_rng(semilla).normal(0, 0.01, n)))
+    return precios if decimales is None else np.round(precios, decimales)
+
+
+def alimentar(stream, valores):
+    return np.array([np.nan if v is None else v for v in map(stream.actualizar, valores.tolist())])
+
+
+def reconstruir(stream):
+    """Ida y vuelta por JSON, como en las instantáneas"""
+    return type(stream).desde_dict(json.loads(json.dumps(stream.a_dict())))
+
+
+@pytest.mark.parametrize('semilla', range(3))
+@pytest.mark.parametrize('periodo', [2, 14])
+def test_rsi_stream_igual_a_rsi_wilder(semilla, periodo):
+    precios = serie(semilla, decimales=1)
+    rsi = RSIWilderStream(periodo)
+
+    valores = alimentar(rsi, precios)
+
+    np.testing.assert_allclose(valores, rsi_wilder(precios, periodo), rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize('corte', [5, 14, 15, 200])
+def test_rsi_provisional_y_reconstruido(corte):
+    precios = serie(3)
+    rsi = RSIWilderStream(14)
+    alimentar(rsi, precios[:corte])
+
+    # Provisional = RSI de la serie con una vela más cerrando en ese precio
+    esperado = rsi_wilder(np.r_[precios[:corte], precios[corte]])[-1]
+    provisional = rsi.provisional(precios[corte])
+    if np.isnan(esperado):
+        assert provisional is None
+    else:
+        assert provisional == pytest.approx(esperado, rel=1e-9)
+
+    # El estado reconstruido continúa igual que la serie completa
+    rsi = reconstruir(rsi)
+    resto = alimentar(rsi, precios[corte:])
+    np.testing.assert_allclose(resto, rsi_wilder(precios)[corte:], rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize('periodo', [1, 10, 20])
+def test_sma_stream_igual_a_la_media_de_la_ventana(periodo):
+    precios = serie(4)
+    sma = SMAStream(periodo)
+
+    valores = alimentar(sma, precios)
+
+    ventanas = np.lib.stride_tricks.sliding_window_view(precios, periodo).mean(axis=-1)
+    np.testing.assert_allclose(valores[periodo - 1:], ventanas, rtol=1e-9)
+    assert sma.provisional(precios[0]) == pytest.approx(np.r_[precios[len(precios) - periodo + 1:], precios[0]].mean())
+
+
+def test_ema_stream_con_alfa_de_wilder_igual_a_suavizado_wilder():
+    valores = np.abs(np.diff(serie(5)))
+    ema = EMAStream(14, alfa=1 / 14)
+
+    resultado = alimentar(ema, valores[:150])
+    ema = reconstruir(ema)
+    resultado = np.r_[resultado, alimentar(ema, valores[150:])]
+
+    np.testing.assert_allclose(resultado, suavizado_wilder(valores, 14), rtol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize('es_maximo', [True, False])
+def test_max_min_rodante_igual_a_la_ventana(es_maximo):
+    precios = serie(6, decimales=0)
+    rodante = MaxMinRodante(7, es_maximo)
+
+    valores = alimentar(rodante, precios)
+
+    ventanas = np.lib.stride_tricks.sliding_window_view(precios, 7)
+    np.testing.assert_array_equal(valores[6:], ventanas.max(axis=-1) if es_maximo else ventanas.min(axis=-1))
+
+
+@pytest.mark.parametrize('semilla', range(3))
+@pytest.mark.parametrize('window', [2, 5])
+def test_detector_pivots_igual_a_mascara_pivots(semilla, window):
+    # Redondeo a 0.5: muchos empates entre velas de la misma ventana
+    generador = np.random.default_rng(semilla)
+    close = np.round(serie(semilla) * 2) / 2
+    high = close + np.round(generador.random(len(close)) * 4) / 2
+    low = close - np.round(generador.random(len(close)) * 4) / 2
+    timestamps = np.arange(len(close)) * 14400
+    detector = DetectorPivotsStream(window)
+
+    confirmados = []
+    for i, (timestamp, h, l) in enumerate(zip(timestamps.tolist(), high.tolist(), low.tolist())):
+        if i == len(close) // 2:
+            detector = reconstruir(detector)
+        confirmados += detector.actualizar(timestamp, h, l)
+
+    esperados = [('resistance', int(timestamps[i]), high[i]) for i in np.flatnonzero(mascara_pivots(high, window, True))]
+    esperados += [('support', int(timestamps[i]), low[i]) for i in np.flatnonzero(mascara_pivots(low, window, False))]
+    assert sorted(confirmados) == sorted(esperados)
+
+
+@pytest.mark.parametrize('cerradas', [10, 18, 19, 120])
+def test_estado_provisional_igual_al_calculo_sobre_la_serie(cerradas):
+    precios = serie(7)
+    indicadores = IndicadoresReales()
+    estado = EstadoIndicadores()
+    for timestamp, close in enumerate(precios[:cerradas].tolist()):
+        estado.actualizar(timestamp, close)
+    # Velas ya procesadas se ignoran
+    estado.actualizar(0, 1e9)
+
+    for precio in (precios[cerradas], precios[cerradas] * 1.01, precios[cerradas] * 0.99):
+        completa = np.r_[precios[:cerradas], precio]
+        assert estado.tendencia_provisional(precio) == indicadores.determinar_tendencia(completa)
+        assert estado.rsi_provisional(precio) == indicadores.calcular_rsi_real(completa)
@@ -0,0 +1,116 @@
+# test_indicadores_vectorizados.py - RSI DE WILDER Y PIVOTS VECTORIZADOS FRENTE A BUCLES ESCALARES
+import math
+
+import numpy as np
+import pytest
+
+from indicadores_vectorizados import mascara_pivots, rsi_wilder
+
+
+def rsi_bucle(precios, periodo=14):
+    """Wilder vela a vela: un NaN repite el último precio (cambio 0) y su RSI es NaN"""
+    salida = [math.nan] * len(precios)
+    previo = None
+    n_deltas, suma_ganancias, suma_perdidas = 0, 0.0, 0.0
+    media_ganancias = media_perdidas = None
+    for i, precio in enumerate(precios):
+        hueco = math.isnan(precio)
+        if hueco:
+            if previo is None:
+                continue
+            precio = previo
+        if previo is not None:
+            delta = precio - previo
+            ganancia, perdida = max(delta, 0.0), max(-delta, 0.0)
+            n_deltas += 1
+            if n_deltas < periodo:
+                suma_ganancias += ganancia
+                suma_perdidas += perdida
+            elif n_deltas == periodo:
+                media_ganancias = (suma_ganancias + ganancia) / periodo
+                media_perdidas = (suma_perdidas + perdida) / periodo
+            else:
+                media_ganancias += (ganancia - media_ganancias) / periodo
+                media_perdidas += (perdida - media_perdidas) / periodo
+            if media_ganancias is not None and not hueco:
+                if media_perdidas == 0:
+                    salida[i] = 50.0 if media_ganancias == 0 else 100.0
+                else:
+                    salida[i] = 100.0 - 100.0 / (1.0 + media_ganancias / media_perdidas)
+        previo = precio
+    return np.array(salida)
+
+
+def pivots_bucle(precios, window=5, es_maximo=True):
+    """Bucle de AnalisisTechnicoSR._detectar_pivots (NaN en lugar de None), devolviendo índices"""
+    extremo = max if es_maximo else min
+    indices = []
+    for i in range(window, len(precios) - window):
+        if math.isnan(precios[i]):
+            continue
+        ventana = [p for p in precios[i - window:i + window + 1] if not math.isnan(p)]
+        if ventana and precios[i] == extremo(ventana):
+            indices.append(i)
+    return indices
+
+
+def serie(generador, n, huecos=0.0, nan_iniciales=0, decimales=None):
+    precios = 100 * np.exp(np.cumsum(generador.normal(0, 0.01, n)))
+    if decimales is not None:
+        # Precios redondeados: empates y velas sin cambio
+        precios = np.round(precios, decimales)
+    precios[generador.random(n) < huecos] = np.nan
+    precios[:nan_iniciales] = np.nan
+    return precios
+
+
+@pytest.mark.parametrize('semilla', range(5))
+@pytest.mark.parametrize('periodo', [2, 14, 30])
+@pytest.mark.parametrize('huecos, nan_iniciales', [(0.0, 0), (0.1, 0), (0.1, 17)])
+def test_rsi_wilder_igual_al_bucle(semilla, periodo, huecos, nan_iniciales):
+    # 1500 velas: más de un bloque de la recursión por potencias para periodo 2 y 14
+    precios = serie(np.random.default_rng(semilla), 1500, huecos, nan_iniciales)
+
+    np.testing.assert_allclose(rsi_wilder(precios, periodo), rsi_bucle(precios, periodo),
+                               rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+def test_rsi_wilder_por_filas_igual_al_bucle():
+    generador = np.random.default_rng(7)
+    matriz = np.vstack([serie(generador, 600, huecos, iniciales, decimales)
+                        for huecos, iniciales, decimales in ((0.0, 0, None), (0.2, 3, None),
+                                                             (0.05, 40, 1), (0.0, 590, None))])
+
+    esperado = np.vstack([rsi_bucle(fila) for fila in matriz])
+    np.testing.assert_allclose(rsi_wilder(matriz), esperado, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+def test_rsi_wilder_sin_perdidas_ni_ganancias():
+    assert np.all(rsi_wilder(np.arange(1.0, 31.0))[15:] == 100.0)
+    assert np.all(rsi_wilder(np.full(30, 5.0))[15:] == 50.0)
+
+
+@pytest.mark.parametrize('semilla', range(5))
+@pytest.mark.parametrize('window', [1, 3, 5])
+@pytest.mark.parametrize('es_maximo', [True, False])
+@pytest.mark.parametrize('huecos', [0.0, 0.15])
+def test_mascara_pivots_igual_al_bucle(semilla, window, es_maximo, huecos):
+    precios = serie(np.random.default_rng(semilla), 400, huecos, decimales=1)
+
+    mascara = mascara_pivots(precios, window, es_maximo)
+
+    assert np.flatnonzero(mascara).tolist() == pivots_bucle(precios, window, es_maximo)
+
+
+def test_mascara_pivots_por_filas_con_longitudes():
+    generador = np.random.default_rng(11)
+    filas = [serie(generador, n, 0.1, decimales=1) for n in (300, 180, 11)]
+    longitudes = np.array([len(fila) for fila in filas])
+    matriz = np.full((len(filas), longitudes.max()), np.nan)
+    for i, fila in enumerate(filas):
+        matriz[i, :len(fila)] = fila
+
+    mascara = mascara_pivots(matriz, 5, True, longitudes)
+
+    for i, fila in enumerate(filas):
+        assert np.flatnonzero(mascara[i]).tolist() == pivots_bucle(fila, 5, True)
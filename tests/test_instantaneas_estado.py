@@ -0,0 +1,100 @@
+# test_instantaneas_estado.py - RECUPERACIÓN TRAS REINICIO: INSTANTÁNEA + COLA DEL DIARIO
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from almacen_posiciones import DTYPE_POSICION
+from diario_operaciones import DiarioOperaciones
+from instantaneas_estado import InstantaneasEstado
+
+LIMITES = {'capital_inicial': 1000, 'max_drawdown': 0.5, 'consecutive_loss_limit': 10}
+INICIO = datetime(2026, 1, 5, 10, 0, 0)
+
+
+def señal(par, direccion, precio, paso=0.01):
+    signo = 1 if direccion == "COMPRA" else -1
+    return {
+        'par': par, 'direccion': direccion, 'precio_actual': precio,
+        'tp1': precio * (1 + 2 * signo * paso), 'tp2': precio * (1 + 3 * signo * paso),
+        'sl': precio * (1 - 3 * signo * paso),
+        'dca_1': precio * (1 - signo * paso), 'dca_2': precio * (1 - 2 * signo * paso),
+        'leverage': 10
+    }
+
+
+def abrir(gestor, minutos, *args):
+    return gestor.abrir_operacion(señal(*args), INICIO + timedelta(minutes=minutos))
+
+
+def por_id(filas):
+    return filas[np.argsort(filas['id'])]
+
+
+def iniciar(directorio):
+    diario = DiarioOperaciones(str(directorio / 'operaciones.db'), intervalo_commit=0.01)
+    instantaneas = InstantaneasEstado(str(directorio), diario)
+    return diario, instantaneas, instantaneas.restaurar(limites_riesgo=LIMITES)
+
+
+@pytest.mark.parametrize('con_instantanea', [True, False])
+def test_reinicio_recupera_posiciones_estadisticas_riesgo_e_ids(tmp_path, con_instantanea):
+    diario, instantaneas, gestor = iniciar(tmp_path)
+
+    # Antes de la instantánea: dos aperturas, un DCA ejecutado y un cierre
+    eurusd = abrir(gestor, 0, 'EURUSD', "COMPRA", 1.10)
+    xauusd = abrir(gestor, 1, 'XAUUSD', "VENTA", 2000.0)
+    assert gestor.procesar_precio('EURUSD', 1.10 * 0.99, INICIO + timedelta(minutes=2)) == []
+    assert gestor.posiciones.fila(eurusd)['dca_activado'][0]
+    gestor.cerrar_operacion(xauusd, 'TP1', 1960.0, timestamp_cierre=INICIO + timedelta(minutes=3))
+    if con_instantanea:
+        instantaneas.guardar(gestor)
+
+    # Cola del diario: DCA y cierre de una operación de la instantánea,
+    # una operación abierta y cerrada, y otra que sigue abierta con DCA
+    eurchf = abrir(gestor, 4, 'EURCHF', "COMPRA", 0.95)
+    gestor.procesar_precio('EURCHF', 0.95 * 0.99, INICIO + timedelta(minutes=5))
+    xagusd = abrir(gestor, 6, 'XAGUSD', "VENTA", 30.0)
+    gestor.cerrar_operacion(xagusd, 'SL', 30.9, timestamp_cierre=INICIO + timedelta(minutes=7))
+    gestor.procesar_precio('EURUSD', 1.10 * 0.98, INICIO + timedelta(minutes=8))
+    cerradas = gestor.procesar_precio('EURUSD', 1.10 * 1.03, INICIO + timedelta(minutes=9))
+    assert [c['operacion']['id'] for c in cerradas] == [eurusd]
+
+    esperado = gestor.exportar_estado()
+    diario.cerrar()
+
+    diario, instantaneas, recuperado = iniciar(tmp_path)
+    try:
+        estado = recuperado.exportar_estado()
+        assert estado['secuencia_diario'] == esperado['secuencia_diario']
+
+        # Posiciones activas campo a campo (incluidos DCA activados y precio promedio);
+        # el código de símbolo depende del orden de registro: se comparan los nombres
+        assert list(por_id(estado['posiciones'])['id']) == [eurchf]
+        for campo in DTYPE_POSICION.names:
+            if campo != 'simbolo':
+                np.testing.assert_array_equal(por_id(estado['posiciones'])[campo], por_id(esperado['posiciones'])[campo])
+        assert [estado['simbolos'][c] for c in estado['posiciones']['simbolo']] == ['EURCHF']
+
+        assert estado['estadisticas'] == pytest.approx(esperado['estadisticas'])
+        assert estado['riesgo'] == esperado['riesgo']
+        assert estado['siguiente_id'] == esperado['siguiente_id']
+        assert [op['id'] for op in recuperado.historial] == [xauusd, xagusd, eurusd]
+
+        # El siguiente ID no reutiliza los de la cola y los triggers siguen activos
+        assert abrir(recuperado, 10, 'USDCAD', "COMPRA", 1.35) == esperado['siguiente_id']
+        cerradas = recuperado.procesar_precio('EURCHF', 0.95 * 1.03, INICIO + timedelta(minutes=11))
+        assert [c['operacion']['id'] for c in cerradas] == [eurchf]
+        assert cerradas[0]['operacion']['niveles_dca_activados'] == 1
+    finally:
+        diario.cerrar()
+
+
+def test_segundo_escritor_del_mismo_diario_falla(tmp_path):
+    diario = DiarioOperaciones(str(tmp_path / 'operaciones.db'))
+    try:
+        with pytest.raises(RuntimeError):
+            DiarioOperaciones(str(tmp_path / 'operaciones.db'))
+    finally:
+        diario.cerrar()
+    DiarioOperaciones(str(tmp_path / 'operaciones.db')).cerrar()
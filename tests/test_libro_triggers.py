@@ -0,0 +1,142 @@
+# test_libro_triggers.py - LIBRO DE TRIGGERS (BISECT) FRENTE A UN RECORRIDO LINEAL DE LAS POSICIONES
+import numpy as np
+import pytest
+
+from libro_triggers import PRIORIDAD_SALIDA, LibroTriggers
+
+
+def niveles(direccion, precio, paso=0.01):
+    signo = 1 if direccion == "COMPRA" else -1
+    return {'tp1': precio * (1 + 2 * signo * paso), 'tp2': precio * (1 + 3 * signo * paso),
+            'sl': precio * (1 - 3 * signo * paso),
+            'dca_niveles': [precio * (1 - signo * paso), precio * (1 - 2 * signo * paso)]}
+
+
+def agregar(libro, posicion_id, direccion, precio, simbolo='EURUSD'):
+    libro.agregar_posicion(posicion_id, simbolo, direccion, **niveles(direccion, precio))
+
+
+class RecorridoLineal:
+    """Referencia: revisa todas las posiciones en cada precio (el seguimiento anterior al libro)"""
+
+    def __init__(self):
+        self.posiciones = {}
+
+    def agregar(self, posicion_id, direccion, precio):
+        n = niveles(direccion, precio)
+        triggers = {'TP1': n['tp1'], 'TP2': n['tp2'], 'SL': n['sl']}
+        triggers.update({f'DCA{k + 1}': nivel for k, nivel in enumerate(n['dca_niveles'])})
+        self.posiciones[posicion_id] = (direccion, triggers)
+
+    def actualizar(self, precio):
+        eventos = []
+        for posicion_id, (direccion, triggers) in list(self.posiciones.items()):
+            compra = direccion == "COMPRA"
+
+            def cruzado(tipo, nivel):
+                a_favor = tipo.startswith('TP')
+                return (precio >= nivel) if compra == a_favor else (precio <= nivel)
+
+            tocados = [tipo for tipo, nivel in triggers.items() if cruzado(tipo, nivel)]
+            if not tocados:
+                continue
+            salidas = [tipo for tipo in PRIORIDAD_SALIDA if tipo in tocados]
+            dca = sorted(int(tipo[3:]) for tipo in tocados if tipo.startswith('DCA'))
+            eventos.append({'posicion_id': posicion_id, 'dca': dca,
+                            'salida': salidas[0] if salidas else None, 'precio': precio})
+            if salidas:
+                del self.posiciones[posicion_id]
+            else:
+                for tipo in tocados:
+                    del triggers[tipo]
+        return eventos
+
+
+@pytest.mark.parametrize('direccion', ["COMPRA", "VENTA"])
+def test_dca_y_salida_en_el_orden_de_cruce(direccion):
+    libro = LibroTriggers()
+    agregar(libro, 1, direccion, 100.0)
+    signo = 1 if direccion == "COMPRA" else -1
+
+    # Un salto que cruza los dos DCA y el SL a la vez
+    eventos = libro.actualizar('EURUSD', 100.0 * (1 - 3.5 * signo * 0.01))
+
+    assert eventos == [{'posicion_id': 1, 'dca': [1, 2], 'salida': 'SL', 'precio': 100.0 * (1 - 3.5 * signo * 0.01)}]
+    assert len(libro) == 0
+
+
+@pytest.mark.parametrize('direccion', ["COMPRA", "VENTA"])
+def test_un_precio_igual_al_nivel_lo_dispara(direccion):
+    libro = LibroTriggers()
+    n = niveles(direccion, 100.0)
+    agregar(libro, 1, direccion, 100.0)
+    agregar(libro, 2, direccion, 100.0)
+
+    # Dos posiciones con el mismo nivel: se disparan ambas
+    eventos = libro.actualizar('EURUSD', n['dca_niveles'][0])
+    assert sorted(evento['posicion_id'] for evento in eventos) == [1, 2]
+    assert all(evento['dca'] == [1] and evento['salida'] is None for evento in eventos)
+
+    eventos = libro.actualizar('EURUSD', n['tp1'])
+    assert sorted((evento['posicion_id'], evento['salida']) for evento in eventos) == [(1, 'TP1'), (2, 'TP1')]
+
+
+def test_tp1_y_tp2_en_el_mismo_precio_sale_por_tp2():
+    libro = LibroTriggers()
+    libro.agregar_posicion(1, 'EURUSD', "COMPRA", 101.0, 101.0, 95.0)
+
+    assert libro.actualizar('EURUSD', 101.0)[0]['salida'] == 'TP2'
+
+
+def test_tras_una_salida_la_posicion_no_vuelve_a_dispararse():
+    libro = LibroTriggers()
+    agregar(libro, 1, "COMPRA", 100.0)
+    agregar(libro, 2, "VENTA", 100.0)
+
+    eventos = libro.actualizar('EURUSD', 102.5)
+    assert sorted((evento['posicion_id'], evento['dca'], evento['salida']) for evento in eventos) == \
+        [(1, [], 'TP1'), (2, [1, 2], None)]
+    assert len(libro) == 3  # TP1, TP2 y SL de la VENTA
+
+    # Los DCA y el SL de la COMPRA ya no están en el libro
+    assert libro.actualizar('EURUSD', 96.0) == [{'posicion_id': 2, 'dca': [], 'salida': 'TP2', 'precio': 96.0}]
+    assert len(libro) == 0
+
+
+def test_eliminar_posicion_quita_sus_triggers_y_no_los_demas():
+    libro = LibroTriggers()
+    agregar(libro, 1, "COMPRA", 100.0)
+    agregar(libro, 2, "COMPRA", 100.0)
+
+    libro.eliminar_posicion(1)
+
+    assert len(libro) == 5
+    assert [evento['posicion_id'] for evento in libro.actualizar('EURUSD', 96.0)] == [2]
+
+
+def test_los_simbolos_no_se_mezclan():
+    libro = LibroTriggers()
+    agregar(libro, 1, "COMPRA", 100.0, 'EURUSD')
+    agregar(libro, 2, "COMPRA", 100.0, 'XAUUSD')
+
+    assert [evento['posicion_id'] for evento in libro.actualizar('XAUUSD', 103.0)] == [2]
+
+
+@pytest.mark.parametrize('semilla', range(5))
+def test_igual_que_el_recorrido_lineal(semilla):
+    generador = np.random.default_rng(semilla)
+    libro, referencia = LibroTriggers(), RecorridoLineal()
+    precio, siguiente_id = 100.0, 0
+    for _ in range(500):
+        if generador.random() < 0.2:
+            direccion = "COMPRA" if generador.random() < 0.5 else "VENTA"
+            # Precios redondeados: empates exactos entre niveles y precio
+            entrada = round(precio, 1)
+            agregar(libro, siguiente_id, direccion, entrada)
+            referencia.agregar(siguiente_id, direccion, entrada)
+            siguiente_id += 1
+        precio = round(precio * (1 + generador.normal(0, 0.008)), 1)
+
+        eventos = sorted(libro.actualizar('EURUSD', precio), key=lambda evento: evento['posicion_id'])
+        assert eventos == referencia.actualizar(precio)
+    assert len(libro) == sum(len(triggers) for _, triggers in referencia.posiciones.values())
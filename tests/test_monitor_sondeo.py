@@ -0,0 +1,71 @@
+# test_monitor_sondeo.py - EL SONDEO VE EL PRECIO ACTUAL AUNQUE LA VELA DE 1m ESTÉ CACHEADA
+
+import pytest
+
+import yahoo_api
+from cache_velas import cache_velas
+from diario_operaciones import DiarioOperaciones
+from monitor_mercado import MonitorMercado
+from velas_ohlcv import VelasOHLCV
+
+
+class RespuestaFalsa:
+    status_code = 200
+
+    def __init__(self, precio):
+        self.precio = precio
+
+    def json(self):
+        return {'chart': {'result': [{'meta': {'regularMarketPrice': self.precio}, 'timestamp': [],
+                                      'indicators': {'quote': [{}]}}]}}
+
+
+class SesionFalsa:
+    def __init__(self, precios):
+        self.precios = iter(precios)
+        self.peticiones = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.peticiones += 1
+        precio = next(self.precios)
+        if isinstance(precio, Exception):
+            raise precio
+        return RespuestaFalsa(precio)
+
+
+@pytest.fixture
+def monitor(tmp_path):
+    cache_velas.invalidar()
+    monitor = MonitorMercado(pares=['EURUSD'], sondeo=False,
+                             diario=DiarioOperaciones(str(tmp_path / 'operaciones.db')),
+                             directorio_instantaneas=str(tmp_path))
+    precios = []
+    monitor.gestor.procesar_precio = lambda par, precio, *args: precios.append(precio) or []
+    monitor.precios_procesados = precios
+    yield monitor
+    monitor.diario.cerrar()
+    cache_velas.invalidar()
+
+
+def test_dos_sondeos_en_la_misma_vela_ven_precios_distintos(monitor, monkeypatch):
+    sesion = SesionFalsa([1.1001, 1.1002])
+    monkeypatch.setattr(yahoo_api, 'get_session', lambda: sesion)
+    # Vela de 1m ya cacheada (p. ej. por un análisis) con un precio anterior
+    cache_velas.guardar('EURUSD', '1d', '1m', VelasOHLCV(VelasOHLCV.vacia().timestamp, precio=1.0999))
+
+    monitor.sondear_par('EURUSD')
+    monitor.sondear_par('EURUSD')
+
+    assert monitor.precios_procesados == [1.1001, 1.1002]
+    assert sesion.peticiones == 2
+    # La descarga del sondeo refresca la cache para el resto de consumidores
+    assert cache_velas.obtener('EURUSD', '1d', '1m').precio == 1.1002
+
+
+def test_sondeo_sin_precio_real_no_toca_las_operaciones(monitor, monkeypatch):
+    sesion = SesionFalsa([ConnectionError('sin red'), None])
+    monkeypatch.setattr(yahoo_api, 'get_session', lambda: sesion)
+
+    assert monitor.sondear_par('EURUSD') is None
+    assert monitor.sondear_par('EURUSD') is None
+    assert monitor.precios_procesados == []
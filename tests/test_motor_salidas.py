@@ -0,0 +1,65 @@
+# test_motor_salidas.py - PRECIO DE CIERRE DEL BACKTEST SOBRE CAMINOS DE VELAS
+import numpy as np
+import pytest
+
+from backtester import expandir_camino, precio_ejecucion
+from motor_salidas import resolver_salidas
+from velas_ohlcv import VelasOHLCV
+
+
+def velas(*barras):
+    """Barras (open, high, low, close) con timestamps horarios"""
+    open_, high, low, close = (np.array(columna, dtype=np.float64) for columna in zip(*barras))
+    return VelasOHLCV(np.arange(len(barras), dtype=np.int64) * 3600, open_, high, low, close,
+                      np.zeros(len(barras)))
+
+
+def salida(barras, direccion, tp1, tp2, sl):
+    camino = expandir_camino(velas(*barras), 0, len(barras), direccion)
+    return resolver_salidas(camino, direccion, 100.0, tp1, tp2, sl, cierre_en_nivel=True)
+
+
+@pytest.mark.parametrize('direccion, barra, tp1, tp2, sl', [
+    ("COMPRA", (100.5, 105.0, 99.0, 101.0), 102.0, 110.0, 95.0),
+    ("VENTA", (99.5, 101.0, 95.0, 99.0), 98.0, 90.0, 105.0),
+])
+def test_vela_amplia_que_cruza_tp1_cierra_en_tp1(direccion, barra, tp1, tp2, sl):
+    resultado = salida([barra], direccion, tp1, tp2, sl)
+
+    assert resultado['resultado'][0] == 'TP1'
+    assert not resultado['timeout'][0]
+    # No en el extremo de la vela (105 / 95)
+    assert resultado['precio_cierre'][0] == tp1
+    assert resultado['profit'][0] == pytest.approx(2.0)
+
+
+def test_sl_y_tp2_cierran_en_su_nivel():
+    assert salida([(100.0, 100.5, 90.0, 91.0)], "COMPRA", 102.0, 110.0, 95.0)['precio_cierre'][0] == 95.0
+    tp2 = salida([(100.0, 115.0, 99.5, 112.0)], "COMPRA", 102.0, 110.0, 95.0)
+    assert tp2['resultado'][0] == 'TP2' and tp2['precio_cierre'][0] == 110.0
+
+
+def test_sin_cruce_cierra_al_ultimo_precio():
+    resultado = salida([(100.0, 101.0, 99.0, 100.5), (100.5, 101.5, 99.5, 101.2)], "COMPRA", 102.0, 110.0, 95.0)
+
+    assert resultado['timeout'][0]
+    assert resultado['precio_cierre'][0] == 101.2
+
+
+def test_sin_cierre_en_nivel_se_conserva_el_precio_del_camino():
+    camino = expandir_camino(velas((100.5, 105.0, 99.0, 101.0)), 0, 1, "COMPRA")
+
+    assert resolver_salidas(camino, "COMPRA", 100.0, 102.0, 110.0, 95.0)['precio_cierre'][0] == 105.0
+
+
+def test_hueco_en_la_apertura_que_salta_el_sl_se_ejecuta_a_la_apertura():
+    barras = [(100.0, 101.0, 99.0, 100.0), (93.0, 94.0, 92.0, 93.5)]
+    camino = expandir_camino(velas(*barras), 0, len(barras), "COMPRA")
+    resultado = resolver_salidas(camino, "COMPRA", 100.0, 102.0, 110.0, 95.0, cierre_en_nivel=True)
+
+    assert resultado['resultado'][0] == 'SL'
+    assert precio_ejecucion(camino, resultado) == 93.0
+    # Cruce dentro de la vela: en el nivel
+    camino = expandir_camino(velas((100.0, 100.5, 90.0, 91.0)), 0, 1, "COMPRA")
+    assert precio_ejecucion(camino, resolver_salidas(camino, "COMPRA", 100.0, 102.0, 110.0, 95.0,
+                                                     cierre_en_nivel=True)) == 95.0
@@ -0,0 +1,244 @@
+# validacion_walk_forward.py - VALIDACIÓN WALK-FORWARD (UMBRALES RSI + PARÁMETROS POR PAR)
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from almacen_velas import AlmacenVelas
+from backtester import Backtester, estadisticas_operaciones
+from barrido_parametros import generar_combinaciones, espacio_de_par, preparar_almacen, manifiesto_velas, comprobar_manifiesto
+
+# Solo rsi_compra/rsi_venta deciden qué velas abren operación (es_zona_*_optima
+# acepta ALTA y MEDIA); los umbrales de confianza ALTA mantienen su separación
+ESPACIO_UMBRALES = {
+    'rsi_compra': [30, 33, 35, 38, 40],
+    'rsi_venta': [60, 62, 65, 67, 70]
+}
+SEPARACION_CONFIANZA_ALTA = 3
+
+CAMPOS_UMBRALES = ('rsi_sobreventa', 'rsi_compra', 'rsi_venta', 'rsi_sobrecompra')
+
+
+def generar_umbrales(espacio=None):
+    """Combinaciones de umbrales RSI con el formato de los atributos de AnalisisTechnicoSR"""
+    espacio = dict(ESPACIO_UMBRALES, **(espacio or {}))
+    return [
+        {
+            'rsi_sobreventa': compra - SEPARACION_CONFIANZA_ALTA,
+            'rsi_compra': compra,
+            'rsi_venta': venta,
+            'rsi_sobrecompra': venta + SEPARACION_CONFIANZA_ALTA
+        }
+        for compra in espacio['rsi_compra'] for venta in espacio['rsi_venta']
+        if compra < venta
+    ]
+
+
+def generar_folds(inicio, fin, entrenamiento, prueba, paso=None):
+    """Ventanas (en segundos) de entrenamiento + prueba que avanzan `paso` (por defecto `prueba`)"""
+    folds = []
+    t = inicio
+    while t + entrenamiento + prueba <= fin:
+        folds.append({
+            'fold': len(folds),
+            'inicio': t,
+            'fin_entrenamiento': t + entrenamiento,
+            'fin_prueba': t + entrenamiento + prueba
+        })
+        t += paso or prueba
+    return folds
+
+
+def _puntuacion(estadisticas, criterio, min_operaciones):
+    if estadisticas['operaciones'] < min_operaciones:
+        return None
+    # max_drawdown: menor es mejor
+    return -estadisticas[criterio] if criterio == 'max_drawdown' else estadisticas[criterio]
+
+
+# Estado por proceso trabajador: velas mapeadas y series de indicadores por par
+_ESTADO_PROCESO = {}
+
+
+def _backtester_proceso(intervalo):
+    clave = ('backtester', intervalo)
+    if clave not in _ESTADO_PROCESO:
+        _ESTADO_PROCESO[clave] = Backtester(intervalo=intervalo)
+    return _ESTADO_PROCESO[clave]
+
+
+def _series_par(backtester, directorio, par, banda):
+    clave = (directorio, par, backtester.intervalo, banda)
+    if clave not in _ESTADO_PROCESO:
+        velas = AlmacenVelas(directorio).mapear(par, backtester.intervalo)
+        _ESTADO_PROCESO[clave] = (velas, backtester.calcular_series(par, velas, *banda))
+    return _ESTADO_PROCESO[clave]
+
+
+def _aplicar_umbrales(analisis, umbrales):
+    for campo in CAMPOS_UMBRALES:
+        setattr(analisis, campo, umbrales[campo])
+
+
+def evaluar_fold(directorio, fold, pares, candidatos_umbrales, combinaciones_por_par, intervalo='1h',
+                 fraccion_por_operacion=0.1, max_barras=120, criterio='rentabilidad', min_operaciones=5):
+    """Optimizar umbrales y parámetros en la ventana de entrenamiento y puntuar en la de prueba
+
+    Se ejecuta en un proceso trabajador. Las series (RSI, tendencia, niveles
+    S/R) se calculan una vez y sirven para todos los candidatos; cada
+    candidato solo vuelve a aplicar las reglas y a simular las salidas.
+    """
+    from config import PARAMETROS_POR_PAR
+    from gestor_operaciones import GestorOperaciones
+
+    backtester = _backtester_proceso(intervalo)
+    backtester.fraccion_por_operacion = fraccion_por_operacion
+    backtester.max_barras = max_barras
+    analisis = backtester._get_analisis_sr()
+    originales = {campo: getattr(analisis, campo) for campo in CAMPOS_UMBRALES}
+
+    # Banda contenida en la de todos los candidatos y la referencia: una serie por par
+    banda = (max([u['rsi_compra'] for u in candidatos_umbrales] + [originales['rsi_compra']]),
+             min([u['rsi_venta'] for u in candidatos_umbrales] + [originales['rsi_venta']]))
+    datos = {}
+    for par in pares:
+        velas, series = _series_par(backtester, directorio, par, banda)
+        entrenamiento = tuple(np.searchsorted(velas.timestamp, [fold['inicio'], fold['fin_entrenamiento']]).tolist())
+        prueba = tuple(np.searchsorted(velas.timestamp, [fold['fin_entrenamiento'], fold['fin_prueba']]).tolist())
+        datos[par] = (velas, series, entrenamiento, prueba)
+
+    def simular(par, params, señales, rango):
+        velas = datos[par][0]
+        return backtester.simular_par(par, velas, GestorOperaciones(), params, señales, rango)
+
+    try:
+        # Entrenamiento: para cada umbral, la mejor combinación de cada par
+        mejor = None
+        for umbrales in candidatos_umbrales:
+            _aplicar_umbrales(analisis, umbrales)
+            puntuacion_total, elegidos = 0.0, {}
+            for par in pares:
+                velas, series, entrenamiento, _ = datos[par]
+                señales = backtester.detectar_señales(par, velas, series, entrenamiento)
+                base = PARAMETROS_POR_PAR.get(par, PARAMETROS_POR_PAR['EURUSD'])
+                for combinacion in combinaciones_por_par[par]:
+                    operaciones = simular(par, dict(base, **combinacion), señales, entrenamiento)
+                    estadisticas = estadisticas_operaciones([op['profit'] for op in operaciones], fraccion_por_operacion)
+                    puntuacion = _puntuacion(estadisticas, criterio, min_operaciones)
+                    if puntuacion is not None and (par not in elegidos or puntuacion > elegidos[par]['puntuacion']):
+                        elegidos[par] = {'parametros': combinacion, 'puntuacion': puntuacion, 'entrenamiento': estadisticas}
+                puntuacion_total += elegidos[par]['puntuacion'] if par in elegidos else 0.0
+            if mejor is None or puntuacion_total > mejor['puntuacion']:
+                mejor = {'umbrales': umbrales, 'puntuacion': puntuacion_total, 'pares': elegidos}
+
+        # Prueba: umbrales y parámetros elegidos frente a la configuración actual
+        def evaluar_prueba(umbrales, parametros_por_par):
+            _aplicar_umbrales(analisis, umbrales)
+            resultado = {}
+            for par in pares:
+                velas, series, _, prueba = datos[par]
+                base = PARAMETROS_POR_PAR.get(par, PARAMETROS_POR_PAR['EURUSD'])
+                params = dict(base, **parametros_por_par.get(par, {}))
+                señales = backtester.detectar_señales(par, velas, series, prueba)
+                resultado[par] = [op['profit'] for op in simular(par, params, señales, prueba)]
+            return resultado
+
+        parametros_elegidos = {par: elegido['parametros'] for par, elegido in mejor['pares'].items()}
+        profits_prueba = evaluar_prueba(mejor['umbrales'], parametros_elegidos)
+        profits_referencia = evaluar_prueba(originales, {})
+    finally:
+        _aplicar_umbrales(analisis, originales)
+
+    return dict(fold, **{
+        'umbrales': mejor['umbrales'],
+        'parametros': parametros_elegidos,
+        'puntuacion_entrenamiento': mejor['puntuacion'],
+        'profits_prueba': profits_prueba,
+        'profits_referencia': profits_referencia,
+        'prueba': {par: estadisticas_operaciones(profits, fraccion_por_operacion) for par, profits in profits_prueba.items()},
+        'referencia': {par: estadisticas_operaciones(profits, fraccion_por_operacion) for par, profits in profits_referencia.items()}
+    })
+
+
+class ValidacionWalkForward:
+    """Ventanas rodantes entrenamiento/prueba evaluadas en paralelo (un proceso por fold)
+
+    En cada fold se eligen los umbrales RSI de AnalisisTechnicoSR y los
+    parámetros de cada par con mejor `criterio` en entrenamiento, y se
+    puntúan en la ventana de prueba siguiente junto a la configuración
+    actual como referencia. Las ventanas de prueba no se solapan, así que
+    sus operaciones concatenadas son el resultado fuera de muestra.
+    """
+
+    def __init__(self, directorio, intervalo='1h', entrenamiento_dias=180, prueba_dias=30, paso_dias=None,
+                 max_workers=None, fraccion_por_operacion=0.1, max_barras=120):
+        self.directorio = directorio
+        self.intervalo = intervalo
+        self.entrenamiento = entrenamiento_dias * 86400
+        self.prueba = prueba_dias * 86400
+        self.paso = (paso_dias or prueba_dias) * 86400
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.fraccion_por_operacion = fraccion_por_operacion
+        self.max_barras = max_barras
+        self.directorio_velas = os.path.join(directorio, 'velas')
+        self.almacen = AlmacenVelas(self.directorio_velas)
+
+    def ejecutar(self, pares=None, espacio_umbrales=None, espacio=None, n_muestras=24, semilla=0, rutas=None,
+                 desde=None, hasta=None, criterio='rentabilidad', min_operaciones=5, reconstruir=False):
+        """Ejecutar todos los folds y agregar los resultados fuera de muestra"""
+        if pares is None:
+            from config import TOP_PARES
+            pares = TOP_PARES
+        comprobar_manifiesto(self.directorio, manifiesto_velas(pares, self.intervalo, rutas, desde, hasta),
+                             (self.directorio_velas,), reconstruir)
+        pares = preparar_almacen(self.almacen, pares, self.intervalo, rutas, desde, hasta)
+        if not pares:
+            return None
+
+        inicio = min(self.almacen.primer_timestamp(par, self.intervalo) for par in pares)
+        fin = max(self.almacen.ultimo_timestamp(par, self.intervalo) for par in pares)
+        folds = generar_folds(inicio, fin, self.entrenamiento, self.prueba, self.paso)
+        if not folds:
+            print("⚠️ Histórico insuficiente para una ventana de entrenamiento + prueba")
+            return None
+
+        # Mismos candidatos en todos los folds
+        candidatos_umbrales = generar_umbrales(espacio_umbrales)
+        combinaciones_por_par = {
+            par: generar_combinaciones(espacio_de_par(espacio, par), n_muestras, None if semilla is None else semilla + k)
+            for k, par in enumerate(pares)
+        }
+        print(f"🔁 Walk-forward: {len(folds)} folds, {len(candidatos_umbrales)} umbrales x "
+              f"{max(len(c) for c in combinaciones_por_par.values())} combinaciones por par")
+
+        with ProcessPoolExecutor(max_workers=min(self.max_workers, len(folds))) as executor:
+            resultados = list(executor.map(
+                evaluar_fold,
+                [self.directorio_velas] * len(folds), folds, [pares] * len(folds),
+                [candidatos_umbrales] * len(folds), [combinaciones_por_par] * len(folds),
+                [self.intervalo] * len(folds), [self.fraccion_por_operacion] * len(folds),
+                [self.max_barras] * len(folds), [criterio] * len(folds), [min_operaciones] * len(folds)
+            ))
+
+        for resultado in resultados:
+            umbrales = resultado['umbrales']
+            prueba = [p for profits in resultado['profits_prueba'].values() for p in profits]
+            referencia = [p for profits in resultado['profits_referencia'].values() for p in profits]
+            print(f"   Fold {resultado['fold']}: RSI {umbrales['rsi_compra']}/{umbrales['rsi_venta']}, "
+                  f"prueba {round(sum(prueba), 2)}% ({len(prueba)} ops) vs referencia {round(sum(referencia), 2)}% ({len(referencia)} ops)")
+
+        return {
+            'folds': resultados,
+            'fuera_de_muestra': self._agregar(resultados, 'profits_prueba', pares),
+            'referencia': self._agregar(resultados, 'profits_referencia', pares),
+            # Lo elegido en el último fold es lo que se llevaría a config
+            'umbrales_recomendados': resultados[-1]['umbrales'],
+            'parametros_recomendados': resultados[-1]['parametros']
+        }
+
+    def _agregar(self, resultados, clave, pares):
+        """Estadísticas de las operaciones de todas las ventanas de prueba, por par y en total"""
+        por_par = {par: [p for r in resultados for p in r[clave].get(par, [])] for par in pares}
+        total = [p for profits in por_par.values() for p in profits]
+        return {
+            'total': estadisticas_operaciones(total, self.fraccion_por_operacion),
+            'pares': {par: estadisticas_operaciones(profits, self.fraccion_por_operacion) for par, profits in por_par.items()}
+        }
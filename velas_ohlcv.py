@@ -0,0 +1,96 @@
+# velas_ohlcv.py - CONTENEDOR OHLCV ALINEADO (NUMPY, NaN = SIN DATO)
+import numpy as np
+
+COLUMNAS_OHLCV = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+
+def _a_float64(valores, n):
+    """Lista/array con None -> array float64 de longitud n con NaN"""
+    if valores is None:
+        return np.full(n, np.nan)
+    array = np.asarray(valores, dtype=np.float64)
+    if len(array) == n:
+        return array
+    ajustado = np.full(n, np.nan)
+    ajustado[:min(n, len(array))] = array[:n]
+    return ajustado
+
+
+class VelasOHLCV:
+    """Serie OHLCV alineada: timestamps int64 y precios float64 contiguos
+
+    Todas las columnas tienen la misma longitud y comparten índice, así que
+    high[i], low[i] y close[i] siempre son la misma vela. Los huecos de
+    Yahoo se representan como NaN en lugar de None.
+    """
+    __slots__ = ('timestamp', 'open', 'high', 'low', 'close', 'volume', 'precio')
+
+    def __init__(self, timestamp, open=None, high=None, low=None, close=None, volume=None, precio=None):
+        self.timestamp = np.ascontiguousarray(timestamp, dtype=np.int64)
+        n = len(self.timestamp)
+        self.open = _a_float64(open, n)
+        self.high = _a_float64(high, n)
+        self.low = _a_float64(low, n)
+        self.close = _a_float64(close, n)
+        self.volume = _a_float64(volume, n)
+        self.precio = precio
+        # Las series se comparten entre hilos vía cache: solo lectura
+        for columna in COLUMNAS_OHLCV:
+            getattr(self, columna).setflags(write=False)
+
+    @classmethod
+    def desde_yahoo(cls, result):
+        """Decodificar un `chart.result[0]` de Yahoo Finance"""
+        quote = result.get('indicators', {}).get('quote', [{}])[0]
+        return cls(
+            result.get('timestamp') or [],
+            quote.get('open'), quote.get('high'), quote.get('low'),
+            quote.get('close'), quote.get('volume'),
+            precio=result.get('meta', {}).get('regularMarketPrice')
+        )
+
+    @classmethod
+    def vacia(cls):
+        return cls(np.empty(0, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def __getitem__(self, columna):
+        # Compatibilidad con el acceso tipo dict (datos['close'])
+        if columna not in COLUMNAS_OHLCV and columna != 'precio':
+            raise KeyError(columna)
+        return getattr(self, columna)
+
+    def get(self, columna, default=None):
+        try:
+            return self[columna]
+        except KeyError:
+            return default
+
+    def recortar(self, inicio=None, fin=None):
+        """Sub-serie por índice [inicio:fin]"""
+        return VelasOHLCV(*(getattr(self, c)[inicio:fin] for c in COLUMNAS_OHLCV), precio=self.precio)
+
+    def desde(self, timestamp):
+        """Sub-serie con velas de timestamp >= `timestamp`"""
+        return self.recortar(int(np.searchsorted(self.timestamp, timestamp, side='left')))
+
+    def validas(self):
+        """Solo velas con cierre; open/high/low ausentes se rellenan con el cierre"""
+        mascara = ~np.isnan(self.close)
+        close = self.close[mascara]
+        return VelasOHLCV(
+            self.timestamp[mascara],
+            np.where(np.isnan(self.open[mascara]), close, self.open[mascara]),
+            np.where(np.isnan(self.high[mascara]), close, self.high[mascara]),
+            np.where(np.isnan(self.low[mascara]), close, self.low[mascara]),
+            close,
+            np.nan_to_num(self.volume[mascara]),
+            precio=self.precio
+        )
+
+    def ultimo_cierre(self):
+        """Último cierre válido o None"""
+        validos = self.close[~np.isnan(self.close)]
+        return float(validos[-1]) if len(validos) else None
@@ -2,69 +2,122 @@
 import requests
 import random
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from cache_velas import cache_velas
+from velas_ohlcv import VelasOHLCV
 
 logger = logging.getLogger(__name__)
 
+# Mapeo de símbolos para Yahoo Finance (ACTUALIZADO CON MATERIAS PRIMAS)
+SYMBOL_MAPPING = {
+    # FOREX
+    "EURUSD": "EURUSD=X",
+    "USDCAD": "CAD=X",
+    "EURCHF": "EURCHF=X",
+    "EURAUD": "EURAUD=X",
+    "USDJPY": "JPY=X",
+    "AUDUSD": "AUDUSD=X",
+    "EURGBP": "EURGBP=X",
+    "GBPUSD": "GBPUSD=X",
+    
+    # MATERIAS PRIMAS (NUEVAS)
+    "XAUUSD": "GC=F",    # Oro
+    "XAGUSD": "SI=F",    # Plata
+    "OILUSD": "CL=F",    # Petróleo Crudo
+    "XPTUSD": "PL=F",    # Platino
+}
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+}
+
+# Pool HTTP compartido (keep-alive) y concurrencia máxima de descargas
+POOL_CONEXIONES = 16
+MAX_WORKERS = 8
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Sesión HTTP compartida con pool de conexiones keep-alive"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_CONEXIONES, pool_maxsize=POOL_CONEXIONES)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update(HEADERS)
+                _session = session
+    return _session
+
 class YahooFinanceAPI:
     def __init__(self):
         self.base_url = "https://query1.finance.yahoo.com/v8/finance/chart"
         
+    def obtener_chart(self, simbolo, rango="1d", intervalo="1m", timeout=10, desde=None, refrescar=False):
+        """Descargar velas de Yahoo Finance usando la cache compartida
+        
+        Con `desde` (epoch en segundos) solo se piden las velas posteriores
+        a ese instante y la respuesta no pasa por la cache por rango.
+        Con `refrescar` se ignora la entrada cacheada y se reemplaza por la
+        descargada.
+        """
+        if desde is None and not refrescar:
+            datos = cache_velas.obtener(simbolo, rango, intervalo)
+            if datos is not None:
+                return datos
+        
+        yahoo_symbol = SYMBOL_MAPPING.get(simbolo)
+        if not yahoo_symbol:
+            logger.warning(f"Símbolo no soportado: {simbolo}")
+            return None
+        
+        url = f"{self.base_url}/{yahoo_symbol}"
+        if desde is None:
+            params = {"range": rango, "interval": intervalo}
+        else:
+            params = {"period1": int(desde), "period2": int(time.time()), "interval": intervalo}
+        
+        response = get_session().get(url, params=params, timeout=timeout)
+        
+        if response.status_code != 200:
+            print(f"⚠️ Status {response.status_code} para {simbolo}")
+            return None
+        
+        data = response.json()
+        if not ("chart" in data and "result" in data["chart"] and data["chart"]["result"]):
+            print(f"⚠️ Estructura de respuesta inválida para {simbolo}")
+            return None
+        
+        # Decodificar una sola vez a arrays float64 alineados (NaN = sin dato)
+        datos = VelasOHLCV.desde_yahoo(data["chart"]["result"][0])
+        
+        if desde is None:
+            cache_velas.guardar(simbolo, rango, intervalo, datos)
+        return datos
+    
     def obtener_precio_real(self, simbolo):
         """Obtener precio REAL de Yahoo Finance"""
         try:
-            # Mapeo de símbolos para Yahoo Finance (ACTUALIZADO CON MATERIAS PRIMAS)
-            symbol_mapping = {
-                # FOREX
-                "EURUSD": "EURUSD=X",
-                "USDCAD": "CAD=X",
-                "EURCHF": "EURCHF=X", 
-                "EURAUD": "EURAUD=X",
-                "USDJPY": "JPY=X",
-                "AUDUSD": "AUDUSD=X",
-                "EURGBP": "EURGBP=X",
-                "GBPUSD": "GBPUSD=X",
-                
-                # MATERIAS PRIMAS (NUEVAS)
-                "XAUUSD": "GC=F",    # Oro
-                "XAGUSD": "SI=F",    # Plata
-                "OILUSD": "CL=F",    # Petróleo Crudo
-                "XPTUSD": "PL=F",    # Platino
-            }
-            
-            yahoo_symbol = symbol_mapping.get(simbolo)
-            if not yahoo_symbol:
+            if simbolo not in SYMBOL_MAPPING:
                 logger.warning(f"Símbolo no soportado: {simbolo}")
                 return self._precio_simulado_realista(simbolo)
             
-            url = f"{self.base_url}/{yahoo_symbol}"
-            params = {
-                "range": "1d",
-                "interval": "1m"
-            }
-            
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            }
-            
             print(f"🔍 Solicitando datos de {simbolo} desde Yahoo Finance...")
-            response = requests.get(url, params=params, headers=headers, timeout=10)
+            datos = self.obtener_chart(simbolo, "1d", "1m")
             
-            if response.status_code == 200:
-                data = response.json()
-                
-                if "chart" in data and "result" in data["chart"] and data["chart"]["result"]:
-                    result = data["chart"]["result"][0]
-                    if "meta" in result and "regularMarketPrice" in result["meta"]:
-                        precio = result["meta"]["regularMarketPrice"]
-                        print(f"✅ Precio REAL {simbolo}: {precio:.5f}")
-                        return precio
-                    else:
-                        print(f"⚠️ No se encontró precio en respuesta para {simbolo}")
-                else:
-                    print(f"⚠️ Estructura de respuesta inválida para {simbolo}")
-            else:
-                print(f"⚠️ Status {response.status_code} para {simbolo}")
+            if datos is not None and datos.precio is not None:
+                precio = datos.precio
+                print(f"✅ Precio REAL {simbolo}: {precio:.5f}")
+                return precio
+            elif datos is not None:
+                print(f"⚠️ No se encontró precio en respuesta para {simbolo}")
             
             # Fallback a simulación si Yahoo falla
             print(f"🔄 Yahoo Finance falló, usando simulación para {simbolo}")
@@ -74,6 +127,52 @@ class YahooFinanceAPI:
             print(f"❌ Error obteniendo precio {simbolo}: {e}")
             return self._precio_simulado_realista(simbolo)
     
+    def obtener_precio_mercado(self, simbolo, refrescar=False):
+        """Precio de mercado REAL o None (sin fallback a simulación)
+
+        Para el monitor, que aplica el precio a operaciones abiertas: un precio
+        inventado dispararía TP/SL/DCA y quedaría registrado en el diario.
+        `refrescar` salta la cache de '1m' (su TTL es de hasta 60 s).
+        """
+        try:
+            datos = self.obtener_chart(simbolo, "1d", "1m", refrescar=refrescar)
+        except Exception as e:
+            print(f"❌ Error obteniendo precio {simbolo}: {e}")
+            return None
+        if datos is None or datos.precio is None:
+            return None
+        return datos.precio
+    
+    def ejecutar_en_paralelo(self, funcion, simbolos, max_workers=None):
+        """Ejecutar una función por símbolo en paralelo sobre el pool HTTP"""
+        simbolos = list(dict.fromkeys(simbolos))
+        if not simbolos:
+            return {}
+        
+        workers = min(max_workers or MAX_WORKERS, len(simbolos))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futuros = {simbolo: executor.submit(funcion, simbolo) for simbolo in simbolos}
+        
+        resultados = {}
+        for simbolo, futuro in futuros.items():
+            try:
+                resultados[simbolo] = futuro.result()
+            except Exception as e:
+                print(f"❌ Error en descarga batch {simbolo}: {e}")
+                resultados[simbolo] = None
+        return resultados
+    
+    def obtener_precios(self, simbolos, max_workers=None):
+        """Obtener precios de varios símbolos en paralelo"""
+        return self.ejecutar_en_paralelo(self.obtener_precio_real, simbolos, max_workers)
+    
+    def obtener_historicos_batch(self, simbolos, rango="1mo", intervalo="1h", max_workers=None):
+        """Obtener velas de varios símbolos en paralelo (latencia ≈ la petición más lenta)"""
+        return self.ejecutar_en_paralelo(
+            lambda simbolo: self.obtener_chart(simbolo, rango, intervalo, timeout=15),
+            simbolos, max_workers
+        )
+    
     def _precio_simulado_realista(self, simbolo):
         """Precio simulado realista como fallback"""
         precios_base = {
@@ -159,7 +258,7 @@ class YahooFinanceAPI:
             url = f"{self.base_url}/{test_symbol}"
             params = {"range": "1d", "interval": "1m"}
             
-            response = requests.get(url, params=params, timeout=10)
+            response = get_session().get(url, params=params, timeout=10)
             if response.status_code == 200:
                 data = response.json()
                 if "chart" in data and "result" in data["chart"]: